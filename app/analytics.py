@@ -0,0 +1,339 @@
+import asyncio
+import os
+import threading
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import case, false, func, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from . import database, models
+from .logging_config import log
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Сводки продаж: фоновая задача переносит еще не учтенные заказы (orders.rolled_up = false) в почасовую
+# и дневную сводки и помечает их в той же транзакции, поэтому заказ учитывается ровно один раз,
+# в каком бы порядке ни фиксировались транзакции заказов.
+# /api/analytics/* читают только сводки: время ответа зависит от длины периода, а не от числа заказов.
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+ANALYTICS_INTERVAL = float(os.getenv("ANALYTICS_INTERVAL", "5"))
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "1000"))
+# Дольше этого периода почасовая разбивка не выдается
+MAX_HOURLY_DAYS = 31
+# Самые продаваемые товары выбираются из строк день × товар: период ограничен, чтобы время ответа
+# не росло вместе с каталогом и историей без предела
+MAX_TOP_PRODUCTS_DAYS = 92
+
+WATERMARK = "sales"
+GRANULARITIES = ("day", "hour")
+TOP_PRODUCTS_ORDER = ("revenue", "units")
+
+hourly = models.SalesHourly.__table__
+daily = models.SalesDaily.__table__
+category_daily = models.SalesCategoryDaily.__table__
+
+
+def utc_naive(moment: datetime) -> datetime:
+    """Время заказа в UTC без часового пояса (SQLite хранит CURRENT_TIMESTAMP так же)"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def order_lines_query(order_ids: List[int]) -> Select:
+    """Позиции заказов order_ids с категорией товара"""
+    return (
+        select(models.Order.id, models.Order.created_at, models.OrderItem.product_id, models.Product.category,
+               models.OrderItem.quantity, models.OrderItem.unit_price)
+        .join(models.OrderItem, models.OrderItem.order_id == models.Order.id)
+        .join(models.Product, models.Product.id == models.OrderItem.product_id)
+        .where(models.Order.id.in_(order_ids))
+    )
+
+
+def aggregate_lines(rows) -> Tuple[List[dict], List[dict], List[dict]]:
+    """Прибавки к почасовой, дневной (по товарам) и дневной по категориям сводкам по позициям заказов"""
+    hours: Dict[datetime, dict] = {}
+    seen_orders = set()
+    days: Dict[Tuple[date, int], dict] = {}
+    categories: Dict[Tuple[date, str], dict] = {}
+    for order_id, created_at, product_id, category, quantity, unit_price in rows:
+        moment = utc_naive(created_at)
+        hour = moment.replace(minute=0, second=0, microsecond=0)
+        revenue = quantity * unit_price
+        bucket = hours.setdefault(hour, {"hour": hour, "orders": 0, "units": 0, "revenue": 0.0})
+        if order_id not in seen_orders:
+            seen_orders.add(order_id)
+            bucket["orders"] += 1
+        bucket["units"] += quantity
+        bucket["revenue"] += revenue
+        line = days.setdefault((moment.date(), product_id), {
+            "day": moment.date(), "product_id": product_id, "category": category, "orders": 0, "units": 0,
+            "revenue": 0.0})
+        line["orders"] += 1
+        line["units"] += quantity
+        line["revenue"] += revenue
+        category_line = categories.setdefault((moment.date(), category), {
+            "day": moment.date(), "category": category, "units": 0, "revenue": 0.0})
+        category_line["units"] += quantity
+        category_line["revenue"] += revenue
+    return list(hours.values()), list(days.values()), list(categories.values())
+
+
+def add_statement(dialect_name: str, table, keys: List[str]):
+    """
+    Прибавление счетчиков к строке сводки (новая строка вставляется).
+    Выполняется через executemany со списком строк: один скомпилированный запрос на все строки.
+    """
+    statement = database.UPSERT_INSERTS[dialect_name](table)
+    new = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[table.c[key] for key in keys],
+        set_={column: table.c[column] + new[column] for column in ("orders", "units", "revenue") if column in table.c},
+    )
+
+
+class SalesRollup:
+    """
+    Заполнение сводок продаж неучтенными заказами.
+    Заказы помечаются учтенными атомарным UPDATE ... WHERE rolled_up = false RETURNING в транзакции,
+    которая пополняет сводки: в сводки попадают только заказы, помеченные этим проходом. Параллельный
+    проход (другой процесс) не получит тех же заказов, а заказ, зафиксированный позже заказов с большим
+    id, просто будет взят следующим проходом.
+    """
+
+    def __init__(self, batch_size: int = ANALYTICS_BATCH_SIZE, interval: float = ANALYTICS_INTERVAL):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[threading.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def watermark(self, db: Session) -> int:
+        """
+        Строка состояния сводок (создается при первом проходе): наибольший учтенный id и время прохода.
+        Какие заказы учитывать, она не решает — это делает orders.rolled_up.
+        """
+        row = db.get(models.RollupWatermark, WATERMARK)
+        if row is None:
+            dialect_name = db.get_bind().dialect.name
+            db.execute(database.UPSERT_INSERTS[dialect_name](models.RollupWatermark)
+                       .values(name=WATERMARK, last_order_id=0).on_conflict_do_nothing())
+            db.commit()
+            return 0
+        return row.last_order_id
+
+    def run_once(self, db: Session) -> int:
+        """Учет следующей пачки заказов (не больше batch_size); число учтенных заказов"""
+        try:
+            self.watermark(db)
+            dialect_name = db.get_bind().dialect.name
+            candidates = (
+                select(models.Order.id)
+                .where(models.Order.rolled_up == false())
+                .order_by(models.Order.id)
+                .limit(self.batch_size)
+            )
+            # Пометка — первый шаг: заказы, уже помеченные параллельным проходом, сюда не вернутся.
+            # updated_at заказа не меняется: это служебная пометка, а не изменение заказа
+            ids = sorted(db.execute(
+                update(models.Order)
+                .where(models.Order.id.in_(candidates.scalar_subquery()), models.Order.rolled_up == false())
+                .values(rolled_up=True, updated_at=models.Order.updated_at)
+                .returning(models.Order.id)
+            ).scalars().all())
+            if not ids:
+                db.rollback()
+                return 0
+
+            hours, days, categories = aggregate_lines(db.execute(order_lines_query(ids)).all())
+            if hours:
+                db.execute(add_statement(dialect_name, hourly, ["hour"]), hours)
+                db.execute(add_statement(dialect_name, daily, ["day", "product_id"]), days)
+                db.execute(add_statement(dialect_name, category_daily, ["day", "category"]), categories)
+            last_order_id = models.RollupWatermark.last_order_id
+            db.execute(
+                update(models.RollupWatermark)
+                .where(models.RollupWatermark.name == WATERMARK)
+                .values(last_order_id=case((last_order_id < ids[-1], ids[-1]), else_=last_order_id))
+            )
+            db.commit()
+            log.debug(f"Сводки продаж: учтены заказы {ids[0]}..{ids[-1]} ({len(ids)})")
+            return len(ids)
+        except SQLAlchemyError as e:
+            db.rollback()
+            log.error(f"Ошибка при обновлении сводок продаж: {e}")
+            raise
+
+    def catch_up(self, db: Optional[Session] = None, stop: Optional[threading.Event] = None) -> int:
+        """Учет всех готовых заказов (stop прерывает учет между пачками); число учтенных"""
+        if db is None:
+            with database.SessionLocal() as session:
+                return self.catch_up(session, stop)
+        total = 0
+        while stop is None or not stop.is_set():
+            processed = self.run_once(db)
+            if not processed:
+                break
+            total += processed
+        return total
+
+    async def start(self):
+        if self.running:
+            return
+        self._stop = threading.Event()
+        self._task = asyncio.create_task(self._loop())
+        log.info(f"Фоновое обновление сводок продаж запущено: каждые {self.interval} с")
+
+    async def stop(self):
+        if not self.running:
+            return
+        # Поток с текущим проходом завершается после своей пачки
+        self._stop.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        log.info("Фоновое обновление сводок продаж остановлено")
+
+    async def _loop(self):
+        while True:
+            try:
+                processed = await asyncio.to_thread(self.catch_up, None, self._stop)
+                if processed:
+                    log.info(f"Сводки продаж обновлены: учтено заказов {processed}")
+            except Exception as e:
+                log.error(f"Ошибка фонового обновления сводок продаж: {e}")
+            await asyncio.sleep(self.interval)
+
+
+rollup = SalesRollup()
+
+
+def ensure_category_rollup(db: Session) -> bool:
+    """
+    Заполнение сводки по категориям из дневной сводки по товарам для базы, где сводки продаж
+    появились до нее (один раз при запуске)
+    """
+    if db.execute(select(category_daily.c.day).limit(1)).first() is not None:
+        return False
+    if db.execute(select(daily.c.day).limit(1)).first() is None:
+        return False
+    try:
+        db.execute(category_daily.insert().from_select(
+            ["day", "category", "units", "revenue"],
+            select(daily.c.day, daily.c.category, func.sum(daily.c.units), func.sum(daily.c.revenue))
+            .group_by(daily.c.day, daily.c.category)
+        ))
+        db.commit()
+        log.info("Сводка продаж по категориям заполнена из сводки по товарам")
+        return True
+    except SQLAlchemyError as e:
+        db.rollback()
+        log.error(f"Ошибка при заполнении сводки продаж по категориям: {e}")
+        raise
+
+
+# Запросы к сводкам
+def period(start: Optional[date], end: Optional[date], days: int = 30) -> Tuple[date, date]:
+    """Период [start, end] включительно; по умолчанию последние days дней (UTC)"""
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=days - 1)
+    if start > end:
+        raise ValueError("Начало периода позже конца")
+    return start, end
+
+
+def get_revenue(db: Session, start: date, end: date, granularity: str = "day") -> List[Dict[str, Any]]:
+    """Выручка, заказы и единицы товара по дням или часам периода"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Неизвестная разбивка: {granularity}")
+    if granularity == "hour" and (end - start).days >= MAX_HOURLY_DAYS:
+        raise ValueError(f"Почасовая разбивка доступна для периода до {MAX_HOURLY_DAYS} дней")
+    try:
+        rows = db.execute(
+            select(hourly.c.hour, hourly.c.orders, hourly.c.units, hourly.c.revenue)
+            .where(hourly.c.hour >= datetime.combine(start, dt_time()),
+                   hourly.c.hour < datetime.combine(end + timedelta(days=1), dt_time()))
+            .order_by(hourly.c.hour)
+        ).all()
+        # Дни собираются из часов: не больше 24 строк на день независимо от числа заказов
+        buckets: Dict[str, Dict[str, Any]] = {}
+        for hour, orders, units, revenue in rows:
+            key = hour.date().isoformat() if granularity == "day" else hour.isoformat()
+            bucket = buckets.setdefault(key, {"period": key, "orders": 0, "units": 0, "revenue": 0.0})
+            bucket["orders"] += orders
+            bucket["units"] += units
+            bucket["revenue"] += revenue
+        return list(buckets.values())
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении выручки за {start}..{end}: {e}")
+        raise
+
+
+def get_category_sales(db: Session, start: date, end: date) -> List[Dict[str, Any]]:
+    """Продажи по категориям за период"""
+    try:
+        rows = db.execute(
+            select(category_daily.c.category, func.sum(category_daily.c.units).label("units"),
+                   func.sum(category_daily.c.revenue).label("revenue"))
+            .where(category_daily.c.day.between(start, end))
+            .group_by(category_daily.c.category)
+            .order_by(func.sum(category_daily.c.revenue).desc())
+        ).mappings().all()
+        return [dict(row) for row in rows]
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении продаж по категориям за {start}..{end}: {e}")
+        raise
+
+
+def get_top_products(db: Session, start: date, end: date, limit: int = 10,
+                     by: str = "revenue") -> List[Dict[str, Any]]:
+    """Самые продаваемые товары периода по выручке или числу единиц"""
+    if by not in TOP_PRODUCTS_ORDER:
+        raise ValueError(f"Неизвестный порядок: {by}")
+    if (end - start).days >= MAX_TOP_PRODUCTS_DAYS:
+        raise ValueError(f"Самые продаваемые товары доступны для периода до {MAX_TOP_PRODUCTS_DAYS} дней")
+    try:
+        top = (
+            select(daily.c.product_id, func.max(daily.c.category).label("category"),
+                   func.sum(daily.c.orders).label("orders"), func.sum(daily.c.units).label("units"),
+                   func.sum(daily.c.revenue).label("revenue"))
+            .where(daily.c.day.between(start, end))
+            .group_by(daily.c.product_id)
+            .order_by(func.sum(daily.c[by]).desc(), daily.c.product_id)
+            .limit(limit)
+            .subquery()
+        )
+        # Названия подгружаются только для limit товаров
+        rows = db.execute(
+            select(top, models.Product.name)
+            .join(models.Product, models.Product.id == top.c.product_id, isouter=True)
+            .order_by(top.c[by].desc(), top.c.product_id)
+        ).mappings().all()
+        return [dict(row) for row in rows]
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении самых продаваемых товаров за {start}..{end}: {e}")
+        raise
+
+
+def status(db: Session) -> Dict[str, Any]:
+    """Наибольший учтенный заказ, время последнего прохода и число заказов, еще не попавших в сводки"""
+    watermark = db.get(models.RollupWatermark, WATERMARK)
+    last_order_id = watermark.last_order_id if watermark else 0
+    pending = db.execute(
+        select(func.count()).where(models.Order.rolled_up == false())
+    ).scalar()
+    return {
+        "running": rollup.running,
+        "last_order_id": last_order_id,
+        "pending_orders": pending,
+        "updated_at": watermark.updated_at if watermark else None,
+    }
@@ -0,0 +1,157 @@
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Tuple
+
+from dotenv import load_dotenv
+from fastapi.staticfiles import StaticFiles
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.types import Scope
+
+from . import http_cache
+from .logging_config import log
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Сборка статики: файлы из app/static копируются в STATIC_BUILD_DIR под именем с хэшем
+# содержимого (css/style.3f2a9c1b0d.css) и получают сжатые копии .gz и .br рядом.
+# Адрес с хэшем меняется вместе с файлом, поэтому его можно кэшировать навсегда.
+# Сборка выполняется при запуске приложения или заранее, при выкладке: python -m app.assets
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+static_dir = os.path.join(base_dir, "static")
+STATIC_BUILD_DIR = os.getenv("STATIC_BUILD_DIR", os.path.join(base_dir, "..", "build", "static"))
+
+# Адрес с хэшем не меняет содержимого: браузер не перепроверяет файл весь год
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Файлы без хэша в адресе (ссылки из JS) перепроверяются по ETag
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Текстовые форматы: для картинок и шрифтов сжатие почти ничего не дает
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+ENCODING_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+HASH_LENGTH = 10
+
+
+class Asset:
+    """Собранный файл статики: адрес с хэшем и доступные сжатые варианты"""
+    __slots__ = ("path", "hashed_path", "media_type", "encodings")
+
+    def __init__(self, path: str, hashed_path: str, media_type: str, encodings: Tuple[str, ...]):
+        self.path = path
+        self.hashed_path = hashed_path
+        self.media_type = media_type
+        self.encodings = encodings
+
+
+def hashed_name(path: str, content: bytes) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def _write(path: str, data: bytes):
+    """Запись через временный файл: несколько воркеров могут собирать статику одновременно"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class AssetManifest:
+    """Соответствие исходных путей статики (css/style.css) собранным файлам"""
+
+    def __init__(self, source_dir: str = static_dir, build_dir: str = STATIC_BUILD_DIR):
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.assets: Dict[str, Asset] = {}
+        self.by_hashed_path: Dict[str, Asset] = {}
+
+    def build(self) -> "AssetManifest":
+        """
+        Хэширование и сжатие всех файлов. Уже собранные версии не пересжимаются,
+        а старые не удаляются: страницы, закэшированные до выкладки, ссылаются на них.
+        """
+        assets = {}
+        written = 0
+        for root, _, files in os.walk(self.source_dir):
+            for name in sorted(files):
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, self.source_dir).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    content = f.read()
+                asset, created = self._build_asset(path, content)
+                assets[path] = asset
+                written += created
+        self.assets = assets
+        self.by_hashed_path = {asset.hashed_path: asset for asset in assets.values()}
+        log.info(f"Статика собрана: {len(assets)} файлов, записано новых: {written}")
+        return self
+
+    def _build_asset(self, path: str, content: bytes) -> Tuple[Asset, bool]:
+        hashed_path = hashed_name(path, content)
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        target = os.path.join(self.build_dir, hashed_path)
+        created = not os.path.exists(target)
+        if media_type.startswith(COMPRESSIBLE_TYPES):
+            encodings = [encoding for encoding in ENCODING_SUFFIXES
+                         if os.path.exists(target + ENCODING_SUFFIXES[encoding])]
+            if created or not encodings:
+                variants = http_cache.compressed_variants(content)
+                for encoding, data in variants.items():
+                    _write(target + ENCODING_SUFFIXES[encoding], data)
+                encodings = list(variants)
+        else:
+            encodings = []
+        if created:
+            # Исходный файл пишется последним: по нему определяется, что версия уже собрана
+            _write(target, content)
+        return Asset(path, hashed_path, media_type, tuple(encodings)), created
+
+    def url(self, path: str) -> str:
+        asset = self.assets.get(path)
+        return f"/static/{asset.hashed_path if asset else path}"
+
+    def file(self, asset: Asset, encoding: str) -> str:
+        return os.path.join(self.build_dir, asset.hashed_path + ENCODING_SUFFIXES.get(encoding, ""))
+
+
+manifest = AssetManifest()
+
+
+def static_url(path: str) -> str:
+    """Адрес файла статики для шаблонов: с хэшем содержимого, если статика собрана"""
+    return manifest.url(path)
+
+
+class AssetFiles(StaticFiles):
+    """
+    Раздача статики: адреса с хэшем отдаются из сборки (сжатый вариант по Accept-Encoding)
+    с Cache-Control: immutable, остальные — из app/static с перепроверкой по ETag.
+    """
+
+    def __init__(self, *args, manifest: AssetManifest = manifest, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        asset = self.manifest.by_hashed_path.get(path.replace(os.sep, "/"))
+        if asset is None:
+            response = await super().get_response(path, scope)
+            if response.status_code in (200, 304):
+                response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+            return response
+
+        encoding = http_cache.choose_encoding(Request(scope), asset.encodings)
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+        if asset.encodings:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return FileResponse(self.manifest.file(asset, encoding), media_type=asset.media_type, headers=headers)
+
+
+if __name__ == "__main__":
+    manifest.build()
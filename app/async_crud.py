@@ -0,0 +1,116 @@
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import category_stats, models
+from .cache import product_cache
+from .crud import (
+    PRODUCT_SORTS, product_json, product_sort_name, products_cache_key, products_page_query, products_rows_query,
+    search_cache_key, search_facet_queries, search_filters, search_result_json, search_rows_query, search_terms,
+    search_total_from_facets, search_total_query
+)
+from .logging_config import log
+from .pagination import next_cursor
+from .serialization import PRODUCT_FIELDS, rows_json
+from typing import List, Optional
+
+
+# Асинхронные версии операций чтения каталога из crud.py (запросы строятся там же).
+# Используются в обработчиках async def, чтобы запросы к БД не блокировали цикл событий.
+# Запись (товары, заказы, пользователи) идет только через crud.py.
+
+# CRUD операции для товаров
+async def get_product(db: AsyncSession, product_id: int):
+    """Получение товара по ID"""
+    try:
+        product = await db.get(models.Product, product_id)
+        if product:
+            log.info(f"Товар с ID {product_id} найден")
+        else:
+            log.warning(f"Товар с ID {product_id} не найден")
+        return product
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении товара {product_id}: {e}")
+        raise
+
+
+async def get_products_page(db: AsyncSession, limit: int = 100, category: Optional[str] = None,
+                            sort: Optional[str] = None, cursor: Optional[str] = None, skip: int = 0):
+    """Получение страницы товаров по курсору; возвращает товары и курсор следующей страницы"""
+    try:
+        result = await db.execute(products_page_query(limit, category, sort, cursor, skip))
+        rows = result.scalars().all()
+        sort = product_sort_name(sort)
+        token = next_cursor(rows, limit, sort, PRODUCT_SORTS[sort][0])
+        log.info(f"Получено {min(len(rows), limit)} товаров (страница по курсору)")
+        return rows[:limit], token
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении страницы товаров: {e}")
+        raise
+
+
+async def get_product_json(db: AsyncSession, product_id: int, key: Optional[str] = None) -> Optional[bytes]:
+    """Получение товара в виде JSON через кэш каталога (key — уже вычисленный ключ кэша)"""
+    key = key or await product_cache.call(product_cache.product_key, product_id)
+    cached = await product_cache.call(product_cache.get, key)
+    if cached is not None:
+        return cached
+    product = await get_product(db, product_id)
+    if product is None:
+        return None
+    data = product_json(product)
+    await product_cache.call(product_cache.set, key, data)
+    return data
+
+
+async def get_products_json(db: AsyncSession, skip: int = 0, limit: int = 100, category: Optional[str] = None,
+                            sort: Optional[str] = None, key: Optional[str] = None) -> bytes:
+    """Получение списка товаров в виде JSON через кэш каталога (key — уже вычисленный ключ кэша)"""
+    key = key or await product_cache.call(products_cache_key, skip, limit, category, sort)
+    cached = await product_cache.call(product_cache.get, key)
+    if cached is not None:
+        return cached
+    result = await db.execute(products_rows_query(skip, limit, category, sort))
+    data = rows_json(result.all(), PRODUCT_FIELDS)
+    log.info(f"Получен список товаров для кэша: category={category}, sort={sort}, skip={skip}, limit={limit}")
+    await product_cache.call(product_cache.set, key, data)
+    return data
+
+
+async def search_products_json(db: AsyncSession, q: Optional[str] = None, category: Optional[str] = None,
+                               size: Optional[str] = None, color: Optional[str] = None,
+                               min_price: Optional[float] = None, max_price: Optional[float] = None,
+                               sort: Optional[str] = None, skip: int = 0, limit: int = 20) -> bytes:
+    """Поиск товаров с фасетами в виде JSON через кэш каталога"""
+    try:
+        terms = search_terms(q)
+        key = await product_cache.call(search_cache_key, terms, category, size, color, min_price, max_price, sort,
+                                       skip, limit)
+        cached = await product_cache.call(product_cache.get, key)
+        if cached is not None:
+            return cached
+        filters = search_filters(category, size, color, min_price, max_price)
+        rows = (await db.execute(search_rows_query(terms, filters, sort, skip, limit))).all()
+        facet_rows = {
+            name: (await db.execute(query)).all()
+            for name, query in search_facet_queries(terms, filters).items()
+        }
+        total = search_total_from_facets(category, facet_rows["category"])
+        if total is None:
+            total = (await db.execute(search_total_query(terms, filters))).scalar_one()
+        log.info(f"Поиск товаров: q={q!r}, фильтры={sorted(filters)}, найдено {total}")
+        data = search_result_json(rows, total, facet_rows)
+        await product_cache.call(product_cache.set, key, data)
+        return data
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при поиске товаров: {e}")
+        raise
+
+
+async def get_category_stats(db: AsyncSession) -> List[dict]:
+    """Сводка по категориям из category_stats (без обращения к products)"""
+    try:
+        rows = (await db.execute(category_stats.stats_query())).mappings().all()
+        log.info(f"Получена сводка по {len(rows)} категориям")
+        return [dict(row) for row in rows]
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении сводки по категориям: {e}")
+        raise
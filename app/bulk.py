@@ -0,0 +1,204 @@
+import csv
+import io
+import json
+import os
+from itertools import islice
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from pydantic import TypeAdapter, ValidationError
+
+from . import schemas
+from .serialization import ORDER_FIELDS, ORDER_ITEM_FIELDS, dumps, rows_to_dicts
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Массовый импорт и экспорт товаров: файл читается и проверяется пачками,
+# каждая пачка записывается отдельной транзакцией
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "2000"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+# В отчете об импорте перечисляются только первые ошибки, остальные только считаются
+MAX_REPORTED_ERRORS = 1000
+
+BULK_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+PRODUCT_IMPORT_FIELDS = list(schemas.ProductCreate.model_fields)
+# В CSV заказ раскладывается на строки по позициям, поля заказа повторяются в каждой строке
+ORDER_EXPORT_FIELDS = ORDER_FIELDS + ORDER_ITEM_FIELDS
+
+# Строка файла: номер строки, данные или текст ошибки разбора
+Record = Tuple[int, Optional[dict], Optional[str]]
+
+_products_adapter = TypeAdapter(List[schemas.ProductCreate])
+
+
+class InvalidImport(ValueError):
+    """Файл нельзя импортировать целиком (неизвестный формат, не UTF-8, нет заголовка)"""
+
+
+def bulk_format(format: Optional[str], filename: Optional[str] = None, content_type: Optional[str] = None) -> str:
+    """Формат файла: явный параметр, иначе расширение имени, иначе Content-Type"""
+    if format:
+        if format not in BULK_FORMATS:
+            raise InvalidImport(f"Неизвестный формат: {format}, поддерживаются: {', '.join(BULK_FORMATS)}")
+        return format
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv" or (content_type or "").startswith("text/csv"):
+        return "csv"
+    if extension in (".ndjson", ".jsonl") or "ndjson" in (content_type or "") or "jsonl" in (content_type or ""):
+        return "ndjson"
+    raise InvalidImport("Не удалось определить формат файла, укажите format=csv или format=ndjson")
+
+
+def _text(stream: IO[bytes]) -> io.TextIOWrapper:
+    # utf-8-sig: Excel сохраняет CSV с BOM
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+def read_csv(stream: IO[bytes]) -> Iterator[Record]:
+    """Построчное чтение CSV с заголовком; пустые ячейки считаются отсутствующими значениями"""
+    text = _text(stream)
+    try:
+        reader = csv.DictReader(text)
+        if not reader.fieldnames:
+            raise InvalidImport("Пустой файл или нет строки заголовка")
+        for row in reader:
+            record = {key: value for key, value in row.items() if key is not None and value not in ("", None)}
+            yield reader.line_num, record, None
+    except UnicodeDecodeError:
+        raise InvalidImport("Файл должен быть в кодировке UTF-8")
+    finally:
+        text.detach()
+
+
+def read_ndjson(stream: IO[bytes]) -> Iterator[Record]:
+    """Построчное чтение NDJSON: по одному JSON-объекту на строку, пустые строки пропускаются"""
+    text = _text(stream)
+    try:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_number, None, "Некорректный JSON"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "Ожидался JSON-объект"
+                continue
+            yield line_number, record, None
+    except UnicodeDecodeError:
+        raise InvalidImport("Файл должен быть в кодировке UTF-8")
+    finally:
+        text.detach()
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+def chunked(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    iterator = iter(records)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def row_error(line: int, message: Optional[str] = None, error: Optional[ValidationError] = None,
+              index: Optional[int] = None) -> dict:
+    """Ошибка строки для отчета: номер строки и список полей с сообщениями"""
+    if error is None:
+        return {"line": line, "errors": [{"field": None, "message": message}]}
+    details = [
+        {"field": ".".join(str(part) for part in item["loc"][1:]) or None, "message": item["msg"]}
+        for item in error.errors()
+        if item["loc"] and item["loc"][0] == index
+    ]
+    return {"line": line, "errors": details}
+
+
+def validate_chunk(chunk: List[Record]) -> Tuple[List[dict], List[dict]]:
+    """
+    Проверка пачки строк по schemas.ProductCreate одним вызовом Pydantic.
+    Если в пачке есть ошибки, они уже содержат индексы строк: ошибочные строки попадают в отчет,
+    а остальные проверяются повторно, тоже одним вызовом.
+    """
+    errors = [row_error(line, message) for line, _, message in chunk if message is not None]
+    candidates = [(line, record) for line, record, message in chunk if message is None]
+    try:
+        products = _products_adapter.validate_python([record for _, record in candidates])
+    except ValidationError as e:
+        failed = {item["loc"][0] for item in e.errors()}
+        errors += [row_error(candidates[index][0], error=e, index=index) for index in sorted(failed)]
+        candidates = [candidate for index, candidate in enumerate(candidates) if index not in failed]
+        products = _products_adapter.validate_python([record for _, record in candidates])
+    errors.sort(key=lambda item: item["line"])
+    return [product.model_dump() for product in products], errors
+
+
+class ImportReport:
+    """Итог импорта: число записанных и отклоненных строк и первые ошибки"""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+
+    def add(self, imported: int, errors: List[dict]):
+        self.imported += imported
+        self.failed += len(errors)
+        self.errors.extend(errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+
+    def as_dict(self) -> dict:
+        return {"imported": self.imported, "failed": self.failed, "errors": self.errors}
+
+
+def export_chunks(batches: Iterable[list], fields: List[str], format: str) -> Iterator[bytes]:
+    """Пачки строк-кортежей в куски файла экспорта (CSV с заголовком или NDJSON)"""
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        for rows in batches:
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    else:
+        for rows in batches:
+            yield b"".join(dumps(item) + b"\n" for item in rows_to_dicts(rows, fields))
+
+
+def order_export_chunks(batches: Iterable[List[dict]], format: str) -> Iterator[bytes]:
+    """
+    Пачки заказов (в структуре schemas.Order) в куски файла экспорта.
+    NDJSON — по заказу на строку с вложенными позициями; CSV — по строке на позицию,
+    заказ без позиций выводится одной строкой с пустыми полями позиции.
+    """
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(ORDER_EXPORT_FIELDS)
+        empty_item = [None] * len(ORDER_ITEM_FIELDS)
+        for orders in batches:
+            for order in orders:
+                values = [order[field] for field in ORDER_FIELDS]
+                items = [[item[field] for field in ORDER_ITEM_FIELDS] for item in order["products"]]
+                writer.writerows(values + item for item in items or [empty_item])
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    else:
+        for orders in batches:
+            yield b"".join(dumps(order) + b"\n" for order in orders)
+
+
+def copy_csv(rows: List[dict], fields: List[str]) -> io.StringIO:
+    """Пачка проверенных строк в CSV для COPY ... FROM STDIN (None записывается как NULL)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([row[field] for field in fields] for row in rows)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,332 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .logging_config import log
+
+try:
+    import redis
+except ImportError:  # Redis нужен только для CACHE_BACKEND=redis
+    redis = None
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Сбои хранилища, при которых кэш пропускается и запрос идет в БД
+BACKEND_ERRORS = (redis.RedisError,) if redis is not None else ()
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш с ограниченным размером и временем жизни записей."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (value, expires_at)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Значение по ключу или None, если записи нет или она устарела"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Сохранение значения; при переполнении вытесняется давно не использованная запись"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, self._clock() + (self.ttl if ttl is None else ttl))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Полная очистка кэша (счетчики сохраняются)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики попаданий, промахов и вытеснений"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+class CacheBackend:
+    """
+    Хранилище кэша: байтовые значения с TTL и целочисленные счетчики версий.
+    Версии не истекают и используются для инвалидации по всем процессам сразу.
+    blocking — методы ходят по сети и из async-кода вызываются в отдельном потоке.
+    """
+    blocking = False
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    def get_versions(self, keys: List[str]) -> List[int]:
+        """Текущие версии; отсутствующая версия создается с начальным значением"""
+        raise NotImplementedError
+
+    def incr_versions(self, keys: List[str]):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+def _initial_version() -> int:
+    """
+    Начальная версия — время в миллисекундах, а не 0: после перезапуска процесса
+    или очистки хранилища версии не совпадут с выданными ранее.
+    """
+    return int(time.time() * 1000)
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Кэш внутри процесса: подходит для одного воркера и для тестов.
+    Версии тоже хранятся в LRU того же размера: на большом каталоге их число не растет без
+    предела. Вытесненная версия создается заново больше любой выданной ранее, поэтому записи
+    со старыми версиями не читаются.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.store = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions = TTLCache(maxsize=maxsize, ttl=float("inf"))
+        self._last_version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.store.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.store.set(key, value, ttl)
+
+    def _issue(self, version: int) -> int:
+        self._last_version = max(version, self._last_version + 1)
+        return self._last_version
+
+    def get_versions(self, keys: List[str]) -> List[int]:
+        with self._lock:
+            versions = []
+            for key in keys:
+                version = self._versions.get(key)
+                if version is None:
+                    version = self._issue(_initial_version())
+                    self._versions.set(key, version)
+                versions.append(version)
+            return versions
+
+    def incr_versions(self, keys: List[str]):
+        with self._lock:
+            for key in keys:
+                version = self._versions.get(key)
+                self._versions.set(key, self._issue(_initial_version() if version is None else version + 1))
+
+    def clear(self):
+        self.store.clear()
+        with self._lock:
+            self._versions.clear()
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.store.stats()
+        return {"evictions": stats["evictions"], "size": stats["size"], "maxsize": stats["maxsize"],
+                "versions": self._versions.stats()["size"]}
+
+
+class RedisBackend(CacheBackend):
+    """
+    Кэш в Redis (или совместимом по протоколу сервере), общий для всех воркеров и хостов.
+    Принимает готовый клиент с интерфейсом redis.Redis, поэтому в тестах его можно подменить.
+    """
+    blocking = True
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        if redis is None:
+            raise RuntimeError("Для CACHE_BACKEND=redis нужен пакет redis")
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+    def get_versions(self, keys: List[str]) -> List[int]:
+        values = self.client.mget(keys)
+        missing = [key for key, value in zip(keys, values) if value is None]
+        if missing:
+            initial = _initial_version()
+            for key in missing:
+                self.client.set(key, initial, nx=True)
+            values = self.client.mget(keys)
+        return [int(value) for value in values]
+
+    def incr_versions(self, keys: List[str]):
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.incr(key)
+        pipe.execute()
+
+    def clear(self):
+        self.client.flushdb()
+
+
+class ProductCache:
+    """
+    Кэш каталога поверх CacheBackend. Значения — готовый JSON ответа в байтах.
+
+    Ключ записи содержит версию: товара (product:<id>) или категории списка
+    (category:<name>, для списка без фильтра — category:*). Изменение товара
+    увеличивает версии, и старые записи просто перестают читаться во всех
+    процессах, разделяющих хранилище, а затем истекают по TTL.
+
+    Недоступное хранилище не ломает запросы: чтение считается промахом, запись
+    и инвалидация пропускаются с записью в лог.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = 60.0, prefix: str = "catalog"):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _version_key(self, name: str) -> str:
+        return f"{self.prefix}:version:{name}"
+
+    def versions(self, names: List[str]) -> List[Any]:
+        """
+        Версии для ключей записей. Если хранилище недоступно, версия одноразовая:
+        по такому ключу ничего не найдется, и ETag из него не совпадет с выданными ранее.
+        """
+        try:
+            return self.backend.get_versions([self._version_key(name) for name in names])
+        except BACKEND_ERRORS as e:
+            log.warning(f"Кэш каталога недоступен, версии не получены: {e}")
+            return [f"x{uuid.uuid4().hex}" for _ in names]
+
+    def product_key(self, product_id: int) -> str:
+        (version,) = self.versions([f"product:{product_id}"])
+        return f"{self.prefix}:product:{product_id}:v{version}"
+
+    def listing_key(self, category: Optional[str], sort: str, skip: int, limit: int) -> str:
+        (version,) = self.versions([f"category:{category or '*'}"])
+        return f"{self.prefix}:products:{category or '*'}:{sort}:{skip}:{limit}:v{version}"
+
+    def search_key(self, params: str) -> str:
+        """
+        Ключ результата поиска. Фасеты считаются по всему каталогу,
+        поэтому ключ привязан к версии списка без фильтра (category:*).
+        """
+        (version,) = self.versions(["category:*"])
+        digest = hashlib.sha1(params.encode()).hexdigest()
+        return f"{self.prefix}:search:{digest}:v{version}"
+
+    async def call(self, method: Callable, *args):
+        """
+        Вызов метода кэша (или функции, которая к нему обращается) из async-кода.
+        Клиент Redis синхронный, поэтому вызов уходит в поток и не останавливает цикл событий;
+        кэш в памяти вызывается сразу.
+        """
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            value = self.backend.get(key)
+        except BACKEND_ERRORS as e:
+            log.warning(f"Кэш каталога недоступен, чтение из БД: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes):
+        try:
+            self.backend.set(key, value, self.ttl)
+        except BACKEND_ERRORS as e:
+            log.warning(f"Кэш каталога недоступен, запись не сохранена: {e}")
+
+    def invalidate(self, product_ids: Iterable[int] = (), categories: Iterable[Optional[str]] = ()):
+        """
+        Новая версия для измененных товаров и их категорий. Список без фильтра
+        (category:*) содержит любые товары, поэтому его версия растет всегда.
+        """
+        names = [f"product:{product_id}" for product_id in product_ids]
+        names += [f"category:{category}" for category in set(categories) if category]
+        names.append("category:*")
+        try:
+            self.backend.incr_versions([self._version_key(name) for name in names])
+        except BACKEND_ERRORS as e:
+            # Изменение в БД уже зафиксировано: старые записи доживут до TTL
+            log.error(f"Кэш каталога недоступен, инвалидация пропущена: {e}")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {"hits": self.hits, "misses": self.misses, "evictions": 0}
+        stats.update(self.backend.stats())
+        stats["backend"] = type(self.backend).__name__
+        return stats
+
+
+def create_backend() -> CacheBackend:
+    """Выбор хранилища по CACHE_BACKEND: memory (по умолчанию) или redis"""
+    kind = os.getenv("CACHE_BACKEND", "memory").lower()
+    if kind == "redis":
+        url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        log.info(f"Кэш каталога хранится в Redis: {url}")
+        return RedisBackend.from_url(url)
+    return MemoryBackend(maxsize=int(os.getenv("PRODUCT_CACHE_SIZE", "1024")))
+
+
+# Кэш каталога: отдельные товары и результаты списков
+product_cache = ProductCache(
+    create_backend(),
+    ttl=float(os.getenv("PRODUCT_CACHE_TTL", "60"))
+)
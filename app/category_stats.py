@@ -0,0 +1,125 @@
+from typing import Dict, Iterable, List
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from . import database, models
+from .logging_config import log
+
+# Сводка по категориям каталога (таблица category_stats). Строки обновляются в тех же транзакциях,
+# что меняют товары: создание товара и импорт добавляют товары в сводку, заказ уменьшает число товаров
+# в наличии, когда остаток доходит до нуля. Поэтому /api/categories читает несколько строк вместо
+# агрегации по всей таблице products. Изменения товаров в обход crud исправляет пересборка:
+#     python -m app.category_stats
+
+stats = models.CategoryStats.__table__
+products = models.Product.__table__
+
+
+def product_deltas(rows: Iterable) -> List[dict]:
+    """Прибавка к сводке по категориям для новых товаров (объекты или словари с category, price, stock_quantity)"""
+    deltas: Dict[str, dict] = {}
+    for row in rows:
+        if isinstance(row, dict):
+            category, price, stock = row["category"], row["price"], row.get("stock_quantity") or 0
+        else:
+            category, price, stock = row.category, row.price, row.stock_quantity or 0
+        delta = deltas.setdefault(category, {"category": category, "product_count": 0, "in_stock_count": 0,
+                                             "price_sum": 0.0, "min_price": price, "max_price": price})
+        delta["product_count"] += 1
+        delta["in_stock_count"] += stock > 0
+        delta["price_sum"] += price
+        delta["min_price"] = min(delta["min_price"], price)
+        delta["max_price"] = max(delta["max_price"], price)
+    return list(deltas.values())
+
+
+def add_products_statement(dialect_name: str, deltas: List[dict]):
+    """Один upsert для всех затронутых категорий: новая категория вставляется, существующая дополняется"""
+    statement = database.UPSERT_INSERTS[dialect_name](stats).values(deltas)
+    new = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[stats.c.category],
+        set_={
+            "product_count": stats.c.product_count + new.product_count,
+            "in_stock_count": stats.c.in_stock_count + new.in_stock_count,
+            "price_sum": stats.c.price_sum + new.price_sum,
+            "min_price": case((stats.c.min_price.is_(None) | (new.min_price < stats.c.min_price), new.min_price),
+                              else_=stats.c.min_price),
+            "max_price": case((stats.c.max_price.is_(None) | (new.max_price > stats.c.max_price), new.max_price),
+                              else_=stats.c.max_price),
+            "updated_at": func.now(),
+        },
+    )
+
+
+def sold_out_statement(category: str, count: int):
+    """Товары категории, остаток которых закончился при заказе"""
+    return (
+        update(stats)
+        .where(stats.c.category == category)
+        .values(in_stock_count=stats.c.in_stock_count - count, updated_at=func.now())
+    )
+
+
+def aggregate_query() -> Select:
+    """Полный расчет сводки по таблице products (для пересборки и проверки)"""
+    return (
+        select(
+            products.c.category,
+            func.count().label("product_count"),
+            func.coalesce(func.sum(case((products.c.stock_quantity > 0, 1), else_=0)), 0).label("in_stock_count"),
+            func.coalesce(func.sum(products.c.price), 0.0).label("price_sum"),
+            func.min(products.c.price).label("min_price"),
+            func.max(products.c.price).label("max_price"),
+        )
+        .group_by(products.c.category)
+        .order_by(products.c.category)
+    )
+
+
+def stats_query() -> Select:
+    """Строки сводки в виде ответа /api/categories"""
+    return (
+        select(
+            stats.c.category, stats.c.product_count, stats.c.in_stock_count, stats.c.min_price,
+            stats.c.max_price,
+            case((stats.c.product_count > 0, stats.c.price_sum / stats.c.product_count)).label("avg_price"),
+        )
+        .where(stats.c.product_count > 0)
+        .order_by(stats.c.category)
+    )
+
+
+def rebuild(db: Session) -> int:
+    """Пересборка сводки одним INSERT ... SELECT в одной транзакции; число категорий"""
+    try:
+        db.execute(delete(stats))
+        db.execute(insert(stats).from_select(
+            ["category", "product_count", "in_stock_count", "price_sum", "min_price", "max_price"], aggregate_query()))
+        db.commit()
+        count = db.execute(select(func.count()).select_from(stats)).scalar()
+        log.info(f"Сводка по категориям пересобрана: {count} категорий")
+        return count
+    except SQLAlchemyError as e:
+        db.rollback()
+        log.error(f"Ошибка при пересборке сводки по категориям: {e}")
+        raise
+
+
+def ensure_built(db: Session) -> bool:
+    """Сборка сводки при первом запуске на базе, где товары уже есть, а сводки еще нет"""
+    if db.execute(select(stats.c.category).limit(1)).first() is not None:
+        return False
+    if db.execute(select(products.c.id).limit(1)).first() is None:
+        return False
+    rebuild(db)
+    return True
+
+
+if __name__ == "__main__":
+    database.create_tables()
+    with database.SessionLocal() as session:
+        print(f"Категорий в сводке: {rebuild(session)}")
@@ -1,9 +1,21 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.exc import SQLAlchemyError
-from . import models, schemas  # Добавим models в импорт
+from . import category_stats, database, idempotency, jobs, metrics, models, replicas, schemas  # Добавим models в импорт
+from .bulk import (
+    EXPORT_BATCH_SIZE, IMPORT_CHUNK_SIZE, PRODUCT_IMPORT_FIELDS, ImportReport, Record, chunked, copy_csv,
+    export_chunks, order_export_chunks, validate_chunk
+)
+from .cache import product_cache
 from .logging_config import log
-from typing import List, Optional
-from sqlalchemy import desc
+from .pagination import apply_keyset, decode_cursor, next_cursor
+from .search import search_backend, search_terms
+from .serialization import (
+    ORDER_COLUMNS, ORDER_ITEM_COLUMNS, PRODUCT_COLUMNS, PRODUCT_FIELDS, USER_COLUMNS, USER_FIELDS, dumps,
+    orders_to_dicts, rows_json, rows_to_dicts
+)
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import and_, delete, desc, func, insert, select, update
+from sqlalchemy.sql import ColumnElement, Select
 
 
 # CRUD операции для пользователей
@@ -46,6 +58,36 @@ def get_users(db: Session, skip: int = 0, limit: int = 100):
         raise
 
 
+def get_users_json(db: Session, skip: int = 0, limit: int = 100) -> bytes:
+    """Список пользователей сразу в JSON (кортежи столбцов без ORM и Pydantic)"""
+    try:
+        rows = db.execute(select(*USER_COLUMNS).order_by(models.User.id).offset(skip).limit(limit)).all()
+        log.info(f"Получено {len(rows)} пользователей")
+        return rows_json(rows, USER_FIELDS)
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении списка пользователей: {e}")
+        raise
+
+
+def get_users_page(db: Session, limit: int = 100, cursor: Optional[str] = None,
+                   skip: int = 0) -> Tuple[List[models.User], Optional[str]]:
+    """Получение страницы пользователей по курсору (сортировка по id)"""
+    try:
+        query = select(models.User).order_by(models.User.id).limit(limit + 1)
+        if cursor:
+            _, last_id = decode_cursor(cursor, "id")
+            query = apply_keyset(query, None, models.User.id, False, None, last_id)
+        elif skip:
+            query = query.offset(skip)
+
+        rows = db.execute(query).scalars().all()
+        log.info(f"Получено {min(len(rows), limit)} пользователей (страница по курсору)")
+        return rows[:limit], next_cursor(rows, limit, "id", None)
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении страницы пользователей: {e}")
+        raise
+
+
 def create_user(db: Session, user: schemas.UserCreate):
     """Создание нового пользователя"""
     try:
@@ -83,15 +125,71 @@ def get_product(db: Session, product_id: int):
         raise
 
 
-def get_products(db: Session, skip: int = 0, limit: int = 100, category: Optional[str] = None):
-    """Получение списка товаров с возможностью фильтрации по категории"""
+# Поддерживаемые сортировки товаров: атрибут ключа сортировки (None — только id) и направление
+PRODUCT_SORTS = {
+    "id": (None, False),
+    "price": ("price", False),
+    "price_desc": ("price", True),
+    "name": ("name", False),
+}
+
+
+def product_sort_name(sort: Optional[str]) -> str:
+    """Нормализация параметра sort: неизвестные значения сортируются по id, как и раньше"""
+    return sort if sort in PRODUCT_SORTS else "id"
+
+
+def product_order_by(sort: Optional[str]) -> list:
+    """Порядок строк для сортировки каталога: ключ и id"""
+    key_attr, descending = PRODUCT_SORTS[product_sort_name(sort)]
+    columns = [models.Product.id] if key_attr is None else [getattr(models.Product, key_attr), models.Product.id]
+    return [desc(column) if descending else column for column in columns]
+
+
+def products_query(category: Optional[str] = None, sort: Optional[str] = None,
+                   cursor: Optional[str] = None) -> Select:
+    """
+    Построение запроса списка товаров.
+    Общий для синхронного и асинхронного слоя, поэтому возвращает select(), а не Query.
+    Порядок всегда дополняется id, чтобы он был однозначным и совпадал с индексами (sort_key, id).
+    """
+    sort = product_sort_name(sort)
+    key_attr, descending = PRODUCT_SORTS[sort]
+    key_column = getattr(models.Product, key_attr) if key_attr else None
+
+    query = select(models.Product)
+    if category:
+        query = query.where(models.Product.category == category)
+
+    query = query.order_by(*product_order_by(sort))
+
+    if cursor:
+        key, last_id = decode_cursor(cursor, sort)
+        query = apply_keyset(query, key_column, models.Product.id, descending, key, last_id)
+    return query
+
+
+def products_page_query(limit: int, category: Optional[str] = None, sort: Optional[str] = None,
+                        cursor: Optional[str] = None, skip: int = 0) -> Select:
+    """
+    Запрос страницы товаров: limit + 1 строка, чтобы понять, есть ли следующая страница.
+    skip учитывается только без курсора (для обратной совместимости).
+    """
+    query = products_query(category, sort, cursor).limit(limit + 1)
+    if skip and not cursor:
+        query = query.offset(skip)
+    return query
+
+
+def get_products(db: Session, skip: int = 0, limit: int = 100, category: Optional[str] = None,
+                 sort: Optional[str] = None):
+    """Получение списка товаров с возможностью фильтрации по категории и сортировки"""
     try:
-        query = db.query(models.Product)
         if category:
-            query = query.filter(models.Product.category == category)
             log.info(f"Фильтрация товаров по категории: {category}")
 
-        products = query.offset(skip).limit(limit).all()
+        query = products_query(category, sort).offset(skip).limit(limit)
+        products = db.execute(query).scalars().all()
         log.info(f"Получено {len(products)} товаров")
         return products
     except SQLAlchemyError as e:
@@ -99,13 +197,207 @@ def get_products(db: Session, skip: int = 0, limit: int = 100, category: Optiona
         raise
 
 
+def get_products_page(db: Session, limit: int = 100, category: Optional[str] = None, sort: Optional[str] = None,
+                      cursor: Optional[str] = None, skip: int = 0) -> Tuple[List[models.Product], Optional[str]]:
+    """Получение страницы товаров по курсору; возвращает товары и курсор следующей страницы"""
+    try:
+        rows = db.execute(products_page_query(limit, category, sort, cursor, skip)).scalars().all()
+        sort = product_sort_name(sort)
+        token = next_cursor(rows, limit, sort, PRODUCT_SORTS[sort][0])
+        log.info(f"Получено {min(len(rows), limit)} товаров (страница по курсору)")
+        return rows[:limit], token
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении страницы товаров: {e}")
+        raise
+
+
+# Кэш каталога: значения хранятся готовым JSON ответа, чтобы не сериализовать товары повторно
+def products_cache_key(skip: int, limit: int, category: Optional[str], sort: Optional[str]) -> str:
+    return product_cache.listing_key(category, product_sort_name(sort), skip, limit)
+
+
+def product_json(product: models.Product) -> bytes:
+    return schemas.Product.model_validate(product).model_dump_json().encode()
+
+
+def products_rows_query(skip: int, limit: int, category: Optional[str], sort: Optional[str]) -> Select:
+    """Тот же список товаров, но кортежами столбцов для быстрой сериализации"""
+    return products_query(category, sort).with_only_columns(*PRODUCT_COLUMNS).offset(skip).limit(limit)
+
+
+def invalidate_products(product_ids: Iterable[int] = (), categories: Iterable[str] = ()):
+    """
+    Инвалидация кэша каталога после изменения товаров (видна всем воркерам с общим хранилищем).
+    Чтения каталога сначала закрепляются за основной базой: новые записи кэша не должны
+    заполниться с реплики, которая еще не получила изменение.
+    """
+    replicas.replica_router.pin()
+    product_cache.invalidate(product_ids, categories)
+
+
+def get_product_json(db: Session, product_id: int, key: Optional[str] = None) -> Optional[bytes]:
+    """Получение товара в виде JSON через кэш каталога (key — уже вычисленный ключ кэша)"""
+    key = key or product_cache.product_key(product_id)
+    cached = product_cache.get(key)
+    if cached is not None:
+        return cached
+    product = get_product(db, product_id)
+    if product is None:
+        return None
+    data = product_json(product)
+    product_cache.set(key, data)
+    return data
+
+
+def get_products_json(db: Session, skip: int = 0, limit: int = 100, category: Optional[str] = None,
+                      sort: Optional[str] = None, key: Optional[str] = None) -> bytes:
+    """Получение списка товаров в виде JSON через кэш каталога (key — уже вычисленный ключ кэша)"""
+    key = key or products_cache_key(skip, limit, category, sort)
+    cached = product_cache.get(key)
+    if cached is not None:
+        return cached
+    data = rows_json(db.execute(products_rows_query(skip, limit, category, sort)).all(), PRODUCT_FIELDS)
+    log.info(f"Получен список товаров для кэша: category={category}, sort={sort}, skip={skip}, limit={limit}")
+    product_cache.set(key, data)
+    return data
+
+
+# Поиск товаров: полнотекстовый запрос, фильтры и счетчики фасетов
+SEARCH_FACETS = ("category", "size", "color")
+FACET_LIMIT = 50
+
+
+def search_filters(category: Optional[str] = None, size: Optional[str] = None, color: Optional[str] = None,
+                   min_price: Optional[float] = None, max_price: Optional[float] = None) -> Dict[str, ColumnElement]:
+    """Условия фильтров поиска по имени фасета (цена — фасет "price")"""
+    filters = {}
+    for name, value in (("category", category), ("size", size), ("color", color)):
+        if value:
+            filters[name] = getattr(models.Product, name) == value
+    if min_price is not None:
+        filters["price"] = models.Product.price >= min_price
+    if max_price is not None:
+        condition = models.Product.price <= max_price
+        filters["price"] = and_(filters["price"], condition) if "price" in filters else condition
+    return filters
+
+
+def filtered_search(query: Select, terms: List[str], filters: Dict[str, ColumnElement],
+                    exclude: Optional[str] = None) -> Tuple[Select, Optional[ColumnElement]]:
+    """Применение текстового запроса и фильтров (кроме exclude); возвращает запрос и релевантность"""
+    rank = None
+    if terms:
+        query, rank = search_backend.apply(query, terms)
+    conditions = [condition for name, condition in filters.items() if name != exclude]
+    if conditions:
+        query = query.where(*conditions)
+    return query, rank
+
+
+def search_rows_query(terms: List[str], filters: Dict[str, ColumnElement], sort: Optional[str] = None,
+                      skip: int = 0, limit: int = 20) -> Select:
+    """
+    Найденные товары кортежами столбцов.
+    С текстовым запросом по умолчанию сортируются по релевантности, иначе — как каталог.
+    """
+    query, rank = filtered_search(select(*PRODUCT_COLUMNS), terms, filters)
+    if rank is not None and sort in (None, "relevance"):
+        query = query.order_by(rank, models.Product.id)
+    else:
+        query = query.order_by(*product_order_by(sort))
+    return query.offset(skip).limit(limit)
+
+
+def search_total_query(terms: List[str], filters: Dict[str, ColumnElement]) -> Select:
+    return filtered_search(select(func.count()).select_from(models.Product), terms, filters)[0]
+
+
+def search_total_from_facets(category: Optional[str], category_counts: list) -> Optional[int]:
+    """
+    Общее число найденных товаров из счетчиков фасета category: они посчитаны со всеми
+    фильтрами, кроме категории. Если список обрезан FACET_LIMIT, возвращает None
+    и число считается отдельным запросом.
+    """
+    if len(category_counts) >= FACET_LIMIT:
+        return None
+    if category:
+        return next((count for value, count in category_counts if value == category), 0)
+    return sum(count for _, count in category_counts)
+
+
+def search_facet_queries(terms: List[str], filters: Dict[str, ColumnElement]) -> Dict[str, Select]:
+    """
+    Запросы счетчиков фасетов. Фильтр самого фасета при подсчете не применяется, чтобы
+    были видны и остальные его значения. Без текстового запроса счетчики считаются
+    по составным индексам (фасет, price), не читая строк таблицы.
+    """
+    queries = {}
+    for name in SEARCH_FACETS:
+        column = getattr(models.Product, name)
+        query, _ = filtered_search(select(column, func.count()), terms, filters, exclude=name)
+        queries[name] = query.group_by(column).order_by(desc(func.count()), column).limit(FACET_LIMIT)
+    queries["price"], _ = filtered_search(
+        select(func.min(models.Product.price), func.max(models.Product.price)), terms, filters, exclude="price"
+    )
+    return queries
+
+
+def search_result_json(rows, total: int, facet_rows: Dict[str, list]) -> bytes:
+    """Результат поиска в JSON по схеме schemas.ProductSearchResult"""
+    facets = {
+        name: [{"value": value, "count": count} for value, count in facet_rows[name]]
+        for name in SEARCH_FACETS
+    }
+    low, high = facet_rows["price"][0]
+    facets["price"] = {"min": low, "max": high}
+    return dumps({"items": rows_to_dicts(rows, PRODUCT_FIELDS), "total": total, "facets": facets})
+
+
+def search_cache_key(terms: List[str], category: Optional[str], size: Optional[str], color: Optional[str],
+                     min_price: Optional[float], max_price: Optional[float], sort: Optional[str],
+                     skip: int, limit: int) -> str:
+    """Ключ кэша каталога для результата поиска (запрос учитывается уже разобранным на слова)"""
+    params = [terms, category, size, color, min_price, max_price, sort, skip, limit]
+    return product_cache.search_key(repr(params))
+
+
+def search_products_json(db: Session, q: Optional[str] = None, category: Optional[str] = None,
+                         size: Optional[str] = None, color: Optional[str] = None,
+                         min_price: Optional[float] = None, max_price: Optional[float] = None,
+                         sort: Optional[str] = None, skip: int = 0, limit: int = 20) -> bytes:
+    """Поиск товаров с фасетами в виде JSON через кэш каталога"""
+    try:
+        terms = search_terms(q)
+        key = search_cache_key(terms, category, size, color, min_price, max_price, sort, skip, limit)
+        cached = product_cache.get(key)
+        if cached is not None:
+            return cached
+        filters = search_filters(category, size, color, min_price, max_price)
+        rows = db.execute(search_rows_query(terms, filters, sort, skip, limit)).all()
+        facet_rows = {name: db.execute(query).all() for name, query in search_facet_queries(terms, filters).items()}
+        total = search_total_from_facets(category, facet_rows["category"])
+        if total is None:
+            total = db.execute(search_total_query(terms, filters)).scalar_one()
+        log.info(f"Поиск товаров: q={q!r}, фильтры={sorted(filters)}, найдено {total}")
+        data = search_result_json(rows, total, facet_rows)
+        product_cache.set(key, data)
+        return data
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при поиске товаров: {e}")
+        raise
+
+
 def create_product(db: Session, product: schemas.ProductCreate):
     """Создание нового товара"""
     try:
         db_product = models.Product(**product.dict())
         db.add(db_product)
+        # Сводка по категории обновляется в той же транзакции
+        db.execute(category_stats.add_products_statement(db.get_bind().dialect.name,
+                                                          category_stats.product_deltas([db_product])))
         db.commit()
         db.refresh(db_product)
+        invalidate_products(categories=[db_product.category])
         log.info(f"Создан новый товар: {product.name}")
         return db_product
     except SQLAlchemyError as e:
@@ -114,63 +406,517 @@ def create_product(db: Session, product: schemas.ProductCreate):
         raise
 
 
-# CRUD операции для заказов
-def create_order(db: Session, order: schemas.OrderCreate, user_id: int):
-    """Создание нового заказа"""
+def get_category_stats(db: Session) -> List[dict]:
+    """Сводка по категориям из category_stats (без обращения к products)"""
     try:
-        # Расчет общей суммы заказа
-        total_amount = 0
-        order_products = []
+        rows = db.execute(category_stats.stats_query()).mappings().all()
+        log.info(f"Получена сводка по {len(rows)} категориям")
+        return [dict(row) for row in rows]
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении сводки по категориям: {e}")
+        raise
 
-        for item in order.products:
-            product = get_product(db, item.product_id)
-            if not product:
-                log.error(f"Товар с ID {item.product_id} не найден")
-                raise ValueError(f"Товар с ID {item.product_id} не существует")
 
-            if product.stock_quantity < item.quantity:
-                log.error(f"Недостаточно товара {product.name} в наличии")
-                raise ValueError(f"Недостаточно товара {product.name} в наличии")
+# Массовый импорт и экспорт товаров
+def insert_products(db: Session, rows: List[dict]):
+    """
+    Запись пачки проверенных товаров без загрузки их обратно в сессию.
+    В PostgreSQL (psycopg2) — через COPY, иначе — одним executemany; сводка по категориям — в той же транзакции.
+    """
+    connection = db.connection()
+    if connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg2":
+        columns = ", ".join(PRODUCT_IMPORT_FIELDS)
+        with connection.connection.dbapi_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY products ({columns}) FROM STDIN WITH (FORMAT csv)", copy_csv(rows, PRODUCT_IMPORT_FIELDS)
+            )
+    else:
+        connection.execute(insert(models.Product.__table__), rows)
+    connection.execute(category_stats.add_products_statement(connection.dialect.name,
+                                                              category_stats.product_deltas(rows)))
+
+
+def import_products(db: Session, records: Iterable[Record], chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """
+    Импорт товаров из потока строк файла: пачка проверяется и записывается отдельной транзакцией,
+    ошибочные строки пропускаются и попадают в отчет.
+    Ошибка записи пачки прерывает импорт; уже записанные пачки остаются в базе.
+    """
+    report = ImportReport()
+    categories = set()
+    try:
+        for chunk in chunked(records, chunk_size):
+            rows, errors = validate_chunk(chunk)
+            if rows:
+                insert_products(db, rows)
+                db.commit()
+                metrics.products_imported.inc(amount=len(rows))
+                categories.update(row["category"] for row in rows)
+            report.add(len(rows), errors)
+        log.info(f"Импорт товаров: записано {report.imported}, отклонено {report.failed}")
+        return report.as_dict()
+    except SQLAlchemyError as e:
+        db.rollback()
+        log.error(f"Ошибка при импорте товаров (записано {report.imported}): {e}")
+        raise
+    finally:
+        if categories:
+            invalidate_products(categories=categories)
+
+
+def export_products(db: Session, format: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Экспорт всех товаров кусками файла. Строки читаются серверным курсором пачками
+    по batch_size (yield_per), поэтому таблица целиком в память не загружается.
+    """
+    query = select(*PRODUCT_COLUMNS).order_by(models.Product.id).execution_options(yield_per=batch_size)
+    result = db.execute(query)
+    yield from export_chunks(result.partitions(), PRODUCT_FIELDS, format)
+
+
+# CRUD операции для заказов
+def order_quantities(order: schemas.OrderCreate) -> Dict[int, int]:
+    """Суммарное количество по каждому товару заказа (повторяющиеся позиции объединяются)"""
+    quantities: Dict[int, int] = {}
+    for item in order.products:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return quantities
+
+
+def order_products_query(product_ids: List[int]) -> Select:
+    """
+    Загрузка всех товаров заказа одним запросом IN (...).
+    На PostgreSQL строки блокируются через SELECT ... FOR UPDATE в порядке id,
+    чтобы параллельные заказы не взаимоблокировались; SQLite опцию игнорирует.
+    """
+    return (
+        select(models.Product)
+        .where(models.Product.id.in_(product_ids))
+        .order_by(models.Product.id)
+        .with_for_update()
+    )
+
+
+def reserve_stock_statement(product_id: int, quantity: int):
+    """
+    Атомарное списание остатка: строка обновляется, только если товара хватает.
+    Возвращает новый остаток (нет строки — товара не хватило).
+    """
+    return (
+        update(models.Product)
+        .where(models.Product.id == product_id, models.Product.stock_quantity >= quantity)
+        .values(stock_quantity=models.Product.stock_quantity - quantity)
+        .returning(models.Product.stock_quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def sold_out_categories(products: List[models.Product], remaining: Dict[int, int]) -> Dict[str, int]:
+    """Число товаров по категориям, остаток которых закончился после списания"""
+    sold_out: Dict[str, int] = {}
+    for product in products:
+        if remaining[product.id] == 0:
+            sold_out[product.category] = sold_out.get(product.category, 0) + 1
+    return sold_out
+
+
+def order_items_statement(order_id: int, products: List[models.Product], quantities: Dict[int, int]):
+    """Один пакетный INSERT позиций заказа с количеством и ценой на момент покупки"""
+    return insert(models.OrderItem).values([
+        {
+            "order_id": order_id,
+            "product_id": product.id,
+            "quantity": quantities[product.id],
+            "unit_price": product.price,
+        }
+        for product in products
+    ])
+
+
+def check_order_products(quantities: Dict[int, int], products: List[models.Product]):
+    """Проверка, что все товары заказа существуют"""
+    found = {product.id for product in products}
+    for product_id in quantities:
+        if product_id not in found:
+            log.error(f"Товар с ID {product_id} не найден")
+            raise ValueError(f"Товар с ID {product_id} не существует")
+
 
-            total_amount += product.price * item.quantity
-            order_products.append(product)
+def create_order(db: Session, order: schemas.OrderCreate, user_id: int, idempotency_key: Optional[str] = None,
+                 idempotency_token: Optional[str] = None):
+    """
+    Создание нового заказа.
+    Товары загружаются одним запросом, остатки списываются условными UPDATE
+    в одной транзакции, поэтому параллельные заказы не могут продать больше, чем есть на складе.
+    idempotency_key — захваченный ключ идемпотентности (idempotency_token — токен захвата),
+    отмечается выполненным в той же транзакции.
+    """
+    try:
+        quantities = order_quantities(order)
+        products = db.execute(order_products_query(sorted(quantities))).scalars().all()
+        check_order_products(quantities, products)
 
-            # Обновление количества товара на складе
-            product.stock_quantity -= item.quantity
+        total_amount = 0
+        remaining = {}
+        for product in products:
+            quantity = quantities[product.id]
+            remaining[product.id] = db.execute(reserve_stock_statement(product.id, quantity)).scalar()
+            metrics.stock_reservations.inc("insufficient" if remaining[product.id] is None else "reserved")
+            if remaining[product.id] is None:
+                log.error(f"Недостаточно товара {product.name} в наличии")
+                raise ValueError(f"Недостаточно товара {product.name} в наличии")
+            total_amount += product.price * quantity
+        for category, count in sold_out_categories(products, remaining).items():
+            db.execute(category_stats.sold_out_statement(category, count))
 
-        # Создание заказа
+        # Создание заказа и его позиций
         db_order = models.Order(
             user_id=user_id,
             total_amount=total_amount,
             status="pending"
         )
-
-        # Добавление товаров к заказу
-        for product in order_products:
-            db_order.products.append(product)
-
         db.add(db_order)
+        db.flush()
+        db.execute(order_items_statement(db_order.id, products, quantities))
+        # Дальнейшая обработка заказа (подтверждение) — событием outbox в той же транзакции
+        event = jobs.outbox_event("order_created", order_id=db_order.id, user_id=user_id)
+        db.add(event)
+        db.flush()
+        event_id = event.id
+        if idempotency_key is not None:
+            idempotency.store.complete(db, idempotency_key, idempotency_token, db_order.id)
+
         db.commit()
+        invalidate_products(product_ids=quantities, categories=[product.category for product in products])
+        replicas.replica_router.pin(user_id)
+        metrics.orders_created.inc()
+        metrics.stock_units_reserved.inc(amount=sum(quantities.values()))
         db.refresh(db_order)
+        jobs.queue.dispatch([event_id])
 
         log.info(f"Создан новый заказ ID {db_order.id} для пользователя ID {user_id}")
         return db_order
 
+    except (ValueError, idempotency.ClaimLost):
+        db.rollback()
+        raise
     except SQLAlchemyError as e:
         db.rollback()
         log.error(f"Ошибка при создании заказа: {e}")
         raise
 
 
+def order_json(order: models.Order) -> str:
+    """Тело ответа с заказом (как у response_model schemas.Order)"""
+    return schemas.Order.model_validate(order).model_dump_json()
+
+
+def create_order_idempotent(db: Session, order: schemas.OrderCreate, user_id: int,
+                            idempotency_key: str) -> Tuple[str, bool]:
+    """
+    Создание заказа с ключом идемпотентности: (JSON заказа, повтор ли это).
+    Повтор отвечает сохраненным снимком без обращения к товарам; параллельный повтор
+    ждет завершения первого запроса.
+    """
+    key = idempotency.scoped_key(user_id, idempotency_key)
+    token, record = idempotency.store.begin(db, key, idempotency.fingerprint(order.model_dump_json()))
+    if record is not None:
+        log.info(f"Повтор заказа по ключу идемпотентности {key}: заказ ID {record.order_id}")
+        if record.response is not None:
+            return record.response, True
+        # Процесс упал между commit заказа и сохранением снимка: ответ строится по самому заказу
+        return order_json(get_order(db, record.order_id)), True
+
+    try:
+        db_order = create_order(db, order, user_id, idempotency_key=key, idempotency_token=token)
+    except Exception:
+        idempotency.store.release(db, key, token)
+        raise
+    content = order_json(db_order)
+    idempotency.store.save_response(db, key, token, content)
+    return content, False
+
+
+def get_order(db: Session, order_id: int):
+    """Получение заказа по ID"""
+    try:
+        # Позиции загружаются сразу, их все равно сериализует schemas.Order
+        order = db.get(models.Order, order_id, options=[selectinload(models.Order.items)])
+        if order:
+            log.info(f"Заказ с ID {order_id} найден")
+        else:
+            log.warning(f"Заказ с ID {order_id} не найден")
+        return order
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении заказа {order_id}: {e}")
+        raise
+
+
 def get_orders(db: Session, user_id: int, skip: int = 0, limit: int = 100):
     """Получение списка заказов пользователя"""
     try:
         orders = db.query(models.Order).filter(
             models.Order.user_id == user_id
-        ).offset(skip).limit(limit).all()
+        ).options(selectinload(models.Order.items)).order_by(models.Order.id).offset(skip).limit(limit).all()
 
         log.info(f"Получено {len(orders)} заказов для пользователя ID {user_id}")
         return orders
     except SQLAlchemyError as e:
         log.error(f"Ошибка при получении заказов пользователя ID {user_id}: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+def get_orders_json(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> bytes:
+    """
+    Список заказов пользователя сразу в JSON: один запрос заказов и один запрос
+    их позиций по IN, независимо от размера страницы.
+    """
+    try:
+        order_rows = db.execute(
+            select(*ORDER_COLUMNS)
+            .where(models.Order.user_id == user_id)
+            .order_by(models.Order.id)
+            .offset(skip)
+            .limit(limit)
+        ).all()
+        order_ids = [row.id for row in order_rows]
+        item_rows = db.execute(
+            select(*ORDER_ITEM_COLUMNS)
+            .where(models.OrderItem.order_id.in_(order_ids))
+            .order_by(models.OrderItem.id)
+        ).all() if order_ids else []
+
+        log.info(f"Получено {len(order_rows)} заказов для пользователя ID {user_id}")
+        return dumps(orders_to_dicts(order_rows, item_rows))
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении заказов пользователя ID {user_id}: {e}")
+        raise
+
+
+def export_orders(db: Session, user_id: int, format: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Экспорт всех заказов пользователя кусками файла.
+    Заказы читаются серверным курсором пачками по batch_size (yield_per), позиции каждой
+    пачки догружаются одним запросом IN, как в selectinload, поэтому память не растет
+    с числом заказов.
+    """
+    query = (
+        select(*ORDER_COLUMNS)
+        .where(models.Order.user_id == user_id)
+        .order_by(models.Order.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+    def batches():
+        for order_rows in db.execute(query).partitions():
+            item_rows = db.execute(
+                select(*ORDER_ITEM_COLUMNS)
+                .where(models.OrderItem.order_id.in_([row.id for row in order_rows]))
+                .order_by(models.OrderItem.id)
+            ).all()
+            yield orders_to_dicts(order_rows, item_rows)
+
+    log.info(f"Экспорт заказов пользователя ID {user_id} ({format})")
+    yield from order_export_chunks(batches(), format)
+
+
+def get_orders_page(db: Session, user_id: int, limit: int = 100, cursor: Optional[str] = None,
+                    skip: int = 0) -> Tuple[List[models.Order], Optional[str]]:
+    """Получение страницы заказов пользователя по курсору (сортировка по id, индекс (user_id, id))"""
+    try:
+        query = (
+            select(models.Order)
+            .where(models.Order.user_id == user_id)
+            .options(selectinload(models.Order.items))
+            .order_by(models.Order.id)
+            .limit(limit + 1)
+        )
+        if cursor:
+            _, last_id = decode_cursor(cursor, "id")
+            query = apply_keyset(query, None, models.Order.id, False, None, last_id)
+        elif skip:
+            query = query.offset(skip)
+
+        rows = db.execute(query).scalars().all()
+        log.info(f"Получено {min(len(rows), limit)} заказов для пользователя ID {user_id} (страница по курсору)")
+        return rows[:limit], next_cursor(rows, limit, "id", None)
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении страницы заказов пользователя ID {user_id}: {e}")
+        raise
+
+
+# Серверная корзина
+class InvalidCart(ValueError):
+    """Корзину нельзя оформить: цены изменились, товара не хватает или он удален"""
+
+    def __init__(self, cart: schemas.Cart):
+        super().__init__("Корзина изменилась, проверьте позиции")
+        self.cart = cart
+
+
+def cart_lines_query(user_id: int) -> Select:
+    """Позиции корзины вместе с текущими ценой и остатком товаров — один запрос на всю корзину"""
+    return (
+        select(
+            models.CartItem.product_id, models.CartItem.quantity, models.CartItem.unit_price,
+            models.Product.name, models.Product.price, models.Product.stock_quantity,
+        )
+        .outerjoin(models.Product, models.Product.id == models.CartItem.product_id)
+        .where(models.CartItem.user_id == user_id)
+        .order_by(models.CartItem.id)
+    )
+
+
+def cart_line_status(row) -> str:
+    if row.price is None:
+        return "not_found"
+    if (row.stock_quantity or 0) < row.quantity:
+        return "insufficient_stock"
+    if row.price != row.unit_price:
+        return "price_changed"
+    return "ok"
+
+
+def build_cart(user_id: int, rows) -> schemas.Cart:
+    """Корзина из строк cart_lines_query; сумма считается по текущим ценам"""
+    items = [
+        schemas.CartLine(
+            product_id=row.product_id, name=row.name, quantity=row.quantity, unit_price=row.unit_price,
+            price=row.price, stock_quantity=row.stock_quantity or 0, status=cart_line_status(row),
+        )
+        for row in rows
+    ]
+    return schemas.Cart(
+        user_id=user_id,
+        items=items,
+        total_items=sum(item.quantity for item in items),
+        total_amount=sum(item.price * item.quantity for item in items if item.price is not None),
+        valid=all(item.status == "ok" for item in items),
+    )
+
+
+def get_cart(db: Session, user_id: int) -> schemas.Cart:
+    """Корзина пользователя с проверкой остатков и цен всех позиций одним запросом"""
+    try:
+        return build_cart(user_id, db.execute(cart_lines_query(user_id)).all())
+    except SQLAlchemyError as e:
+        log.error(f"Ошибка при получении корзины пользователя ID {user_id}: {e}")
+        raise
+
+
+def validate_cart(db: Session, user_id: int) -> schemas.Cart:
+    """
+    Проверка корзины перед оформлением. Результат показывает изменения цен,
+    после чего в корзине фиксируются текущие цены: оформление идет по ним.
+    """
+    try:
+        cart = get_cart(db, user_id)
+        changed = {item.product_id: item.price for item in cart.items if item.status == "price_changed"}
+        if changed:
+            db.execute(
+                update(models.CartItem)
+                .where(models.CartItem.user_id == user_id, models.CartItem.product_id.in_(changed))
+                .values(unit_price=select(models.Product.price)
+                        .where(models.Product.id == models.CartItem.product_id)
+                        .scalar_subquery())
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            log.info(f"Обновлены цены {len(changed)} позиций корзины пользователя ID {user_id}")
+        return cart
+    except SQLAlchemyError as e:
+        db.rollback()
+        log.error(f"Ошибка при проверке корзины пользователя ID {user_id}: {e}")
+        raise
+
+
+def set_cart_item(db: Session, user_id: int, product_id: int, quantity: int, add: bool = False) -> schemas.Cart:
+    """
+    Установка количества товара в корзине (add=True — добавление к текущему).
+    Остаток проверяется на сервере; окончательно он списывается при оформлении заказа.
+    """
+    try:
+        if quantity == 0 and not add:
+            db.execute(
+                delete(models.CartItem)
+                .where(models.CartItem.user_id == user_id, models.CartItem.product_id == product_id)
+            )
+            db.commit()
+            log.info(f"Товар ID {product_id} удален из корзины пользователя ID {user_id}")
+            return get_cart(db, user_id)
+
+        product = db.get(models.Product, product_id)
+        if product is None:
+            log.warning(f"Товар с ID {product_id} не найден")
+            raise ValueError(f"Товар с ID {product_id} не существует")
+        # Одна команда вставляет позицию или меняет существующую: параллельные добавления того же товара
+        # не теряют друг друга и не упираются в уникальность (user_id, product_id)
+        statement = database.UPSERT_INSERTS[db.get_bind().dialect.name](models.CartItem).values(
+            user_id=user_id, product_id=product_id, quantity=quantity, unit_price=product.price)
+        new = statement.excluded
+        cart_items = models.CartItem.__table__
+        new_quantity = db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[cart_items.c.user_id, cart_items.c.product_id],
+                # Покупатель видел товар только что: цена в корзине обновляется вместе с количеством
+                set_={"quantity": cart_items.c.quantity + new.quantity if add else new.quantity,
+                      "unit_price": new.unit_price, "updated_at": func.now()},
+            ).returning(cart_items.c.quantity)
+        ).scalar_one()
+        # Остаток проверяется по итоговому количеству до commit: при нехватке изменение откатывается
+        if new_quantity > (product.stock_quantity or 0):
+            db.rollback()
+            log.warning(f"Недостаточно товара {product.name} для корзины пользователя ID {user_id}")
+            raise ValueError(f"Недостаточно товара {product.name} в наличии")
+        db.commit()
+        log.info(f"Товар ID {product_id} x{new_quantity} в корзине пользователя ID {user_id}")
+        return get_cart(db, user_id)
+
+    except ValueError:
+        db.rollback()
+        raise
+    except SQLAlchemyError as e:
+        db.rollback()
+        log.error(f"Ошибка при изменении корзины пользователя ID {user_id}: {e}")
+        raise
+
+
+def clear_cart(db: Session, user_id: int):
+    """Очистка корзины пользователя"""
+    try:
+        db.execute(delete(models.CartItem).where(models.CartItem.user_id == user_id))
+        db.commit()
+        log.info(f"Корзина пользователя ID {user_id} очищена")
+    except SQLAlchemyError as e:
+        db.rollback()
+        log.error(f"Ошибка при очистке корзины пользователя ID {user_id}: {e}")
+        raise
+
+
+def checkout_cart(db: Session, user_id: int) -> models.Order:
+    """
+    Оформление корзины в заказ. Позиции удаляются в той же транзакции, которую
+    фиксирует create_order: при нехватке товара откатываются и заказ, и очистка корзины.
+    """
+    try:
+        cart = get_cart(db, user_id)
+        if not cart.items:
+            raise ValueError("Корзина пуста")
+        if not cart.valid:
+            raise InvalidCart(cart)
+
+        db.execute(delete(models.CartItem).where(models.CartItem.user_id == user_id))
+        order = schemas.OrderCreate(products=[
+            schemas.OrderProduct(product_id=item.product_id, quantity=item.quantity) for item in cart.items
+        ])
+        db_order = create_order(db, order, user_id)
+        log.info(f"Корзина пользователя ID {user_id} оформлена в заказ ID {db_order.id}")
+        return db_order
+
+    except ValueError:
+        db.rollback()
+        raise
+    except SQLAlchemyError as e:
+        db.rollback()
+        log.error(f"Ошибка при оформлении корзины пользователя ID {user_id}: {e}")
+        raise
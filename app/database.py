@@ -1,9 +1,18 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from typing import Any, Dict, Optional, Tuple
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from .logging_config import log
+from .metrics import instrument_engine
+from .profiling import profiler
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -11,18 +20,189 @@ load_dotenv()
 # Получение параметров подключения из переменных окружения
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./clothing_store.db")
 
-# Создание движка базы данных
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+
+def _async_url(url: str) -> str:
+    """Подбор асинхронного драйвера для синхронного URL подключения"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+
+# URL для асинхронного движка (можно переопределить явно)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
+# Пул соединений: на воркер приходится до DB_POOL_SIZE + DB_MAX_OVERFLOW соединений
+# у каждого из двух движков (синхронного и асинхронного)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Сколько секунд ждать свободного соединения, прежде чем вернуть ошибку
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Соединения старше DB_POOL_RECYCLE секунд переоткрываются (сервер или прокси закрывают простаивающие)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Проверка соединения перед выдачей из пула; для файла SQLite не нужна
+DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING", not DATABASE_URL.startswith("sqlite"))
+
+# SQLite: WAL позволяет читать параллельно с записью, synchronous=NORMAL в режиме WAL
+# не теряет целостность, а busy_timeout ждет блокировку вместо ошибки "database is locked"
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+
+
+class PoolMetrics:
+    """Счетчики выдачи соединений из пула: сколько раз, сколько ждали и сколько раз не дождались"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def observe(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_total, 6),
+                "wait_seconds_max": round(self.wait_max, 6),
+            }
+
+
+class TimedPoolMixin:
+    """
+    Замер ожидания соединения в QueuePool. В SQLAlchemy нет события до выдачи соединения,
+    поэтому время меряется вокруг _do_get: ожидание в очереди плюс открытие нового соединения.
+    Метрики хранятся в классе, так как engine.dispose() пересоздает пул через self.__class__.
+    """
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.metrics.observe(time.perf_counter() - started, timed_out)
+
+
+def _timed_pool(base: type) -> type:
+    return type(f"Timed{base.__name__}", (TimedPoolMixin, base), {"metrics": PoolMetrics()})
+
+
+def _engine_options(url: str, pool_class: type) -> Dict[str, Any]:
+    """Параметры пула; SQLite в памяти оставляет пул по умолчанию (одно соединение на поток)"""
+    parsed = make_url(url)
+    options: Dict[str, Any] = {}
+    if parsed.get_backend_name() == "sqlite":
+        if parsed.get_driver_name() != "aiosqlite":
+            options["connect_args"] = {"check_same_thread": False}
+        if parsed.database in (None, "", ":memory:"):
+            return options
+    options.update(
+        poolclass=pool_class,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Настройки каждого нового соединения SQLite"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    finally:
+        cursor.close()
+
+
+def _configure_engine(sync_engine: Engine):
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+    instrument_engine(sync_engine)
+    profiler.instrument(sync_engine)
+
+
+def make_engines(url: str, async_url: Optional[str] = None) -> Tuple[Engine, AsyncEngine]:
+    """
+    Синхронный и асинхронный движки одной базы с настроенными пулами и PRAGMA SQLite.
+    Асинхронному движку для файла SQLite тоже нужен пул: иначе aiosqlite открывает
+    соединение и поток на каждый запрос.
+    """
+    async_url = async_url or _async_url(url)
+    sync_engine = create_engine(url, **_engine_options(url, _timed_pool(QueuePool)))
+    _configure_engine(sync_engine)
+    async_engine = create_async_engine(async_url, **_engine_options(async_url, _timed_pool(AsyncAdaptedQueuePool)))
+    _configure_engine(async_engine.sync_engine)
+    return sync_engine, async_engine
+
+
+# Создание движков базы данных: синхронного и асинхронного (для обработчиков, объявленных через async def)
+engine, async_engine = make_engines(DATABASE_URL, ASYNC_DATABASE_URL)
+
+
+def pool_stats(sync_engine: Engine) -> Dict[str, Any]:
+    """Состояние пула: занятые и свободные соединения, переполнение и ожидание выдачи"""
+    pool = sync_engine.pool
+    stats: Dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            max_overflow=DB_MAX_OVERFLOW,
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+        )
+    if isinstance(pool, TimedPoolMixin):
+        stats.update(pool.metrics.stats())
+    return stats
+
 
 # Создание фабрики сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Фабрика асинхронных сессий
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Базовый класс для моделей
 Base = declarative_base()
 
+# INSERT ... ON CONFLICT DO UPDATE (инкрементальные сводки) одинаково строится для SQLite и PostgreSQL
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+# Сообщения об открытии/закрытии сессий идут на каждый запрос и прореживаются (LOG_SAMPLE_RATE)
+session_log = log.bind(sample="db_session")
+
+
 # Функция для получения сессии базы данных
 def get_db():
     """
@@ -31,18 +211,38 @@ def get_db():
     """
     db = SessionLocal()
     try:
-        log.info("Создана новая сессия базы данных")
+        session_log.info("Создана новая сессия базы данных")
         yield db
     finally:
         db.close()
-        log.info("Сессия базы данных закрыта")
+        session_log.info("Сессия базы данных закрыта")
+
+
+async def get_async_db():
+    """
+    Асинхронный генератор сессий базы данных.
+    Используется в async-обработчиках, чтобы запросы не блокировали цикл событий.
+    """
+    async with AsyncSessionLocal() as db:
+        session_log.info("Создана новая асинхронная сессия базы данных")
+        try:
+            yield db
+        finally:
+            session_log.info("Асинхронная сессия базы данных закрыта")
 
 # Функция для создания таблиц
 def create_tables():
     """Создание всех таблиц в базе данных"""
     try:
+        # Импорт здесь: модули поиска и обновления схемы сами зависят от моделей и движка
+        from .schema_upgrade import upgrade
+        from .search import search_backend
         Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            # База прежней версии: create_all не меняет существующие таблицы
+            upgrade(connection)
+            search_backend.create_index(connection)
         log.info("Таблицы базы данных успешно созданы")
     except Exception as e:
         log.error(f"Ошибка при создании таблиц: {e}")
-        raise
\ No newline at end of file
+        raise
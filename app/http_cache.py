@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # Без brotli ответы сжимаются только gzip
+    brotli = None
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Ответы каталога можно хранить в кэше браузера, но перед использованием нужно
+# перепроверить по ETag: остатки меняются, а 304 обходится почти бесплатно
+CACHE_CONTROL = os.getenv("PRODUCT_CACHE_CONTROL", "public, no-cache")
+
+
+def make_etag(key: str) -> str:
+    """ETag из ключа кэша каталога: ключ уже содержит версию товара или категории"""
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Проверка If-None-Match (слабое сравнение, список значений и "*")"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or any(value.removeprefix("W/") == etag for value in candidates)
+
+
+def not_modified_since(request: Request, last_modified: Optional[datetime]) -> bool:
+    """Проверка If-Modified-Since; учитывается только без If-None-Match (RFC 9110)"""
+    header = request.headers.get("if-modified-since")
+    if not header or last_modified is None or "if-none-match" in request.headers:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
+
+def product_last_modified(content: bytes) -> Optional[datetime]:
+    """Время последнего изменения товара из готового JSON ответа"""
+    data = json.loads(content)
+    value = data.get("updated_at") or data.get("created_at")
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    # SQLite возвращает время без часового пояса; CURRENT_TIMESTAMP всегда в UTC
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    """Ответ 304 без тела"""
+    return Response(status_code=304, headers=cache_headers(etag, last_modified))
+
+
+def json_response(content: bytes, etag: str, last_modified: Optional[datetime] = None) -> Response:
+    """Готовый JSON с заголовками для условных запросов"""
+    return Response(content=content, media_type="application/json", headers=cache_headers(etag, last_modified))
+
+
+# Сжатие выполняется один раз на вариант ответа (страница, файл статики), поэтому берутся максимальные уровни
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+# Ответы меньше этого размера не сжимаются: заголовки gzip/br съедают выигрыш
+MIN_COMPRESS_SIZE = 512
+
+
+def compressed_variants(body: bytes) -> Dict[str, bytes]:
+    """Сжатые варианты тела (gzip и br, если доступен), только если они меньше исходного"""
+    variants = {}
+    if len(body) < MIN_COMPRESS_SIZE:
+        return variants
+    variants["gzip"] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+def accepted_encodings(request: Request) -> Dict[str, float]:
+    """Разбор Accept-Encoding: кодировка -> q"""
+    result = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        result[name.strip().lower()] = q
+    return result
+
+
+def choose_encoding(request: Request, available: Iterable[str]) -> str:
+    """Лучший из доступных вариантов: br, затем gzip, иначе без сжатия"""
+    accepted = accepted_encodings(request)
+    wildcard = accepted.get("*", 0.0)
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return "identity"
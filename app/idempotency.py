@@ -0,0 +1,198 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import metrics, models
+from .logging_config import log
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Сколько хранится ключ и снимок ответа (с): повтор позже создаст новый заказ
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# Сколько повторный запрос ждет завершения первого, прежде чем получить 409
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "30"))
+# Ключ в обработке дольше этого времени считается брошенным (процесс упал) и захватывается снова
+IDEMPOTENCY_LOCK_TIMEOUT = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "60"))
+# Как часто удалять просроченные ключи (с); очистка выполняется попутно с захватом ключа
+IDEMPOTENCY_CLEANUP_INTERVAL = float(os.getenv("IDEMPOTENCY_CLEANUP_INTERVAL", "300"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+class IdempotencyConflict(ValueError):
+    """Ключ уже использован с другим телом запроса"""
+
+
+class RequestInProgress(Exception):
+    """Первый запрос с этим ключом не завершился за IDEMPOTENCY_WAIT_TIMEOUT"""
+
+
+class ClaimLost(RequestInProgress):
+    """Ключ, считавшийся брошенным, захватил другой запрос: этот запрос откатывается"""
+
+
+def scoped_key(user_id: int, key: str) -> str:
+    return f"{user_id}:{key}"
+
+
+def fingerprint(body: str) -> str:
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Ключи идемпотентности в таблице idempotency_keys.
+    Первый запрос захватывает ключ вставкой строки (первичный ключ не дает вставить ее дважды,
+    в том числе из другого процесса), остальные ждут, пока строка не станет done, и отвечают
+    сохраненным снимком. Неудачный запрос освобождает ключ: он ничего не изменил, повтор допустим.
+
+    Каждый захват получает свой token. complete, save_response и release меняют строку только
+    со своим token: если медленный запрос пережил lock_timeout и ключ забрал другой, медленный
+    откатывается в complete и не создает второй заказ.
+    """
+
+    # Ожидающие запросы будит завершение первого в этом процессе, запросы других процессов видны опросом
+    poll_interval = 0.1
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, wait_timeout: float = IDEMPOTENCY_WAIT_TIMEOUT,
+                 lock_timeout: float = IDEMPOTENCY_LOCK_TIMEOUT,
+                 cleanup_interval: float = IDEMPOTENCY_CLEANUP_INTERVAL, clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.lock_timeout = lock_timeout
+        self.cleanup_interval = cleanup_interval
+        self.clock = clock
+        self._next_cleanup = 0.0
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, threading.Event] = {}
+
+    def begin(self, db: Session, key: str,
+              body_fingerprint: str) -> Tuple[Optional[str], Optional[models.IdempotencyKey]]:
+        """
+        Захват ключа перед выполнением запроса.
+        (token, None) — запрос выполняется впервые и должен завершиться complete/save_response
+        или release с этим token; (None, запись) — завершенная запись, по которой отвечает повтор.
+        """
+        self.purge_expired(db, force=False)
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            token = self._claim(db, key, body_fingerprint)
+            if token is not None:
+                metrics.idempotent_requests.inc("new")
+                return token, None
+            record = db.get(models.IdempotencyKey, key, populate_existing=True)
+            db.commit()  # снимок чтения SQLite не должен держаться между опросами
+            if record is None:
+                continue  # первый запрос не удался и освободил ключ
+            if record.fingerprint != body_fingerprint:
+                metrics.idempotent_requests.inc("conflict")
+                raise IdempotencyConflict("Ключ идемпотентности уже использован с другим заказом")
+            # Снимок пишется сразу после commit заказа; без него (процесс упал) запись отдается после lock_timeout
+            if record.status == "done" and (record.response is not None
+                                            or record.locked_at < self.clock() - self.lock_timeout):
+                metrics.idempotent_requests.inc("replayed")
+                return None, record
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                metrics.idempotent_requests.inc("timeout")
+                raise RequestInProgress("Запрос с этим ключом идемпотентности еще выполняется")
+            self._wait(key, min(remaining, self.poll_interval))
+
+    def _claim(self, db: Session, key: str, body_fingerprint: str) -> Optional[str]:
+        """token захвата или None, если ключ занят"""
+        now = self.clock()
+        token = uuid.uuid4().hex
+        values = {"fingerprint": body_fingerprint, "status": "processing", "locked_at": now, "token": token,
+                  "order_id": None, "response": None, "expires_at": now + self.ttl}
+        try:
+            db.execute(insert(models.IdempotencyKey).values(key=key, **values))
+            db.commit()
+            return token
+        except IntegrityError:
+            db.rollback()
+        # Ключ занят: его можно забрать, только если он просрочен или брошен упавшим процессом
+        claimed = db.execute(
+            update(models.IdempotencyKey)
+            .where(models.IdempotencyKey.key == key, or_(
+                models.IdempotencyKey.expires_at < now,
+                (models.IdempotencyKey.status == "processing")
+                & (models.IdempotencyKey.locked_at < now - self.lock_timeout),
+            ))
+            .values(**values)
+        ).rowcount
+        db.commit()
+        if claimed:
+            log.warning(f"Ключ идемпотентности {key} захвачен повторно (просрочен или брошен)")
+        return token if claimed == 1 else None
+
+    def _wait(self, key: str, timeout: float):
+        with self._lock:
+            event = self._waiters.setdefault(key, threading.Event())
+        event.wait(timeout)
+
+    def _notify(self, key: str):
+        with self._lock:
+            event = self._waiters.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def complete(self, db: Session, key: str, token: str, order_id: int):
+        """
+        Отметка о выполнении в транзакции заказа (commit делает вызывающий код).
+        ClaimLost, если ключ уже захвачен другим запросом: транзакцию заказа нужно откатить.
+        """
+        completed = db.execute(
+            update(models.IdempotencyKey)
+            .where(models.IdempotencyKey.key == key, models.IdempotencyKey.token == token,
+                   models.IdempotencyKey.status == "processing")
+            .values(status="done", order_id=order_id)
+        ).rowcount
+        if completed != 1:
+            log.warning(f"Ключ идемпотентности {key} захвачен другим запросом, заказ не создается")
+            raise ClaimLost("Запрос с этим ключом идемпотентности выполняется повторно")
+
+    def save_response(self, db: Session, key: str, token: str, response: str):
+        """Снимок ответа после commit заказа; ожидающие повторы получают его сразу"""
+        try:
+            db.execute(update(models.IdempotencyKey)
+                       .where(models.IdempotencyKey.key == key, models.IdempotencyKey.token == token)
+                       .values(response=response, locked_at=None))
+            db.commit()
+        finally:
+            self._notify(key)
+
+    def release(self, db: Session, key: str, token: str):
+        """Освобождение своего ключа после неудачного запроса"""
+        try:
+            db.rollback()
+            db.execute(delete(models.IdempotencyKey).where(
+                models.IdempotencyKey.key == key, models.IdempotencyKey.token == token,
+                models.IdempotencyKey.status == "processing"))
+            db.commit()
+        finally:
+            self._notify(key)
+
+    def purge_expired(self, db: Session, force: bool = True) -> int:
+        """Удаление просроченных ключей (не чаще cleanup_interval, если не force)"""
+        now = self.clock()
+        if not force and now < self._next_cleanup:
+            return 0
+        self._next_cleanup = now + self.cleanup_interval
+        deleted = db.execute(
+            delete(models.IdempotencyKey).where(models.IdempotencyKey.expires_at < now)
+        ).rowcount
+        db.commit()
+        if deleted:
+            log.info(f"Удалено просроченных ключей идемпотентности: {deleted}")
+        return deleted
+
+
+store = IdempotencyStore()
@@ -0,0 +1,261 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import database, metrics, models
+from .logging_config import log
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Фоновая обработка событий outbox. Событие пишется в той же транзакции, что и заказ,
+# поэтому не теряется при падении процесса: необработанные строки подхватываются снова.
+# Без очереди (JOBS_ENABLED=false или до запуска приложения) события обрабатываются сразу в запросе.
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+# Повтор через JOBS_RETRY_DELAY * 2^(попытка - 1) секунд
+JOBS_RETRY_DELAY = float(os.getenv("JOBS_RETRY_DELAY", "1"))
+# Как часто проверять outbox, если никто не разбудил очередь (события других процессов, повторы)
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "1"))
+# Событие в обработке дольше этого времени считается брошенным (процесс упал) и берется снова
+JOBS_LOCK_TIMEOUT = float(os.getenv("JOBS_LOCK_TIMEOUT", "60"))
+JOBS_BATCH_SIZE = int(os.getenv("JOBS_BATCH_SIZE", "100"))
+
+Handler = Callable[[Dict[str, Any]], None]
+
+# kind события -> обработчик; обработчики должны быть идемпотентными (возможны повторы)
+handlers: Dict[str, Handler] = {}
+
+
+def handler(kind: str):
+    """Регистрация обработчика событий вида kind"""
+    def register(func: Handler) -> Handler:
+        handlers[kind] = func
+        return func
+    return register
+
+
+def outbox_event(kind: str, **payload) -> models.OutboxEvent:
+    """Строка outbox для добавления в сессию вместе с основными изменениями"""
+    return models.OutboxEvent(kind=kind, payload=json.dumps(payload), status="pending", attempts=0,
+                              available_at=time.time())
+
+
+def retry_delay(attempts: int, base: float = JOBS_RETRY_DELAY) -> float:
+    return base * 2 ** (attempts - 1)
+
+
+class JobQueue:
+    """
+    Очередь внутри процесса: диспетчер забирает готовые события из outbox (атомарным UPDATE,
+    поэтому одно событие не достанется двум процессам), воркеры выполняют обработчики в потоках.
+    Успешно обработанные события удаляются, исчерпавшие попытки остаются со статусом failed.
+    """
+
+    def __init__(self, workers: int = JOBS_WORKERS, max_attempts: int = JOBS_MAX_ATTEMPTS,
+                 retry_base: float = JOBS_RETRY_DELAY, poll_interval: float = JOBS_POLL_INTERVAL,
+                 lock_timeout: float = JOBS_LOCK_TIMEOUT, batch_size: int = JOBS_BATCH_SIZE,
+                 clock: Callable[[], float] = time.time):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self.batch_size = batch_size
+        self.clock = clock
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        # Счетчики увеличиваются из потоков воркеров
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    # Работа с outbox (синхронно, в потоке воркера или запроса)
+    def _due(self, now: float):
+        return or_(
+            and_(models.OutboxEvent.status == "pending", models.OutboxEvent.available_at <= now),
+            and_(models.OutboxEvent.status == "processing", models.OutboxEvent.locked_at < now - self.lock_timeout),
+        )
+
+    def claim(self, db: Session, ids: Optional[Iterable[int]] = None) -> List[Any]:
+        """Захват готовых событий одним UPDATE ... RETURNING (ids — только указанные)"""
+        now = self.clock()
+        candidates = select(models.OutboxEvent.id).where(self._due(now)).order_by(models.OutboxEvent.id)
+        if ids is not None:
+            candidates = candidates.where(models.OutboxEvent.id.in_(list(ids)))
+        rows = db.execute(
+            update(models.OutboxEvent)
+            .where(models.OutboxEvent.id.in_(candidates.limit(self.batch_size).scalar_subquery()), self._due(now))
+            .values(status="processing", locked_at=now, attempts=models.OutboxEvent.attempts + 1)
+            .returning(models.OutboxEvent.id, models.OutboxEvent.kind, models.OutboxEvent.payload,
+                       models.OutboxEvent.attempts)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+        return sorted(rows, key=lambda row: row.id)
+
+    def process(self, event) -> bool:
+        """Выполнение обработчика события и запись результата; True — событие обработано"""
+        started = time.perf_counter()
+        try:
+            job = handlers.get(event.kind)
+            if job is None:
+                raise LookupError(f"Нет обработчика для событий {event.kind}")
+            job(json.loads(event.payload))
+        except Exception as e:
+            self._fail(event, e)
+            return False
+
+        with database.SessionLocal() as db:
+            db.execute(delete(models.OutboxEvent).where(models.OutboxEvent.id == event.id))
+            db.commit()
+        self._count("processed")
+        metrics.jobs_processed.inc(event.kind, "done")
+        metrics.job_duration.observe(time.perf_counter() - started, event.kind)
+        log.info(f"Событие {event.kind} ID {event.id} обработано")
+        return True
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _fail(self, event, error: Exception):
+        if event.attempts >= self.max_attempts:
+            values = {"status": "failed"}
+            self._count("failed")
+            metrics.jobs_processed.inc(event.kind, "failed")
+            log.error(f"Событие {event.kind} ID {event.id} не обработано после {event.attempts} попыток: {error}")
+        else:
+            delay = retry_delay(event.attempts, self.retry_base)
+            values = {"status": "pending", "available_at": self.clock() + delay}
+            self._count("retried")
+            metrics.jobs_processed.inc(event.kind, "retry")
+            log.warning(f"Событие {event.kind} ID {event.id}: ошибка {error}, повтор через {delay:.1f} с")
+        with database.SessionLocal() as db:
+            db.execute(
+                update(models.OutboxEvent)
+                .where(models.OutboxEvent.id == event.id)
+                .values(locked_at=None, last_error=str(error)[:1000], **values)
+            )
+            db.commit()
+
+    def run_pending(self, ids: Optional[Iterable[int]] = None) -> int:
+        """Синхронная обработка готовых событий; число успешно обработанных"""
+        with database.SessionLocal() as db:
+            events = self.claim(db, ids)
+        return sum(self.process(event) for event in events)
+
+    # Фоновый режим
+    def dispatch(self, ids: List[int]):
+        """
+        Вызывается после commit транзакции с событиями: при работающей очереди будит
+        диспетчер (из любого потока), иначе события обрабатываются сразу.
+        """
+        if self.running:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        else:
+            self.run_pending(ids)
+
+    async def start(self):
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._queue = asyncio.Queue(maxsize=self.batch_size)
+        self._tasks = [asyncio.create_task(self._dispatcher())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        log.info(f"Очередь фоновых задач запущена: воркеров {self.workers}")
+
+    async def stop(self):
+        """Остановка: события в обработке завершаются, остальные остаются в outbox до запуска"""
+        if not self.running:
+            return
+        dispatcher, workers = self._tasks[0], self._tasks[1:]
+        dispatcher.cancel()
+        await asyncio.gather(dispatcher, return_exceptions=True)
+        await self._queue.join()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._tasks = []
+        log.info("Очередь фоновых задач остановлена")
+
+    async def _dispatcher(self):
+        while True:
+            try:
+                events = await asyncio.to_thread(self._claim_batch)
+            except Exception as e:
+                log.error(f"Ошибка при выборке событий outbox: {e}")
+                events = []
+            for event in events:
+                await self._queue.put(event)
+            if len(events) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def _claim_batch(self) -> List[Any]:
+        with database.SessionLocal() as db:
+            return self.claim(db)
+
+    async def _worker(self):
+        while True:
+            event = await self._queue.get()
+            try:
+                await asyncio.to_thread(self.process, event)
+            except Exception as e:
+                log.error(f"Ошибка воркера при обработке события ID {event.id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        with database.SessionLocal() as db:
+            counts = dict(db.execute(
+                select(models.OutboxEvent.status, func.count()).group_by(models.OutboxEvent.status)
+            ).all())
+        with self._lock:
+            processed, retried, failed = self.processed, self.retried, self.failed
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "processed": processed,
+            "retried": retried,
+            "failed": failed,
+            "outbox": counts,
+        }
+
+
+queue = JobQueue()
+
+
+# Обработчики событий
+@handler("order_created")
+def confirm_order(payload: Dict[str, Any]):
+    """Подтверждение нового заказа: pending -> confirmed (повтор ничего не меняет)"""
+    with database.SessionLocal() as db:
+        confirmed = db.execute(
+            update(models.Order)
+            .where(models.Order.id == payload["order_id"], models.Order.status == "pending")
+            .values(status="confirmed")
+        ).rowcount
+        db.commit()
+    if confirmed:
+        log.info(f"Заказ ID {payload['order_id']} пользователя ID {payload['user_id']} подтвержден")
@@ -1,31 +1,201 @@
+import glob
+import itertools
 import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
 from loguru import logger
 import sys
+from dotenv import load_dotenv
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Минимальный уровень сообщений для всех обработчиков
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Очередь: готовые строки пишет фоновый поток, а не поток запроса
+LOG_QUEUE = os.getenv("LOG_QUEUE", "false").lower() in ("1", "true", "yes")
+# Формат вывода: text (по умолчанию) или json (одна JSON-запись на строку)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_FILE = os.getenv("LOG_FILE", "logs/app.log")
+# Ротация файла логов по размеру и срок хранения старых файлов
+LOG_ROTATION_BYTES = 10 * 1024 * 1024
+LOG_RETENTION_DAYS = 30
+# Из частых сообщений (открытие/закрытие сессий) пишется каждое N-е
+LOG_SAMPLE_RATE = max(int(os.getenv("LOG_SAMPLE_RATE", "1")), 1)
+# Как часто фоновый поток сбрасывает накопленные строки (секунды)
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.1"))
+
+_sample_counters = {}
+
+
+def sample_filter(record) -> bool:
+    """
+    Прореживание частых сообщений, помеченных через log.bind(sample="ключ").
+    Решение принимается один раз на запись и сохраняется в ней, чтобы консоль и файл
+    пропускали одни и те же сообщения. Предупреждения и ошибки не прореживаются.
+    """
+    extra = record["extra"]
+    key = extra.get("sample")
+    if key is None or LOG_SAMPLE_RATE == 1 or record["level"].no >= logging.WARNING:
+        return True
+    if "sampled" not in extra:
+        counter = _sample_counters.setdefault(key, itertools.count())
+        extra["sampled"] = next(counter) % LOG_SAMPLE_RATE == 0
+    return extra["sampled"]
+
+
+class BackgroundWriter:
+    """
+    Поток-писатель для потокового обработчика loguru.
+    Обработчик только кладет отформатированную строку в очередь; поток забирает накопившиеся
+    строки пачкой раз в interval секунд и пишет их одним вызовом с одним flush. Метода flush
+    у объекта нет намеренно: иначе loguru вызывал бы его после каждого сообщения.
+    """
+
+    def __init__(self, stream, interval: float = LOG_FLUSH_INTERVAL, close_stream: bool = False):
+        self._stream = stream
+        self._interval = interval
+        self._close_stream = close_stream
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message: str):
+        self._queue.put(message)
+
+    def drain(self, timeout: float = 5.0):
+        """Дождаться записи всего, что было поставлено в очередь до вызова"""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def stop(self):
+        """Вызывается loguru при удалении обработчика"""
+        self._queue.put(None)
+        self._thread.join(5.0)
+        if self._close_stream:
+            self._stream.close()
+
+    def _run(self):
+        running = True
+        while running:
+            batch, markers = [], []
+            item = self._queue.get()
+            while True:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._stream.write("".join(batch))
+                    self._stream.flush()
+                except Exception:
+                    # Ошибка записи не должна останавливать поток-писатель
+                    pass
+            for marker in markers:
+                marker.set()
+            if running:
+                time.sleep(self._interval)
+
+
+class RotatingFileStream:
+    """
+    Файл логов с ротацией по размеру для BackgroundWriter: пишется только из потока-писателя.
+    Заполненный файл переименовывается в app.<время>.log (как при ротации loguru), файлы
+    старше retention_days удаляются при ротации.
+    """
+
+    def __init__(self, path: str, max_bytes: int = LOG_ROTATION_BYTES, retention_days: int = LOG_RETENTION_DAYS):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._retention = timedelta(days=retention_days)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def write(self, text: str):
+        data = text.encode("utf-8")
+        if self._size and self._size + len(data) > self._max_bytes:
+            self._rotate()
+        self._file.write(text)
+        self._size += len(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def _rotate(self):
+        self._file.close()
+        root, ext = os.path.splitext(self._path)
+        os.replace(self._path, f"{root}.{datetime.now():%Y-%m-%d_%H-%M-%S_%f}{ext}")
+        self._file = open(self._path, "a", encoding="utf-8")
+        self._size = 0
+        expired = (datetime.now() - self._retention).timestamp()
+        for old in glob.glob(f"{glob.escape(root)}.*{ext}"):
+            if os.path.getmtime(old) < expired:
+                os.remove(old)
+
+
+_writers = []
 
 
 # Настройка логирования
 def setup_logging():
     """Настройка системы логирования для приложения"""
 
-    # Удаляем стандартный обработчик loguru
+    # Удаляем стандартный обработчик loguru (и остановленные им потоки-писатели)
     logger.remove()
+    _writers.clear()
+
+    serialize = LOG_FORMAT == "json"
+    console = sys.stdout
+    if LOG_QUEUE:
+        console = BackgroundWriter(sys.stdout)
+        _writers.append(console)
 
     # Добавляем обработчик для вывода в консоль
     logger.add(
-        sys.stdout,
+        console,
         format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-        level="INFO",
-        colorize=True
+        level=LOG_LEVEL,
+        colorize=not serialize,
+        serialize=serialize,
+        filter=sample_filter
     )
 
-    # Добавляем обработчик для записи в файл
-    logger.add(
-        "logs/app.log",
-        rotation="10 MB",  # Ротация при достижении 10MB
-        retention="30 days",  # Хранение логов 30 дней
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level="DEBUG"
-    )
+    # Добавляем обработчик для записи в файл. В режиме очереди запись, сброс и ротацию файла
+    # выполняет поток-писатель, поток запроса только кладет строку в очередь
+    file_format = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+    if LOG_QUEUE:
+        file_sink = BackgroundWriter(RotatingFileStream(LOG_FILE), close_stream=True)
+        _writers.append(file_sink)
+        logger.add(file_sink, format=file_format, level=LOG_LEVEL, colorize=False, serialize=serialize,
+                   filter=sample_filter)
+    else:
+        logger.add(
+            LOG_FILE,
+            rotation="10 MB",  # Ротация при достижении 10MB
+            retention="30 days",  # Хранение логов 30 дней
+            format=file_format,
+            level=LOG_LEVEL,
+            serialize=serialize,
+            filter=sample_filter,
+            buffering=1
+        )
 
     # Перехватываем стандартное логирование Python
     class InterceptHandler(logging.Handler):
@@ -46,11 +216,20 @@ def setup_logging():
                 level, record.getMessage()
             )
 
-    # Настраиваем стандартное логирование
-    logging.basicConfig(handlers=[InterceptHandler()], level=0)
+    # Настраиваем стандартное логирование. Уровень корневого логгера совпадает с LOG_LEVEL:
+    # иначе отладочные записи библиотек (aiosqlite пишет их на каждый запрос к БД)
+    # создавались бы и проходили через InterceptHandler только чтобы быть отброшенными
+    logging.basicConfig(handlers=[InterceptHandler()], level=LOG_LEVEL)
 
     return logger
 
 
+async def flush_logging():
+    """Дождаться записи всех сообщений из очереди (при остановке приложения)"""
+    await logger.complete()
+    for writer in _writers:
+        writer.drain()
+
+
 # Инициализация логгера
-log = setup_logging()
\ No newline at end of file
+log = setup_logging()
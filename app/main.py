@@ -1,14 +1,18 @@
 from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
-from . import database, models, schemas, crud
-from .routers import users, products, orders
-from .logging_config import log
+from . import (
+    analytics, assets, category_stats, database, models, schemas, crud, async_crud, http_cache, jobs, metrics, replicas
+)
+from .pages import page_cache, page_response, templates
+from .profiling import ProfilingMiddleware, profiler
+from .routers import users, products, orders, cart, analytics as analytics_routes
+from .cache import product_cache
+from .logging_config import log, flush_logging
+from .pagination import InvalidCursor
 from typing import List, Optional
 
 # Создание приложения FastAPI
@@ -20,14 +24,10 @@ app = FastAPI(
 
 # Получение абсолютного пути к директориям
 base_dir = os.path.dirname(os.path.abspath(__file__))
-templates_dir = os.path.join(base_dir, "..", "templates")
 static_dir = os.path.join(base_dir, "static")
 
-# Монтирование статических файлов
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
-
-# Настройка шаблонов
-templates = Jinja2Templates(directory=templates_dir)
+# Монтирование статических файлов (адреса с хэшем содержимого кэшируются браузером навсегда)
+app.mount("/static", assets.AssetFiles(directory=static_dir), name="static")
 
 # Настройка CORS
 app.add_middleware(
@@ -38,10 +38,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Профилирование SQL по запросам (SQL_PROFILING=true); без режима middleware сразу передает запрос дальше
+app.add_middleware(ProfilingMiddleware)
+
+# Метрики запросов (время, статусы, SQL на запрос); добавляется последним, чтобы учитывать и CORS
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Подключение роутеров
 app.include_router(users.router)
 app.include_router(products.router)
 app.include_router(orders.router)
+app.include_router(cart.router)
+app.include_router(analytics_routes.router)
 
 
 @app.on_event("startup")
@@ -51,6 +60,21 @@ async def startup_event():
     try:
         # Создание таблиц в базе данных
         database.create_tables()
+        # Сводка по категориям собирается один раз для базы, где товары появились до нее
+        with database.SessionLocal() as db:
+            category_stats.ensure_built(db)
+            # То же для сводки продаж по категориям
+            analytics.ensure_category_rollup(db)
+        # Статика собирается до рендера страниц: в них попадают адреса с хэшем
+        assets.manifest.build()
+        # Статические страницы рендерятся и сжимаются до первого запроса
+        page_cache.warm_up()
+        # Фоновая обработка событий outbox (подтверждение заказов)
+        if jobs.JOBS_ENABLED:
+            await jobs.queue.start()
+        # Фоновое пополнение сводок продаж новыми заказами
+        if analytics.ANALYTICS_ENABLED:
+            await analytics.rollup.start()
         log.info("Приложение успешно запущено")
     except Exception as e:
         log.error(f"Ошибка при запуске приложения: {e}")
@@ -61,107 +85,198 @@ async def startup_event():
 async def shutdown_event():
     """Событие остановки приложения"""
     log.info("Остановка приложения Clothing Store API")
+    await jobs.queue.stop()
+    await analytics.rollup.stop()
+    await database.async_engine.dispose()
+    await replicas.replica_router.dispose()
+    await flush_logging()
 
 
 # API endpoints для фронтенда
 @app.get("/api/products", response_model=List[schemas.Product])
 async def get_products_api(
+        request: Request,
         skip: int = 0,
         limit: int = 100,
         category: Optional[str] = None,
         sort: Optional[str] = None,
-        db: Session = Depends(database.get_db)
+        db: AsyncSession = Depends(replicas.get_async_read_db)
 ):
-    """API для получения списка товаров"""
+    """
+    API для получения списка товаров.
+    Поддерживает условные запросы: при совпадении If-None-Match возвращается 304 без обращения к БД.
+    """
     try:
         log.info(f"API запрос товаров: skip={skip}, limit={limit}, category={category}, sort={sort}")
+        key = await product_cache.call(crud.products_cache_key, skip, limit, category, sort)
+        etag = http_cache.make_etag(key)
+        if http_cache.etag_matches(request, etag):
+            return http_cache.not_modified(etag)
 
-        query = db.query(models.Product)
+        content = await async_crud.get_products_json(db, skip=skip, limit=limit, category=category, sort=sort,
+                                                     key=key)
+        return http_cache.json_response(content, etag)
 
-        if category:
-            query = query.filter(models.Product.category == category)
+    except Exception as e:
+        log.error(f"Ошибка при получении товаров: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка сервера")
 
-        if sort == "price":
-            query = query.order_by(models.Product.price)
-        elif sort == "price_desc":
-            query = query.order_by(desc(models.Product.price))
-        elif sort == "name":
-            query = query.order_by(models.Product.name)
-        else:
-            query = query.order_by(models.Product.id)
 
-        products = query.offset(skip).limit(limit).all()
-        return products
+@app.get("/api/products/page", response_model=schemas.ProductPage)
+async def get_products_page_api(
+        limit: int = 100,
+        category: Optional[str] = None,
+        sort: Optional[str] = None,
+        cursor: Optional[str] = None,
+        skip: int = 0,
+        db: AsyncSession = Depends(database.get_async_db)
+):
+    """API для получения страницы товаров по курсору (next_cursor передается в следующий запрос)"""
+    try:
+        log.info(f"API запрос страницы товаров: limit={limit}, category={category}, sort={sort}, cursor={cursor}")
+        products, next_cursor = await async_crud.get_products_page(
+            db, limit=limit, category=category, sort=sort, cursor=cursor, skip=skip
+        )
+        return {"items": products, "next_cursor": next_cursor}
 
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        log.error(f"Ошибка при получении товаров: {e}")
+        log.error(f"Ошибка при получении страницы товаров: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка сервера")
+
+
+@app.get("/api/products/search", response_model=schemas.ProductSearchResult)
+async def search_products_api(
+        q: Optional[str] = None,
+        category: Optional[str] = None,
+        size: Optional[str] = None,
+        color: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 20,
+        db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    API поиска товаров по названию и описанию.
+    Возвращает найденные товары, их общее число и счетчики фасетов (категория, размер, цвет, цена).
+    sort: relevance (по умолчанию при непустом q), id, price, price_desc, name.
+    """
+    try:
+        log.info(f"API поиск товаров: q={q!r}, category={category}, size={size}, color={color}, "
+                 f"price={min_price}..{max_price}, sort={sort}, skip={skip}, limit={limit}")
+        content = await async_crud.search_products_json(
+            db, q=q, category=category, size=size, color=color, min_price=min_price, max_price=max_price,
+            sort=sort, skip=skip, limit=limit
+        )
+        return Response(content=content, media_type="application/json")
+
+    except Exception as e:
+        log.error(f"Ошибка при поиске товаров: {e}")
         raise HTTPException(status_code=500, detail="Ошибка сервера")
 
 
 @app.get("/api/products/{product_id}", response_model=schemas.Product)
-async def get_product_api(product_id: int, db: Session = Depends(database.get_db)):
-    """API для получения товара по ID"""
+async def get_product_api(product_id: int, request: Request,
+                          db: AsyncSession = Depends(replicas.get_async_read_db)):
+    """
+    API для получения товара по ID.
+    ETag строится из версии товара в кэше каталога, поэтому 304 отдается без запроса к БД.
+    """
     try:
-        product = db.query(models.Product).filter(models.Product.id == product_id).first()
-        if not product:
+        key = await product_cache.call(product_cache.product_key, product_id)
+        etag = http_cache.make_etag(key)
+        if http_cache.etag_matches(request, etag):
+            return http_cache.not_modified(etag)
+
+        content = await async_crud.get_product_json(db, product_id, key=key)
+        if content is None:
             raise HTTPException(status_code=404, detail="Товар не найден")
-        return product
+
+        last_modified = http_cache.product_last_modified(content)
+        if http_cache.not_modified_since(request, last_modified):
+            return http_cache.not_modified(etag, last_modified)
+        return http_cache.json_response(content, etag, last_modified)
+    except HTTPException:
+        raise
     except Exception as e:
         log.error(f"Ошибка при получении товара {product_id}: {e}")
         raise HTTPException(status_code=500, detail="Ошибка сервера")
 
 
+@app.get("/api/categories", response_model=List[schemas.CategoryStats])
+async def get_categories_api(db: AsyncSession = Depends(replicas.get_async_read_db)):
+    """API сводки по категориям: число товаров, товаров в наличии, минимальная, максимальная и средняя цена"""
+    try:
+        log.info("API запрос сводки по категориям")
+        return await async_crud.get_category_stats(db)
+    except Exception as e:
+        log.error(f"Ошибка при получении сводки по категориям: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка сервера")
+
+
 # Frontend routes
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """Главная страница"""
     log.info("Запрос главной страницы")
-    return templates.TemplateResponse("index.html", {"request": request})
+    return page_response(request, page_cache.page("index.html"))
 
 
 @app.get("/products", response_class=HTMLResponse)
 async def read_products_page(request: Request):
     """Страница товаров"""
     log.info("Запрос страницы товаров")
-    return templates.TemplateResponse("products.html", {"request": request})
-
-
-@app.get("/products/{product_id}", response_class=HTMLResponse)
-async def read_product_detail(request: Request, product_id: int):
-    """Страница деталей товара"""
-    log.info(f"Запрос страницы товара ID: {product_id}")
-    return templates.TemplateResponse("product-detail.html", {"request": request, "product_id": product_id})
+    return page_response(request, page_cache.page("products.html"))
 
 
 @app.get("/cart", response_class=HTMLResponse)
 async def read_cart(request: Request):
     """Страница корзины"""
     log.info("Запрос страницы корзины")
-    return templates.TemplateResponse("cart.html", {"request": request})
+    return page_response(request, page_cache.page("cart.html"))
 
 
 @app.get("/login", response_class=HTMLResponse)
 async def read_login(request: Request):
     """Страница входа"""
     log.info("Запрос страницы входа")
-    return templates.TemplateResponse("login.html", {"request": request})
+    return page_response(request, page_cache.page("login.html"))
 
 
 @app.get("/register", response_class=HTMLResponse)
 async def read_register(request: Request):
     """Страница регистрации"""
     log.info("Запрос страницы регистрации")
-    return templates.TemplateResponse("register.html", {"request": request})
+    return page_response(request, page_cache.page("register.html"))
 
 
 @app.get("/orders", response_class=HTMLResponse)
 async def read_orders(request: Request):
     """Страница заказов"""
     log.info("Запрос страницы заказов")
-    return templates.TemplateResponse("orders.html", {"request": request})
+    return page_response(request, page_cache.page("orders.html"))
 
 
 # API endpoints
+@app.get("/debug", response_class=HTMLResponse, include_in_schema=False)
+async def debug_page(request: Request):
+    """Отладочная страница: корзина и SQL-запросы последних HTTP-запросов (только в режиме SQL_PROFILING)"""
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return templates.TemplateResponse("debug.html", {"request": request})
+
+
+@app.get("/api/debug/sql", include_in_schema=False)
+async def debug_sql():
+    """SQL-запросы последних HTTP-запросов, сгруппированные по нормализованному тексту"""
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return {"slow_query_ms": profiler.slow_query_ms, "requests": profiler.recent()}
+
+
 @app.get("/api/health")
 async def health_check():
     """Проверка здоровья приложения"""
@@ -169,9 +284,65 @@ async def health_check():
     return {"status": "healthy", "message": "Приложение работает нормально"}
 
 
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Счетчики кэша каталога: попадания, промахи, вытеснения"""
+    return product_cache.stats()
+
+
+@app.get("/api/db/pool")
+async def db_pool_stats():
+    """
+    Пулы соединений синхронного и асинхронного движков (занятые, переполнение, ожидание выдачи)
+    и распределение чтений между основной базой и репликами.
+    """
+    return {
+        "sync": database.pool_stats(database.engine),
+        "async": database.pool_stats(database.async_engine.sync_engine),
+        "replicas": replicas.replica_router.stats(),
+    }
+
+
+@app.get("/api/jobs/stats")
+def jobs_stats():
+    """Очередь фоновых задач: обработанные, повторенные и неудачные события, строки outbox по статусам"""
+    return jobs.queue.stats()
+
+
+def collect_runtime_metrics():
+    """Перенос в метрики счетчиков кэша каталога и состояния пулов соединений"""
+    cache = product_cache.stats()
+    metrics.cache_requests.set(cache["hits"], "hit")
+    metrics.cache_requests.set(cache["misses"], "miss")
+
+    engines = {"primary": database.engine, "primary_async": database.async_engine.sync_engine}
+    for number, replica in enumerate(replicas.replica_router.replicas, start=1):
+        engines[f"replica{number}"] = replica.engine
+        engines[f"replica{number}_async"] = replica.async_engine.sync_engine
+    for name, engine in engines.items():
+        pool = database.pool_stats(engine)
+        if "checked_out" in pool:
+            metrics.db_pool_checked_out.set(pool["checked_out"], name)
+            metrics.db_pool_overflow.set(pool["overflow"], name)
+            metrics.db_pool_size.set(pool["size"], name)
+        if "checkouts" in pool:
+            metrics.db_pool_checkouts.set(pool["checkouts"], name)
+            metrics.db_pool_wait.set(pool["wait_seconds_total"], name)
+            metrics.db_pool_timeouts.set(pool["timeouts"], name)
+
+
+metrics.registry.add_collector(collect_runtime_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Метрики процесса в текстовом формате Prometheus"""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # Заполнение базы данных тестовыми данными
 @app.post("/api/seed")
-async def seed_database(db: Session = Depends(database.get_db)):
+def seed_database(db: Session = Depends(database.get_db)):
     """Заполнение базы данных тестовыми данными"""
     try:
         log.info("Начало заполнения базы данных тестовыми данными")
@@ -0,0 +1,323 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Метрики в формате Prometheus (text exposition 0.0.4) без внешних зависимостей.
+# Значения хранятся в памяти процесса: при нескольких воркерах каждый отдает свои,
+# а Prometheus суммирует их по меткам instance/pod.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+# charset добавляет Starlette
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    """Метрика с набором меток; значения по кортежу значений меток"""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, _labels(self.labelnames, labels), value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {_number(value)}" for name, labels, value in self.samples()]
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, value: float, *labels: str):
+        """Значение, которое считается в другом месте (кэш, пул) и переносится при выдаче"""
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+
+class Histogram(Metric):
+    """
+    Гистограмма: на каждое наблюдение увеличивается один счетчик корзины,
+    накопленные суммы (как требует формат) считаются только при выдаче /metrics.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # labels -> [счетчики корзин..., сумма]
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        for labels, values in series:
+            total = 0
+            for bound, count in zip(self.buckets, values):
+                total += count
+                yield f"{self.name}_bucket", _labels(self.labelnames, labels, f'le="{_number(bound)}"'), total
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), values[-1]
+            yield f"{self.name}_count", _labels(self.labelnames, labels), total
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Registry:
+    """Набор метрик и функций, которые дополняют их значения при выдаче (состояние пулов, кэша)"""
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> bytes:
+        for collector in self._collectors:
+            collector()
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return ("\n".join(lines) + "\n").encode()
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+# HTTP
+http_requests = registry.register(Counter(
+    "http_requests_total", "Обработанные HTTP-запросы", ("method", "route", "status")))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса", ("method", "route")))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP-запросы в обработке"))
+
+# База данных
+db_queries = registry.register(Counter(
+    "db_queries_total", "Выполненные SQL-запросы"))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Время выполнения SQL-запроса"))
+request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "SQL-запросов на один HTTP-запрос", ("route",), QUERY_COUNT_BUCKETS))
+request_db_duration = registry.register(Histogram(
+    "http_request_db_seconds", "Суммарное время SQL-запросов за HTTP-запрос", ("route",)))
+
+# Пулы соединений и кэш каталога: значения переносятся из их собственных счетчиков при выдаче
+db_pool_checked_out = registry.register(Gauge(
+    "db_pool_checked_out", "Соединения, выданные из пула", ("engine",)))
+db_pool_overflow = registry.register(Gauge(
+    "db_pool_overflow", "Соединения сверх pool_size", ("engine",)))
+db_pool_size = registry.register(Gauge(
+    "db_pool_size", "Размер пула (без переполнения)", ("engine",)))
+db_pool_checkouts = registry.register(Counter(
+    "db_pool_checkouts_total", "Выдачи соединения из пула", ("engine",)))
+db_pool_wait = registry.register(Counter(
+    "db_pool_checkout_wait_seconds_total", "Суммарное ожидание соединения из пула", ("engine",)))
+db_pool_timeouts = registry.register(Counter(
+    "db_pool_timeouts_total", "Таймауты ожидания соединения из пула", ("engine",)))
+cache_requests = registry.register(Counter(
+    "catalog_cache_requests_total", "Обращения к кэшу каталога", ("result",)))
+
+# Склад и заказы
+stock_reservations = registry.register(Counter(
+    "stock_reservations_total", "Попытки списать остаток товара при заказе", ("result",)))
+stock_units_reserved = registry.register(Counter(
+    "stock_units_reserved_total", "Списанные единицы товара"))
+orders_created = registry.register(Counter(
+    "orders_created_total", "Оформленные заказы"))
+products_imported = registry.register(Counter(
+    "products_imported_total", "Товары, записанные массовым импортом"))
+idempotent_requests = registry.register(Counter(
+    "idempotent_requests_total", "Заказы с Idempotency-Key: new, replayed, conflict, timeout", ("result",)))
+
+# Фоновые задачи (outbox)
+jobs_processed = registry.register(Counter(
+    "jobs_processed_total", "Обработка событий outbox: done, retry, failed", ("kind", "result")))
+job_duration = registry.register(Histogram(
+    "job_duration_seconds", "Время обработки события outbox", ("kind",)))
+
+# Серии без меток видны в /metrics с нуля, еще до первого события
+for _metric in (http_in_flight, db_queries, orders_created, stock_units_reserved, products_imported):
+    _metric.set(0)
+
+
+class RequestStats:
+    """SQL-запросы текущего HTTP-запроса (изменяется и из потока синхронного обработчика)"""
+    __slots__ = ("queries", "duration")
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+
+# Контекст копируется в поток синхронного обработчика, поэтому объект общий с middleware
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_started"].pop()
+    elapsed = time.perf_counter() - started
+    db_queries.inc()
+    db_query_duration.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.duration += elapsed
+
+
+def _handle_error(exception_context):
+    # После ошибки after_cursor_execute не вызывается: снимаем отметку начала
+    started = exception_context.connection.info.get("metrics_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(sync_engine: Engine):
+    """Подсчет числа и времени SQL-запросов движка"""
+    if not METRICS_ENABLED:
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+def _route(scope) -> str:
+    """Шаблон маршрута вместо пути, чтобы число серий не зависело от ID в URL"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Подключенные приложения (статика) задают root_path, остальное — путь без маршрута
+    return scope.get("root_path") or "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: время, статус и число SQL-запросов каждого HTTP-запроса.
+    Написан без BaseHTTPMiddleware, чтобы не добавлять задачу и очередь на каждый запрос.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = ["500"]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            _request_stats.reset(token)
+            method, route = scope["method"], _route(scope)
+            http_requests.inc(method, route, status[0])
+            http_request_duration.observe(elapsed, method, route)
+            request_db_queries.observe(stats.queries, route)
+            request_db_duration.observe(stats.duration, route)
@@ -1,17 +1,29 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Table
+from sqlalchemy import (Boolean, Column, Integer, String, Float, Date, DateTime, Text, ForeignKey, Index,
+                        UniqueConstraint, false)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
 from .logging_config import log
 
-# Ассоциативная таблица для связи многие-ко-многим между заказами и товарами
-order_product_association = Table(
-    'order_product',
-    Base.metadata,
-    Column('order_id', Integer, ForeignKey('orders.id')),
-    Column('product_id', Integer, ForeignKey('products.id')),
-    Column('quantity', Integer, nullable=False, default=1)
-)
+class OrderItem(Base):
+    """Позиция заказа: товар, количество и цена на момент покупки"""
+    __tablename__ = "order_product"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False, default=1)
+    unit_price = Column(Float, nullable=False)
+
+    # Связь с заказом
+    order = relationship("Order", back_populates="items")
+
+    def __repr__(self):
+        return f"<OrderItem {self.order_id}:{self.product_id} x{self.quantity}>"
+
+
+# Таблица позиций заказов, через которую связаны заказы и товары
+order_product_association = OrderItem.__table__
 
 
 class User(Base):
@@ -35,6 +47,17 @@ class User(Base):
 class Product(Base):
     """Модель товара"""
     __tablename__ = "products"
+    __table_args__ = (
+        # Составные индексы (sort_key, id) под сортировки каталога и keyset-пагинацию
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_name_id", "name", "id"),
+        Index("ix_products_category_id", "category", "id"),
+        Index("ix_products_category_price_id", "category", "price", "id"),
+        Index("ix_products_category_name_id", "category", "name", "id"),
+        # Фасеты поиска: счетчики размеров и цветов с фильтром по цене считаются по индексу
+        Index("ix_products_size_price", "size", "price"),
+        Index("ix_products_color_price", "color", "price"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True, nullable=False)
@@ -45,9 +68,13 @@ class Product(Base):
     color = Column(String, nullable=False)
     stock_quantity = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Обновляется при любом изменении строки (в том числе при списании остатка).
+    # В базе прежней версии столбец заполняется временем создания (см. schema_upgrade)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(),
+                        info={"backfill": "UPDATE products SET updated_at = created_at"})
 
     # Связь с заказами
-    orders = relationship("Order", secondary=order_product_association, back_populates="products")
+    orders = relationship("Order", secondary=order_product_association, back_populates="products", viewonly=True)
 
     def __repr__(self):
         return f"<Product {self.name}>"
@@ -56,6 +83,12 @@ class Product(Base):
 class Order(Base):
     """Модель заказа"""
     __tablename__ = "orders"
+    __table_args__ = (
+        # Заказы пользователя выбираются и листаются по (user_id, id)
+        Index("ix_orders_user_id_id", "user_id", "id"),
+        # Сводки продаж забирают еще не учтенные заказы по (rolled_up, id)
+        Index("ix_orders_rolled_up_id", "rolled_up", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -63,10 +96,166 @@ class Order(Base):
     status = Column(String, default="pending")  # pending, confirmed, shipped, delivered, cancelled
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Заказ учтен в сводках продаж (см. analytics.SalesRollup). В базе прежней версии учтенными
+    # считаются заказы до отметки, по которой сводки заполнялись раньше
+    rolled_up = Column(Boolean, nullable=False, default=False, server_default=false(), info={"backfill": (
+        "UPDATE orders SET rolled_up = TRUE "
+        "WHERE id <= (SELECT last_order_id FROM rollup_watermarks WHERE name = 'sales')")})
 
     # Связи
     user = relationship("User", back_populates="orders")
-    products = relationship("Product", secondary=order_product_association, back_populates="orders")
+    items = relationship("OrderItem", back_populates="order", order_by="OrderItem.id")
+    products = relationship("Product", secondary=order_product_association, back_populates="orders", viewonly=True)
+
+    def __repr__(self):
+        return f"<Order {self.id} - {self.status}>"
+
+
+class CartItem(Base):
+    """Позиция серверной корзины: товар, количество и цена на момент добавления"""
+    __tablename__ = "cart_items"
+    __table_args__ = (
+        # Одна строка на товар; тот же индекс выбирает всю корзину пользователя по user_id
+        UniqueConstraint("user_id", "product_id", name="uq_cart_items_user_id_product_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False, default=1)
+    # Цена, которую видел покупатель: при проверке корзины сравнивается с текущей
+    unit_price = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<CartItem {self.user_id}:{self.product_id} x{self.quantity}>"
+
+
+class OutboxEvent(Base):
+    """Событие для фоновой обработки, записанное в одной транзакции с изменением (outbox)"""
+    __tablename__ = "outbox"
+    __table_args__ = (
+        # Диспетчер выбирает готовые события по статусу и времени следующей попытки
+        Index("ix_outbox_status_available_at", "status", "available_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, processing, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    # Время в секундах Unix: одинаково сравнивается в SQLite и PostgreSQL
+    available_at = Column(Float, nullable=False)
+    locked_at = Column(Float)
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<OutboxEvent {self.id} {self.kind} - {self.status}>"
+
+
+class IdempotencyKey(Base):
+    """Ключ идемпотентности заказа: повтор запроса получает сохраненный ответ"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        # Очистка удаляет просроченные ключи по expires_at
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+    # "<user_id>:<Idempotency-Key>": ключи разных пользователей не пересекаются
+    key = Column(String, primary_key=True)
+    # sha256 тела запроса: тот же ключ с другим заказом — ошибка клиента
+    fingerprint = Column(String(64), nullable=False)
+    status = Column(String, nullable=False, default="processing")  # processing, done
+    locked_at = Column(Float)
+    # Случайный токен текущего захвата: завершить или освободить ключ может только его владелец.
+    # У ключей из базы прежней версии токена нет: незавершенный такой ключ захватывается заново по lock_timeout
+    token = Column(String(32))
+    order_id = Column(Integer)
+    # Снимок тела ответа (JSON); записывается сразу после commit заказа
+    response = Column(Text)
+    expires_at = Column(Float, nullable=False)
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.key} - {self.status}>"
+
+
+class CategoryStats(Base):
+    """Сводка по категории каталога; обновляется в транзакциях, меняющих товары и остатки"""
+    __tablename__ = "category_stats"
+
+    category = Column(String, primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+    # Товары с ненулевым остатком
+    in_stock_count = Column(Integer, nullable=False, default=0)
+    # Сумма цен: средняя цена — price_sum / product_count
+    price_sum = Column(Float, nullable=False, default=0)
+    min_price = Column(Float)
+    max_price = Column(Float)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<CategoryStats {self.category}: {self.product_count}>"
+
+
+# Сводки продаж для аналитики (заполняются фоновой задачей app.analytics по новым заказам)
+class SalesHourly(Base):
+    """Продажи за час: заказы, единицы товара и выручка"""
+    __tablename__ = "sales_hourly"
+    # В SQLite строки хранятся прямо в дереве первичного ключа: выборка периода читает их подряд
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    # Начало часа, UTC
+    hour = Column(DateTime, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<SalesHourly {self.hour}: {self.revenue}>"
+
+
+class SalesDaily(Base):
+    """Продажи товара за день (UTC); категория хранится здесь же, чтобы не соединять с products"""
+    __tablename__ = "sales_daily"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    category = Column(String, nullable=False)
+    # Заказы с этим товаром (товар встречается в заказе одной позицией)
+    orders = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<SalesDaily {self.day} {self.product_id}: {self.revenue}>"
+
+
+class SalesCategoryDaily(Base):
+    """Продажи категории за день (UTC): продажи по категориям читают дни × категории, а не дни × товары"""
+    __tablename__ = "sales_category_daily"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    day = Column(Date, primary_key=True)
+    category = Column(String, primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<SalesCategoryDaily {self.day} {self.category}: {self.revenue}>"
+
+
+class RollupWatermark(Base):
+    """
+    Состояние сводок продаж для /api/analytics/status: наибольший учтенный id заказа и время
+    последнего прохода. Какие заказы учитывать, решает orders.rolled_up, а не эта таблица.
+    """
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String, primary_key=True)
+    last_order_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     def __repr__(self):
-        return f"<Order {self.id} - {self.status}>"
\ No newline at end of file
+        return f"<RollupWatermark {self.name}: {self.last_order_id}>"
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+from fastapi import Request
+from fastapi.responses import Response
+from fastapi.templating import Jinja2Templates
+
+from . import assets, http_cache
+from .cache import TTLCache
+from .logging_config import log
+
+# Загрузка переменных окружения
+load_dotenv()
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+templates_dir = os.path.join(base_dir, "..", "templates")
+
+# Настройка шаблонов; static_url дает адрес статики с хэшем содержимого
+templates = Jinja2Templates(directory=templates_dir)
+templates.env.globals["static_url"] = assets.static_url
+
+# Страницы без данных с сервера: их HTML не зависит от запроса и рендерится один раз
+STATIC_PAGES = ("index.html", "products.html", "cart.html", "login.html", "register.html", "orders.html")
+
+# Страницы товаров кэшируются по ключу кэша каталога (он содержит версию товара)
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "1024"))
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "300"))
+
+
+class RenderedPage:
+    """Готовый HTML со сжатыми вариантами и ETag"""
+    __slots__ = ("status_code", "etag", "variants")
+
+    def __init__(self, html: str, status_code: int = 200):
+        body = html.encode()
+        self.status_code = status_code
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        # encoding -> тело; "identity" есть всегда
+        self.variants: Dict[str, bytes] = {"identity": body, **http_cache.compressed_variants(body)}
+
+    def variant_etag(self, encoding: str) -> str:
+        """Сжатые варианты — разные представления, поэтому у каждого свой сильный ETag"""
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"{self.etag}{suffix}"'
+
+
+def page_response(request: Request, page: RenderedPage) -> Response:
+    """Ответ с вариантом страницы по Accept-Encoding; 304 при совпадении If-None-Match"""
+    encoding = http_cache.choose_encoding(request, page.variants)
+    etag = page.variant_etag(encoding)
+    headers = {**http_cache.cache_headers(etag), "Vary": "Accept-Encoding"}
+    if http_cache.etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=page.variants[encoding], status_code=page.status_code,
+                    media_type="text/html", headers=headers)
+
+
+def prefers_html(request: Request) -> bool:
+    """Переход браузера на страницу (а не запрос из fetch или API-клиента)"""
+    return "text/html" in request.headers.get("accept", "")
+
+
+class PageCache:
+    """
+    Кэш отрендеренных страниц. Шаблоны не используют request, поэтому статические
+    страницы рендерятся и сжимаются один раз (при запуске), а страница товара —
+    один раз на версию товара в кэше каталога.
+    """
+
+    def __init__(self, maxsize: int = PAGE_CACHE_SIZE, ttl: float = PAGE_CACHE_TTL):
+        self.pages: Dict[str, RenderedPage] = {}
+        self.products = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def render(template_name: str, **context: Any) -> str:
+        return templates.get_template(template_name).render(**context)
+
+    def page(self, template_name: str) -> RenderedPage:
+        page = self.pages.get(template_name)
+        if page is None:
+            page = self.pages[template_name] = RenderedPage(self.render(template_name))
+        return page
+
+    def product_page(self, key: str, load: Callable[[], Optional[bytes]]) -> RenderedPage:
+        """
+        Страница товара: key — ключ кэша каталога, load — получение JSON товара
+        (None — товар не найден); JSON запрашивается только при промахе.
+        """
+        page = self.products.get(key)
+        if page is not None:
+            return page
+        content = load()
+        if content is None:
+            # Не кэшируется: товар с этим ID может появиться без смены версии
+            return RenderedPage(self.render("product-detail.html", product=None), status_code=404)
+        page = RenderedPage(self.render("product-detail.html", product=json.loads(content)))
+        self.products.set(key, page)
+        return page
+
+    def warm_up(self, template_names: Iterable[str] = STATIC_PAGES):
+        """Рендер и сжатие статических страниц до первого запроса"""
+        for template_name in template_names:
+            self.page(template_name)
+        log.info(f"Страницы подготовлены: {len(self.pages)}, brotli: {'да' if http_cache.brotli else 'нет'}")
+
+    def clear(self):
+        self.pages.clear()
+        self.products.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pages": len(self.pages), "products": self.products.stats(), "brotli": http_cache.brotli is not None}
+
+
+page_cache = PageCache()
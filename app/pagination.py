@@ -0,0 +1,54 @@
+import base64
+import json
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.sql import Select
+
+
+class InvalidCursor(ValueError):
+    """Курсор поврежден или относится к другой сортировке"""
+
+
+def encode_cursor(sort: str, key: Any, last_id: int) -> str:
+    """
+    Упаковка позиции последней записи страницы в непрозрачный токен.
+    key — значение ключа сортировки (None для сортировки по id).
+    """
+    payload = json.dumps({"s": sort, "k": key, "id": last_id}, separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: str) -> Tuple[Any, int]:
+    """Распаковка токена; возвращает (значение ключа сортировки, id)"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        cursor_sort, key, last_id = payload["s"], payload["k"], int(payload["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor("Некорректный курсор") from e
+    if cursor_sort != sort:
+        raise InvalidCursor("Курсор получен для другой сортировки")
+    return key, last_id
+
+
+def apply_keyset(query: Select, key_column, id_column, descending: bool, key: Any, last_id: int) -> Select:
+    """
+    Условие "после последней записи" для сортировки (key_column, id).
+    Сравнение кортежей обслуживается составным индексом (key, id) без OFFSET.
+    """
+    if key_column is None:
+        return query.where(id_column < last_id if descending else id_column > last_id)
+    left, right = tuple_(key_column, id_column), tuple_(key, last_id)
+    return query.where(left < right if descending else left > right)
+
+
+def next_cursor(rows: list, limit: int, sort: str, key_attr: Optional[str]) -> Optional[str]:
+    """
+    Токен следующей страницы. Запрос выбирает limit + 1 строку:
+    лишняя строка означает, что следующая страница существует, и отбрасывается.
+    """
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(sort, getattr(last, key_attr) if key_attr else None, last.id)
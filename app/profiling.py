@@ -0,0 +1,267 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .logging_config import log
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Профилирование SQL по запросам (включается явно: на каждый SQL-запрос добавляется работа)
+SQL_PROFILING = os.getenv("SQL_PROFILING", "false").lower() in ("1", "true", "yes", "on")
+# Запросы дольше порога пишутся в лог вместе с планом выполнения
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# Сколько последних HTTP-запросов хранить для страницы /debug
+SQL_PROFILE_HISTORY = int(os.getenv("SQL_PROFILE_HISTORY", "50"))
+
+# Служебные адреса не попадают в историю, чтобы не вытеснять профилируемые запросы
+EXCLUDED_PREFIXES = ("/api/debug", "/debug", "/static", "/metrics")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\?|%\(\w+\)s|%s|\$\d+|(?<!:):\w+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    SQL без значений: литералы и параметры заменяются на ?, списки IN (?, ?, ...) — на (...),
+    чтобы одинаковые запросы с разными значениями и длиной списка группировались вместе.
+    """
+    sql = _STRING.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def explain(dbapi_connection, dialect_name: str, statement: str, parameters) -> Optional[str]:
+    """
+    План выполнения запроса тем же DBAPI-соединением (без выполнения самого запроса).
+    Вне SQLite EXPLAIN выполняется в точке сохранения: в PostgreSQL ошибка иначе прервала бы
+    открытую транзакцию запроса, и все следующие его команды тоже завершились бы ошибкой.
+    """
+    if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if dialect_name == "sqlite" else "EXPLAIN "
+    savepoint = dialect_name != "sqlite"
+    explain_cursor = dbapi_connection.cursor()
+    try:
+        if savepoint:
+            explain_cursor.execute("SAVEPOINT sql_profiler_explain")
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            rows = explain_cursor.fetchall()
+        except Exception:
+            if savepoint:
+                explain_cursor.execute("ROLLBACK TO SAVEPOINT sql_profiler_explain")
+            raise
+        if savepoint:
+            explain_cursor.execute("RELEASE SAVEPOINT sql_profiler_explain")
+    finally:
+        explain_cursor.close()
+    if dialect_name == "sqlite":
+        # (id, parent, notused, detail): отступ по глубине вложенности
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+        return "\n".join(lines)
+    return "\n".join(str(row[0]) for row in rows)
+
+
+class RequestProfile:
+    """SQL-запросы одного HTTP-запроса, сгруппированные по нормализованному тексту"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.status: Optional[int] = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, statement: str, elapsed: float, slow: bool):
+        key = normalize_sql(statement)
+        with self._lock:
+            self.queries += 1
+            self.db_time += elapsed
+            entry = self.statements.get(key)
+            if entry is None:
+                entry = self.statements[key] = {"sql": key, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0}
+            entry["count"] += 1
+            entry["total_ms"] += elapsed * 1000
+            entry["max_ms"] = max(entry["max_ms"], elapsed * 1000)
+            entry["slow"] += slow
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            statements = sorted(self.statements.values(), key=lambda item: item["total_ms"], reverse=True)
+            return {
+                "method": self.method,
+                "path": self.path,
+                "status": self.status,
+                "started_at": self.started_at,
+                "duration_ms": round(self.duration * 1000, 3),
+                "queries": self.queries,
+                "db_ms": round(self.db_time * 1000, 3),
+                # Одинаковые запросы, выполненные больше одного раза, — кандидаты на N+1
+                "repeated": sum(1 for item in statements if item["count"] > 1),
+                "statements": [
+                    {**item, "total_ms": round(item["total_ms"], 3), "max_ms": round(item["max_ms"], 3)}
+                    for item in statements
+                ],
+            }
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("sql_profile", default=None)
+
+
+class SQLProfiler:
+    """
+    Профилировщик SQL: события before/after_cursor_execute подключаются к движкам
+    только во включенном режиме, поэтому выключенный профилировщик ничего не стоит.
+    """
+
+    def __init__(self, enabled: bool = SQL_PROFILING, slow_query_ms: float = SLOW_QUERY_MS,
+                 history: int = SQL_PROFILE_HISTORY):
+        self.enabled = False
+        self.slow_query_ms = slow_query_ms
+        self.history: "deque[Dict[str, Any]]" = deque(maxlen=history)
+        self._engines: List[Engine] = []
+        # План каждого медленного запроса пишется в лог один раз, дальше только время
+        self._explained: Set[str] = set()
+        self._lock = threading.Lock()
+        if enabled:
+            self.enable()
+
+    def instrument(self, sync_engine: Engine):
+        self._engines.append(sync_engine)
+        if self.enabled:
+            self._listen(sync_engine)
+
+    def _listen(self, sync_engine: Engine):
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(sync_engine, "handle_error", self._handle_error)
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            for sync_engine in self._engines:
+                self._listen(sync_engine)
+
+    def disable(self):
+        if self.enabled:
+            self.enabled = False
+            for sync_engine in self._engines:
+                event.remove(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+                event.remove(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+                event.remove(sync_engine, "handle_error", self._handle_error)
+
+    def clear(self):
+        with self._lock:
+            self.history.clear()
+            self._explained.clear()
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """Последние запросы, новые первыми"""
+        with self._lock:
+            return list(reversed(self.history))
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+    def _handle_error(self, exception_context):
+        # После ошибки after_cursor_execute не вызывается: снимаем отметку начала
+        connection = exception_context.connection
+        stack = connection.info.get("profiling_started") if connection is not None else None
+        if stack:
+            stack.pop()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("profiling_started")
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        slow = elapsed * 1000 >= self.slow_query_ms
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.add(statement, elapsed, slow)
+        if slow:
+            self._log_slow(conn, statement, parameters, executemany, elapsed, profile)
+
+    def _log_slow(self, conn, statement, parameters, executemany, elapsed, profile):
+        key = normalize_sql(statement)
+        where = f" ({profile.method} {profile.path})" if profile else ""
+        message = f"Медленный SQL-запрос {elapsed * 1000:.1f} мс{where}: {key}"
+        with self._lock:
+            first = key not in self._explained
+            self._explained.add(key)
+        if first and not executemany:
+            try:
+                plan = explain(conn.connection.dbapi_connection, conn.dialect.name, statement, parameters)
+            except Exception as e:
+                plan = f"не удалось получить план: {e}"
+            if plan:
+                message += f"\nПлан выполнения:\n{plan}"
+        log.warning(message)
+
+    def finish(self, profile: RequestProfile):
+        with self._lock:
+            self.history.append(profile.as_dict())
+
+
+profiler = SQLProfiler()
+
+
+def server_timing(profile: RequestProfile) -> bytes:
+    """Заголовок Server-Timing: время и число SQL-запросов видны в инструментах разработчика браузера"""
+    return f'db;dur={profile.db_time * 1000:.2f};desc="{profile.queries} SQL"'.encode()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware режима профилирования: собирает SQL-запросы каждого HTTP-запроса,
+    добавляет заголовок Server-Timing и сохраняет разбивку в историю для /debug.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.enabled or scope["path"].startswith(EXCLUDED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Обработчик уже завершился (кроме потоковых ответов): запросы к БД посчитаны
+                profile.status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", server_timing(profile))]
+            await send(message)
+
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.duration = time.perf_counter() - started
+            _current_profile.reset(token)
+            profiler.finish(profile)
@@ -0,0 +1,224 @@
+import asyncio
+import os
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import database
+from .cache import BACKEND_ERRORS, CacheBackend, MemoryBackend, RedisBackend, product_cache
+from .logging_config import log
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Реплики только для чтения через запятую; без них все запросы идут в основную базу
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Сколько секунд после записи чтения пользователя (и каталога, после изменения товаров)
+# идут в основную базу: реплика может отставать
+REPLICA_PIN_SECONDS = float(os.getenv("REPLICA_PIN_SECONDS", "5"))
+# Без Redis: сколько отметок хранится в памяти процесса (на каждого недавно писавшего пользователя)
+REPLICA_PIN_CACHE_SIZE = int(os.getenv("REPLICA_PIN_CACHE_SIZE", "100000"))
+# Через сколько секунд снова пробовать реплику, к которой не удалось подключиться
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
+
+class Replica:
+    """Реплика: свои синхронный и асинхронный движки с пулами и фабрики сессий"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine, self.async_engine = database.make_engines(url)
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.async_session_factory = async_sessionmaker(
+            bind=self.async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+        # Время (time.monotonic), до которого реплика считается недоступной
+        self.down_until = 0.0
+        self.failures = 0
+
+    def __repr__(self):
+        return f"<Replica {self.engine.url!r}>"
+
+
+class ReplicaRouter:
+    """
+    Выбор базы для чтения: реплики по кругу, пропуская недоступные, иначе основная база.
+    Реплика, к которой не удалось подключиться, исключается на retry_seconds.
+    После записи чтения пользователя закрепляются за основной базой на pin_seconds;
+    отметки хранятся в pins (см. create_pin_backend). Если хранилище отметок недоступно,
+    чтения пользователя идут в основную базу.
+
+    Так же на pin_seconds закрепляются чтения каталога после инвалидации его кэша: иначе промах
+    по новой версии ключа заполнился бы с отстающей реплики, и старые остатки отдавались бы из кэша
+    (с 304 на их ETag) до конца PRODUCT_CACHE_TTL.
+    """
+
+    def __init__(self, replicas: List[Replica], pins: CacheBackend, pin_seconds: float = REPLICA_PIN_SECONDS,
+                 retry_seconds: float = REPLICA_RETRY_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.replicas = replicas
+        self.pins = pins
+        self.pin_seconds = pin_seconds
+        self.retry_seconds = retry_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._next = 0
+        self.primary_reads = 0
+        self.replica_reads = 0
+
+    def _pin_key(self, user_id: Optional[int]) -> str:
+        return "replica:pin:catalog" if user_id is None else f"replica:pin:user:{user_id}"
+
+    def pin(self, user_id: Optional[int] = None):
+        """Закрепить чтения пользователя (None — чтения каталога) за основной базой после записи"""
+        if self.replicas and self.pin_seconds > 0:
+            try:
+                self.pins.set(self._pin_key(user_id), b"1", self.pin_seconds)
+            except BACKEND_ERRORS as e:
+                subject = "каталога" if user_id is None else f"пользователя {user_id}"
+                log.error(f"Хранилище отметок недоступно, чтения {subject} не закреплены: {e}")
+
+    def is_pinned(self, user_id: Optional[int]) -> bool:
+        try:
+            return self.pins.get(self._pin_key(user_id)) is not None
+        except BACKEND_ERRORS as e:
+            # Чтения пользователя — из основной базы. Каталог читается с реплики: хранилище отметок —
+            # это хранилище кэша, и без него результат с реплики в кэш не попадет
+            log.warning(f"Хранилище отметок недоступно: {e}")
+            return user_id is not None
+
+    def candidates(self, user_id: Optional[int] = None, pinned: Optional[bool] = None) -> List[Replica]:
+        """
+        Доступные реплики в порядке очереди (каждый вызов сдвигает начало круга).
+        pinned — уже проверенная отметка (из async-кода она читается в потоке)
+        """
+        if not self.replicas:
+            return []
+        if pinned is None:
+            pinned = self.is_pinned(user_id)
+        if pinned:
+            return []
+        now = self._clock()
+        with self._lock:
+            start = self._next % len(self.replicas)
+            self._next += 1
+        ordered = self.replicas[start:] + self.replicas[:start]
+        return [replica for replica in ordered if replica.down_until <= now]
+
+    def mark_down(self, replica: Replica, error: Exception):
+        with self._lock:
+            replica.down_until = self._clock() + self.retry_seconds
+            replica.failures += 1
+        log.warning(f"Реплика {replica.engine.url!r} недоступна, повтор через {self.retry_seconds} с: {error}")
+
+    def _count(self, replica: Optional[Replica]):
+        with self._lock:
+            if replica is None:
+                self.primary_reads += 1
+            else:
+                self.replica_reads += 1
+
+    def read_session(self, user_id: Optional[int] = None) -> Session:
+        """
+        Сессия для чтения. Соединение берется сразу, чтобы недоступная реплика
+        была пропущена здесь, а не упала посреди запроса.
+        """
+        for replica in self.candidates(user_id):
+            db = replica.session_factory()
+            try:
+                db.connection()
+            except DBAPIError as e:
+                db.close()
+                self.mark_down(replica, e)
+                continue
+            self._count(replica)
+            return db
+        self._count(None)
+        return database.SessionLocal()
+
+    async def async_read_session(self, user_id: Optional[int] = None) -> AsyncSession:
+        """Асинхронная сессия для чтения (выбор базы как в read_session)"""
+        pinned = None
+        if self.replicas and self.pins.blocking:
+            pinned = await asyncio.to_thread(self.is_pinned, user_id)
+        for replica in self.candidates(user_id, pinned):
+            db = replica.async_session_factory()
+            try:
+                await db.connection()
+            except DBAPIError as e:
+                await db.close()
+                self.mark_down(replica, e)
+                continue
+            self._count(replica)
+            return db
+        self._count(None)
+        return database.AsyncSessionLocal()
+
+    def stats(self) -> Dict:
+        now = self._clock()
+        with self._lock:
+            return {
+                "primary_reads": self.primary_reads,
+                "replica_reads": self.replica_reads,
+                "replicas": [
+                    {"url": repr(replica.engine.url), "healthy": replica.down_until <= now,
+                     "failures": replica.failures}
+                    for replica in self.replicas
+                ],
+            }
+
+    async def dispose(self):
+        for replica in self.replicas:
+            replica.engine.dispose()
+            await replica.async_engine.dispose()
+
+
+def create_pin_backend() -> CacheBackend:
+    """
+    Хранилище отметок. С CACHE_BACKEND=redis это тот же Redis, что у кэша каталога: отметка видна
+    всем воркерам и хостам. Иначе — отдельный LRU в памяти процесса на REPLICA_PIN_CACHE_SIZE отметок
+    (записи каталога его не вытесняют), но воркер видит только свои отметки: при нескольких воркерах
+    закрепление чтений надежно только с Redis.
+    """
+    if isinstance(product_cache.backend, RedisBackend):
+        return product_cache.backend
+    return MemoryBackend(maxsize=REPLICA_PIN_CACHE_SIZE, ttl=REPLICA_PIN_SECONDS)
+
+
+replica_router = ReplicaRouter([Replica(url) for url in DATABASE_REPLICA_URLS], create_pin_backend())
+if DATABASE_REPLICA_URLS:
+    log.info(f"Чтение каталога и истории заказов через реплики: {len(DATABASE_REPLICA_URLS)}")
+    if not isinstance(replica_router.pins, RedisBackend):
+        log.warning("Отметки чтений после записи хранятся в памяти процесса: при нескольких воркерах нужен "
+                    "CACHE_BACKEND=redis")
+
+
+def get_read_db() -> Iterator[Session]:
+    """Сессия для чтения каталога: реплика, если она есть и доступна"""
+    db = replica_router.read_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_user_read_db(user_id: int = 1) -> Iterator[Session]:
+    """Сессия для чтения данных пользователя: основная база, если он недавно что-то записал"""
+    db = replica_router.read_session(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db() -> AsyncIterator[AsyncSession]:
+    """Асинхронная сессия для чтения каталога"""
+    db = await replica_router.async_read_session()
+    try:
+        yield db
+    finally:
+        await db.close()
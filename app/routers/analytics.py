@@ -0,0 +1,86 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from .. import analytics, schemas
+from ..logging_config import log
+from ..replicas import get_read_db
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+
+@router.get("/revenue", response_model=List[schemas.SalesPeriod])
+def read_revenue(
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        granularity: str = "day",
+        db: Session = Depends(get_read_db)
+):
+    """
+    Выручка, число заказов и проданных единиц по дням или часам (UTC).
+
+    - **start**, **end**: Период включительно, по умолчанию последние 30 дней
+    - **granularity**: day или hour (для периода до 31 дня)
+    """
+    try:
+        start, end = analytics.period(start, end)
+        log.info(f"Запрос выручки за {start}..{end} по {granularity}")
+        return analytics.get_revenue(db, start, end, granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.error(f"Ошибка при получении выручки: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.get("/categories", response_model=List[schemas.CategorySales])
+def read_category_sales(start: Optional[date] = None, end: Optional[date] = None,
+                        db: Session = Depends(get_read_db)):
+    """
+    Продажи по категориям за период (по умолчанию последние 30 дней), по убыванию выручки.
+    """
+    try:
+        start, end = analytics.period(start, end)
+        log.info(f"Запрос продаж по категориям за {start}..{end}")
+        return analytics.get_category_sales(db, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.error(f"Ошибка при получении продаж по категориям: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.get("/top-products", response_model=List[schemas.TopProduct])
+def read_top_products(
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = Query(10, ge=1, le=100),
+        by: str = "revenue",
+        db: Session = Depends(get_read_db)
+):
+    """
+    Самые продаваемые товары за период.
+
+    - **by**: revenue (выручка) или units (проданные единицы)
+    """
+    try:
+        start, end = analytics.period(start, end)
+        log.info(f"Запрос самых продаваемых товаров за {start}..{end} по {by}")
+        return analytics.get_top_products(db, start, end, limit=limit, by=by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.error(f"Ошибка при получении самых продаваемых товаров: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.get("/status", response_model=schemas.AnalyticsStatus)
+def read_status(db: Session = Depends(get_read_db)):
+    """Последний заказ, учтенный в сводках, и число заказов, которые еще не учтены"""
+    try:
+        return analytics.status(db)
+    except Exception as e:
+        log.error(f"Ошибка при получении состояния сводок продаж: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
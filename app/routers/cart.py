@@ -0,0 +1,101 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from .. import crud, schemas, database
+from ..logging_config import log
+
+router = APIRouter(prefix="/api/cart", tags=["cart"])
+
+
+@router.get("", response_model=schemas.Cart)
+def read_cart(user_id: int = 1, db: Session = Depends(database.get_db)):
+    """
+    Получение корзины с текущими ценами и остатками товаров.
+
+    - **user_id**: ID пользователя (в учебных целях фиксированный)
+    """
+    try:
+        return crud.get_cart(db, user_id=user_id)
+    except Exception as e:
+        log.error(f"Ошибка при получении корзины пользователя ID {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.post("/items", response_model=schemas.Cart)
+def add_cart_item(item: schemas.CartItemCreate, user_id: int = 1, db: Session = Depends(database.get_db)):
+    """Добавление товара в корзину (к уже добавленному количеству)"""
+    try:
+        return crud.set_cart_item(db, user_id=user_id, product_id=item.product_id, quantity=item.quantity, add=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.error(f"Ошибка при добавлении товара в корзину: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.put("/items/{product_id}", response_model=schemas.Cart)
+def update_cart_item(product_id: int, item: schemas.CartItemUpdate, user_id: int = 1,
+                     db: Session = Depends(database.get_db)):
+    """Изменение количества товара в корзине (0 — удаление позиции)"""
+    try:
+        return crud.set_cart_item(db, user_id=user_id, product_id=product_id, quantity=item.quantity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.error(f"Ошибка при изменении корзины: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.delete("/items/{product_id}", response_model=schemas.Cart)
+def remove_cart_item(product_id: int, user_id: int = 1, db: Session = Depends(database.get_db)):
+    """Удаление товара из корзины"""
+    try:
+        return crud.set_cart_item(db, user_id=user_id, product_id=product_id, quantity=0)
+    except Exception as e:
+        log.error(f"Ошибка при удалении товара из корзины: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.delete("", status_code=status.HTTP_204_NO_CONTENT)
+def clear_cart(user_id: int = 1, db: Session = Depends(database.get_db)):
+    """Очистка корзины"""
+    try:
+        crud.clear_cart(db, user_id=user_id)
+    except Exception as e:
+        log.error(f"Ошибка при очистке корзины: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.post("/validate", response_model=schemas.Cart)
+def validate_cart(user_id: int = 1, db: Session = Depends(database.get_db)):
+    """
+    Проверка остатков и цен всех позиций корзины одним запросом.
+    Изменившиеся цены показываются в ответе и фиксируются в корзине.
+    """
+    try:
+        return crud.validate_cart(db, user_id=user_id)
+    except Exception as e:
+        log.error(f"Ошибка при проверке корзины пользователя ID {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.post("/checkout", response_model=schemas.Order, status_code=status.HTTP_201_CREATED)
+def checkout(user_id: int = 1, db: Session = Depends(database.get_db)):
+    """
+    Оформление корзины в заказ в одной транзакции.
+    409 — корзина изменилась с последней проверки (в ответе актуальная корзина).
+    """
+    try:
+        log.info(f"Оформление корзины пользователя ID: {user_id}")
+        return crud.checkout_cart(db, user_id=user_id)
+
+    except crud.InvalidCart as e:
+        log.warning(f"Корзина пользователя ID {user_id} изменилась: {e}")
+        raise HTTPException(status_code=409, detail=e.cart.model_dump())
+
+    except ValueError as e:
+        log.warning(f"Ошибка валидации при оформлении корзины: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception as e:
+        log.error(f"Ошибка при оформлении корзины: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
@@ -1,23 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from .. import crud, schemas, database
+from ..idempotency import IDEMPOTENCY_KEY_MAX_LENGTH, IdempotencyConflict, RequestInProgress
+from ..bulk import BULK_FORMATS
+from ..replicas import get_user_read_db
 from ..logging_config import log
+from ..pagination import InvalidCursor
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
 @router.post("/", response_model=schemas.Order, status_code=status.HTTP_201_CREATED)
-def create_order(order: schemas.OrderCreate, user_id: int = 1, db: Session = Depends(database.get_db)):
+def create_order(
+        order: schemas.OrderCreate,
+        user_id: int = 1,
+        idempotency_key: Optional[str] = Header(None, min_length=1, max_length=IDEMPOTENCY_KEY_MAX_LENGTH),
+        db: Session = Depends(database.get_db)
+):
     """
     Создание нового заказа.
 
     - **user_id**: ID пользователя (в учебных целях фиксированный)
     - **products**: Список товаров в заказе с количеством
+    - **Idempotency-Key**: Необязательный ключ запроса; повтор с тем же ключом вернет уже созданный
+      заказ (заголовок Idempotent-Replayed: true), а не создаст новый
     """
     try:
         log.info(f"Попытка создания заказа для пользователя ID: {user_id}")
-        return crud.create_order(db=db, order=order, user_id=user_id)
+        if idempotency_key is None:
+            return crud.create_order(db=db, order=order, user_id=user_id)
+
+        content, replayed = crud.create_order_idempotent(db, order, user_id, idempotency_key)
+        headers = {"Idempotent-Replayed": "true"} if replayed else None
+        return Response(content=content, status_code=status.HTTP_201_CREATED, media_type="application/json",
+                        headers=headers)
+
+    except IdempotencyConflict as e:
+        log.warning(f"Ключ идемпотентности {idempotency_key!r} использован с другим заказом")
+        raise HTTPException(status_code=422, detail=str(e))
+
+    except RequestInProgress as e:
+        log.warning(f"Заказ с ключом идемпотентности {idempotency_key!r} еще выполняется")
+        raise HTTPException(status_code=409, detail=str(e))
 
     except ValueError as e:
         log.warning(f"Ошибка валидации при создании заказа: {e}")
@@ -33,7 +59,7 @@ def read_orders(
         user_id: int = 1,
         skip: int = 0,
         limit: int = 100,
-        db: Session = Depends(database.get_db)
+        db: Session = Depends(get_user_read_db)
 ):
     """
     Получение списка заказов пользователя.
@@ -44,13 +70,69 @@ def read_orders(
     """
     try:
         log.info(f"Запрос списка заказов для пользователя ID: {user_id}")
-        orders = crud.get_orders(db, user_id=user_id, skip=skip, limit=limit)
-        return orders
+        # Готовый JSON без повторной валидации; схема в OpenAPI по-прежнему из response_model
+        content = crud.get_orders_json(db, user_id=user_id, skip=skip, limit=limit)
+        return Response(content=content, media_type="application/json")
     except Exception as e:
         log.error(f"Ошибка при получении списка заказов: {e}")
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
 
 
+@router.get("/page", response_model=schemas.OrderPage)
+def read_orders_page(
+        user_id: int = 1,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        skip: int = 0,
+        db: Session = Depends(database.get_db)
+):
+    """
+    Получение страницы заказов пользователя по курсору.
+
+    - **user_id**: ID пользователя (в учебных целях фиксированный)
+    - **cursor**: Значение next_cursor из предыдущей страницы
+    - **skip**: Используется только без курсора (для обратной совместимости)
+    """
+    try:
+        log.info(f"Запрос страницы заказов для пользователя ID: {user_id}, cursor={cursor}")
+        orders, next_cursor = crud.get_orders_page(db, user_id=user_id, limit=limit, cursor=cursor, skip=skip)
+        return {"items": orders, "next_cursor": next_cursor}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.error(f"Ошибка при получении страницы заказов: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.get("/export")
+def export_orders(user_id: int = 1, format: str = "ndjson"):
+    """
+    Экспорт всей истории заказов пользователя в NDJSON или CSV.
+    Ответ передается по мере чтения заказов из базы, поэтому подходит для пользователей
+    с любым числом заказов.
+
+    - **user_id**: ID пользователя (в учебных целях фиксированный)
+    - **format**: ndjson (заказ с позициями на строку) или csv (строка на позицию заказа)
+    """
+    if format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Неизвестный формат: {format}")
+    log.info(f"Запрос экспорта заказов для пользователя ID: {user_id} ({format})")
+
+    def stream():
+        # Своя сессия: ответ передается уже после выхода из обработчика
+        db = database.SessionLocal()
+        try:
+            yield from crud.export_orders(db, user_id, format)
+        except Exception as e:
+            log.error(f"Ошибка при экспорте заказов пользователя ID {user_id}: {e}")
+            raise
+        finally:
+            db.close()
+
+    headers = {"Content-Disposition": f'attachment; filename="orders-{user_id}.{format}"'}
+    return StreamingResponse(stream(), media_type=BULK_FORMATS[format], headers=headers)
+
+
 @router.get("/{order_id}", response_model=schemas.Order)
 def read_order(order_id: int, db: Session = Depends(database.get_db)):
     """
@@ -61,11 +143,12 @@ def read_order(order_id: int, db: Session = Depends(database.get_db)):
     try:
         log.info(f"Запрос заказа с ID: {order_id}")
         # В реальном приложении здесь должна быть проверка прав доступа
-        order = db.query(schemas.Order).filter(schemas.Order.id == order_id).first()
+        order = crud.get_order(db, order_id=order_id)
         if order is None:
-            log.warning(f"Заказ с ID {order_id} не найден")
             raise HTTPException(status_code=404, detail="Заказ не найден")
         return order
+    except HTTPException:
+        raise
     except Exception as e:
         log.error(f"Ошибка при получении заказа {order_id}: {e}")
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
\ No newline at end of file
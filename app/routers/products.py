@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from .. import crud, schemas, database
+from ..bulk import BULK_FORMATS, READERS, InvalidImport, bulk_format
+from ..cache import product_cache
 from ..logging_config import log
-from sqlalchemy import desc
+from ..pages import page_cache, page_response, prefers_html
+from ..pagination import InvalidCursor
+from ..replicas import get_read_db
 
 router = APIRouter(prefix="/products", tags=["products"])
 
@@ -28,7 +33,7 @@ def read_products(
         limit: int = 100,
         category: Optional[str] = None,
         sort: Optional[str] = None,
-        db: Session = Depends(database.get_db)
+        db: Session = Depends(get_read_db)
 ):
     """
     Получение списка товаров с возможностью фильтрации по категории и сортировки.
@@ -36,45 +41,148 @@ def read_products(
     try:
         log.info(f"Запрос списка товаров: skip={skip}, limit={limit}, category={category}, sort={sort}")
 
-        # Базовый запрос
-        query = db.query(models.Product)
+        content = crud.get_products_json(db, skip=skip, limit=limit, category=category, sort=sort)
+        return Response(content=content, media_type="application/json")
 
-        # Фильтрация по категории
-        if category:
-            query = query.filter(models.Product.category == category)
-            log.info(f"Фильтрация товаров по категории: {category}")
+    except Exception as e:
+        log.error(f"Ошибка при получении списка товаров: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
 
-        # Сортировка
-        if sort == "price":
-            query = query.order_by(models.Product.price)
-        elif sort == "price_desc":
-            query = query.order_by(desc(models.Product.price))
-        elif sort == "name":
-            query = query.order_by(models.Product.name)
-        else:
-            query = query.order_by(models.Product.id)
 
-        products = query.offset(skip).limit(limit).all()
-        log.info(f"Получено {len(products)} товаров")
-        return products
+@router.get("/page", response_model=schemas.ProductPage)
+def read_products_page(
+        limit: int = 100,
+        category: Optional[str] = None,
+        sort: Optional[str] = None,
+        cursor: Optional[str] = None,
+        skip: int = 0,
+        db: Session = Depends(database.get_db)
+):
+    """
+    Получение страницы товаров по курсору.
 
+    - **cursor**: Значение next_cursor из предыдущей страницы
+    - **skip**: Используется только без курсора (для обратной совместимости)
+    """
+    try:
+        log.info(f"Запрос страницы товаров: limit={limit}, category={category}, sort={sort}, cursor={cursor}")
+        products, next_cursor = crud.get_products_page(
+            db, limit=limit, category=category, sort=sort, cursor=cursor, skip=skip
+        )
+        return {"items": products, "next_cursor": next_cursor}
+
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        log.error(f"Ошибка при получении списка товаров: {e}")
+        log.error(f"Ошибка при получении страницы товаров: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.get("/search", response_model=schemas.ProductSearchResult)
+def search_products(
+        q: Optional[str] = None,
+        category: Optional[str] = None,
+        size: Optional[str] = None,
+        color: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 20,
+        db: Session = Depends(database.get_db)
+):
+    """
+    Поиск товаров по названию и описанию с фасетами.
+
+    - **q**: Слова запроса (ищутся по началу слова, должны встретиться все)
+    - **category**, **size**, **color**, **min_price**, **max_price**: Фильтры
+    - **sort**: relevance (по умолчанию при непустом q), id, price, price_desc, name
+    """
+    try:
+        log.info(f"Поиск товаров: q={q!r}, category={category}, size={size}, color={color}, "
+                 f"price={min_price}..{max_price}, sort={sort}")
+        content = crud.search_products_json(
+            db, q=q, category=category, size=size, color=color, min_price=min_price, max_price=max_price,
+            sort=sort, skip=skip, limit=limit
+        )
+        return Response(content=content, media_type="application/json")
+
+    except Exception as e:
+        log.error(f"Ошибка при поиске товаров: {e}")
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
 
 
+@router.post("/import", response_model=schemas.ImportReport)
+def import_products(
+        file: UploadFile = File(...),
+        format: Optional[str] = None,
+        db: Session = Depends(database.get_db)
+):
+    """
+    Массовый импорт товаров из CSV (с заголовком) или NDJSON.
+    Файл читается потоково, строки проверяются и записываются пачками; ошибочные строки
+    пропускаются и перечисляются в отчете.
+
+    - **format**: csv или ndjson (по умолчанию — по расширению файла или Content-Type)
+    """
+    try:
+        file_format = bulk_format(format, file.filename, file.content_type)
+        log.info(f"Импорт товаров из файла {file.filename} ({file_format})")
+        return crud.import_products(db, READERS[file_format](file.file))
+
+    except InvalidImport as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.error(f"Ошибка при импорте товаров из файла {file.filename}: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+@router.get("/export")
+def export_products(format: str = "csv"):
+    """
+    Экспорт всех товаров в CSV или NDJSON.
+    Ответ передается по мере чтения строк из базы, таблица в память целиком не загружается.
+    """
+    if format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Неизвестный формат: {format}")
+    log.info(f"Экспорт товаров ({format})")
+
+    def stream():
+        # Своя сессия: ответ передается уже после выхода из обработчика
+        db = database.SessionLocal()
+        try:
+            yield from crud.export_products(db, format)
+        except Exception as e:
+            log.error(f"Ошибка при экспорте товаров: {e}")
+            raise
+        finally:
+            db.close()
+
+    headers = {"Content-Disposition": f'attachment; filename="products.{format}"'}
+    return StreamingResponse(stream(), media_type=BULK_FORMATS[format], headers=headers)
+
+
 @router.get("/{product_id}", response_model=schemas.Product)
-def read_product(product_id: int, db: Session = Depends(database.get_db)):
+def read_product(product_id: int, request: Request, db: Session = Depends(get_read_db)):
     """
     Получение товара по ID.
+    Переход браузера (Accept: text/html) получает страницу товара, отрисованную на сервере
+    из кэша каталога; остальные клиенты — JSON.
     """
     try:
         log.info(f"Запрос товара с ID: {product_id}")
-        db_product = crud.get_product(db, product_id=product_id)
-        if db_product is None:
-            log.warning(f"Товар с ID {product_id} не найден")
+        key = product_cache.product_key(product_id)
+        if prefers_html(request):
+            page = page_cache.product_page(key, lambda: crud.get_product_json(db, product_id=product_id, key=key))
+            response = page_response(request, page)
+            response.headers["Vary"] = "Accept, Accept-Encoding"
+            return response
+        content = crud.get_product_json(db, product_id=product_id, key=key)
+        if content is None:
             raise HTTPException(status_code=404, detail="Товар не найден")
-        return db_product
+        return Response(content=content, media_type="application/json", headers={"Vary": "Accept"})
+    except HTTPException:
+        raise
     except Exception as e:
         log.error(f"Ошибка при получении товара {product_id}: {e}")
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
\ No newline at end of file
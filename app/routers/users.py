@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from .. import crud, schemas, database
 from ..logging_config import log
+from ..pagination import InvalidCursor
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -46,13 +47,37 @@ def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(database.g
     """
     try:
         log.info(f"Запрос списка пользователей: skip={skip}, limit={limit}")
-        users = crud.get_users(db, skip=skip, limit=limit)
-        return users
+        # Готовый JSON без повторной валидации; схема в OpenAPI по-прежнему из response_model
+        return Response(content=crud.get_users_json(db, skip=skip, limit=limit), media_type="application/json")
     except Exception as e:
         log.error(f"Ошибка при получении списка пользователей: {e}")
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
 
 
+@router.get("/page", response_model=schemas.UserPage)
+def read_users_page(
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        skip: int = 0,
+        db: Session = Depends(database.get_db)
+):
+    """
+    Получение страницы пользователей по курсору.
+
+    - **cursor**: Значение next_cursor из предыдущей страницы
+    - **skip**: Используется только без курсора (для обратной совместимости)
+    """
+    try:
+        log.info(f"Запрос страницы пользователей: limit={limit}, cursor={cursor}")
+        users, next_cursor = crud.get_users_page(db, limit=limit, cursor=cursor, skip=skip)
+        return {"items": users, "next_cursor": next_cursor}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.error(f"Ошибка при получении страницы пользователей: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
 @router.get("/{user_id}", response_model=schemas.User)
 def read_user(user_id: int, db: Session = Depends(database.get_db)):
     """
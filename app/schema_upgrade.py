@@ -0,0 +1,94 @@
+from typing import List
+
+from sqlalchemy import Column, inspect
+from sqlalchemy.engine import Connection, Dialect
+from sqlalchemy.sql.functions import FunctionElement
+
+from . import models
+from .logging_config import log
+
+# Обновление схемы базы, созданной прежними версиями приложения. create_all создает только недостающие
+# таблицы и не меняет существующие, поэтому изменения существующих таблиц применяются здесь: новая
+# структура order_product, недостающие столбцы и индексы (по моделям). Каждый шаг сначала проверяет
+# схему, поэтому обновление вызывается из database.create_tables при каждом запуске; вручную:
+#     python -m app.schema_upgrade
+
+
+def column_definition(column: Column, dialect: Dialect) -> str:
+    """
+    Определение столбца для ALTER TABLE ... ADD COLUMN по модели. SQLite не добавляет столбец
+    со значением по умолчанию из функции (CURRENT_TIMESTAMP): там оно опускается, и столбец
+    новых строк заполняет приложение или первое изменение строки.
+    """
+    definition = f"{column.name} {column.type.compile(dialect=dialect)}"
+    default = column.server_default.arg if column.server_default is not None else None
+    if isinstance(default, FunctionElement) and dialect.name == "sqlite":
+        default = None
+    if default is not None:
+        compiled = default if isinstance(default, str) else default.compile(dialect=dialect)
+        definition += f" DEFAULT {compiled}"
+    if not column.nullable:
+        if default is None:
+            raise RuntimeError(f"Столбец {column.table.name}.{column.name} нельзя добавить без значения по умолчанию")
+        definition += " NOT NULL"
+    return definition
+
+
+def rebuild_order_items(connection: Connection):
+    """
+    order_product прежней версии — таблица связи без id и цены. Она пересоздается как таблица
+    позиций заказов; цена покупки не сохранялась, поэтому unit_price берется из текущей цены товара.
+    """
+    connection.exec_driver_sql("ALTER TABLE order_product RENAME TO order_product_old")
+    models.OrderItem.__table__.create(connection)
+    copied = connection.exec_driver_sql(
+        "INSERT INTO order_product (order_id, product_id, quantity, unit_price) "
+        "SELECT old.order_id, old.product_id, old.quantity, products.price FROM order_product_old AS old "
+        "JOIN products ON products.id = old.product_id WHERE old.order_id IS NOT NULL"
+    ).rowcount
+    connection.exec_driver_sql("DROP TABLE order_product_old")
+    log.warning(f"Таблица order_product пересоздана: {copied} позиций, цена позиций взята из текущих цен товаров")
+
+
+def upgrade(connection: Connection) -> List[str]:
+    """Применение недостающих изменений схемы (после create_all); список выполненных шагов"""
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    steps = []
+
+    if "order_product" in tables and "id" not in {c["name"] for c in inspector.get_columns("order_product")}:
+        rebuild_order_items(connection)
+        steps.append("order_product")
+
+    # Столбцы, которых нет в существующих таблицах; info["backfill"] столбца заполняет прежние строки
+    inspector = inspect(connection)
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            definition = column_definition(column, connection.dialect)
+            connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {definition}")
+            if column.info.get("backfill"):
+                connection.exec_driver_sql(column.info["backfill"])
+            steps.append(f"{table.name}.{column.name}")
+
+    # Индексы существующих таблиц (в том числе только что добавленных столбцов)
+    inspector = inspect(connection)
+    for table in models.Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+                steps.append(index.name)
+
+    if steps:
+        log.info(f"Схема базы обновлена: {', '.join(steps)}")
+    return steps
+
+
+if __name__ == "__main__":
+    from .database import create_tables
+    create_tables()
@@ -45,6 +45,7 @@ class Product(ProductBase):
     """Схема товара для ответа"""
     id: int
     created_at: datetime
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -66,8 +67,18 @@ class OrderCreate(OrderBase):
     pass
 
 
+class OrderItem(OrderProduct):
+    """Схема позиции заказа для ответа (цена зафиксирована на момент покупки)"""
+    unit_price: float
+
+    class Config:
+        from_attributes = True
+
+
 class Order(OrderBase):
     """Схема заказа для ответа"""
+    # Позиции берутся из таблицы order_product, без обращения к текущим товарам
+    products: List[OrderItem] = Field(..., validation_alias="items")
     id: int
     user_id: int
     total_amount: float
@@ -79,6 +90,152 @@ class Order(OrderBase):
         from_attributes = True
 
 
+# Схемы серверной корзины
+class CartItemCreate(BaseModel):
+    """Схема добавления товара в корзину"""
+    product_id: int
+    quantity: int = Field(1, ge=1)
+
+
+class CartItemUpdate(BaseModel):
+    """Схема изменения количества товара в корзине (0 — удалить позицию)"""
+    quantity: int = Field(..., ge=0)
+
+
+class CartLine(BaseModel):
+    """Позиция корзины с текущими данными товара и результатом проверки"""
+    product_id: int
+    name: Optional[str] = None
+    quantity: int
+    # Цена при добавлении в корзину и текущая цена товара
+    unit_price: float
+    price: Optional[float] = None
+    stock_quantity: int = 0
+    # ok, price_changed, insufficient_stock или not_found
+    status: str
+
+
+class Cart(BaseModel):
+    """Корзина пользователя; valid — все позиции можно оформить по показанным ценам"""
+    user_id: int
+    items: List[CartLine]
+    total_items: int
+    total_amount: float
+    valid: bool
+
+
+class CategoryStats(BaseModel):
+    """Сводка по категории: число товаров, товаров в наличии и цены"""
+    category: str
+    product_count: int
+    in_stock_count: int
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    avg_price: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+
+# Схемы аналитики продаж
+class SalesPeriod(BaseModel):
+    """Продажи за день (YYYY-MM-DD) или час (YYYY-MM-DDTHH:00:00), UTC"""
+    period: str
+    orders: int
+    units: int
+    revenue: float
+
+
+class CategorySales(BaseModel):
+    """Продажи категории за период"""
+    category: str
+    units: int
+    revenue: float
+
+
+class TopProduct(BaseModel):
+    """Товар в рейтинге продаж за период"""
+    product_id: int
+    name: Optional[str] = None
+    category: str
+    orders: int
+    units: int
+    revenue: float
+
+
+class AnalyticsStatus(BaseModel):
+    """Состояние сводок продаж: последний учтенный заказ и число еще не учтенных"""
+    running: bool
+    last_order_id: int
+    pending_orders: int
+    updated_at: Optional[datetime] = None
+
+
+# Схемы страниц для пагинации по курсору
+class ProductPage(BaseModel):
+    """Страница товаров с курсором следующей страницы"""
+    items: List[Product]
+    next_cursor: Optional[str] = None
+
+
+class UserPage(BaseModel):
+    """Страница пользователей с курсором следующей страницы"""
+    items: List[User]
+    next_cursor: Optional[str] = None
+
+
+class OrderPage(BaseModel):
+    """Страница заказов с курсором следующей страницы"""
+    items: List[Order]
+    next_cursor: Optional[str] = None
+
+
+class FacetCount(BaseModel):
+    """Значение фасета и число подходящих товаров"""
+    value: str
+    count: int
+
+
+class PriceRange(BaseModel):
+    """Диапазон цен подходящих товаров"""
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+class ProductSearchFacets(BaseModel):
+    """Фасеты поиска: счетчики по категориям, размерам, цветам и диапазон цен"""
+    category: List[FacetCount]
+    size: List[FacetCount]
+    color: List[FacetCount]
+    price: PriceRange
+
+
+class ProductSearchResult(BaseModel):
+    """Результат поиска товаров"""
+    items: List[Product]
+    total: int
+    facets: ProductSearchFacets
+
+
+class ImportFieldError(BaseModel):
+    """Ошибка в поле строки импорта (field пустое, если строку не удалось разобрать)"""
+    field: Optional[str] = None
+    message: str
+
+
+class ImportRowError(BaseModel):
+    """Отклоненная строка импорта"""
+    line: int
+    errors: List[ImportFieldError]
+
+
+class ImportReport(BaseModel):
+    """Итог массового импорта: записано, отклонено и первые ошибки"""
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+
+
 # Схемы для аутентификации
 class Token(BaseModel):
     """Схема токена"""
@@ -0,0 +1,113 @@
+import os
+import re
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import column, func, literal_column, select, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import ColumnElement, Select
+
+from . import database, models
+from .logging_config import log
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Конфигурация текстового поиска PostgreSQL (стемминг и стоп-слова)
+SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "russian")
+# Из поискового запроса учитывается не больше стольких слов
+MAX_SEARCH_TERMS = 8
+
+
+def search_terms(query: Optional[str]) -> List[str]:
+    """Слова поискового запроса: только буквы и цифры, поэтому их можно безопасно подставлять в MATCH"""
+    return re.findall(r"\w+", (query or "").lower())[:MAX_SEARCH_TERMS]
+
+
+class SearchBackend:
+    """
+    Полнотекстовый поиск по названию и описанию товара.
+    Каждое слово запроса ищется как префикс, все слова должны встретиться (И).
+    """
+
+    def create_index(self, connection: Connection):
+        """Создание индекса поиска; вызывается при каждом запуске и должно быть идемпотентным"""
+        raise NotImplementedError
+
+    def apply(self, query: Select, terms: List[str]) -> Tuple[Select, ColumnElement]:
+        """Ограничить запрос найденными товарами; возвращает запрос и релевантность (меньше — лучше)"""
+        raise NotImplementedError
+
+
+class SQLiteSearch(SearchBackend):
+    """FTS5-таблица с внешним содержимым: хранит только индекс, строки берутся из products"""
+
+    fts = table("products_fts", column("rowid"), column("rank"))
+
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+        "name, description, content='products', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN "
+        "INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN "
+        "INSERT INTO products_fts(products_fts, rowid, name, description) "
+        "VALUES ('delete', old.id, old.name, old.description); END",
+        # Только при изменении текстовых полей: списание остатка при заказе индекс не трогает
+        "CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, description ON products BEGIN "
+        "INSERT INTO products_fts(products_fts, rowid, name, description) "
+        "VALUES ('delete', old.id, old.name, old.description); "
+        "INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    ]
+
+    def create_index(self, connection: Connection):
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'")).first()
+        for statement in self.statements:
+            connection.exec_driver_sql(statement)
+        if not exists:
+            # Индекс для уже существующих товаров
+            connection.exec_driver_sql("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+            log.info("Создан полнотекстовый индекс товаров (FTS5)")
+
+    def apply(self, query: Select, terms: List[str]) -> Tuple[Select, ColumnElement]:
+        expression = " ".join(f'"{term}"*' for term in terms)
+        matches = (
+            select(self.fts.c.rowid, self.fts.c.rank)
+            .where(literal_column("products_fts").op("MATCH")(expression))
+            .subquery("matches")
+        )
+        return query.join(matches, matches.c.rowid == models.Product.id), matches.c.rank
+
+
+class PostgresSearch(SearchBackend):
+    """tsvector по названию и описанию с GIN-индексом по тому же выражению"""
+
+    def __init__(self, language: str = SEARCH_LANGUAGE):
+        self.language = language
+        # Выражение задано текстом: индекс используется, только если запрос совпадает с ним дословно
+        self.vector_sql = (
+            f"to_tsvector('{language}'::regconfig, "
+            f"coalesce(products.name, '') || ' ' || coalesce(products.description, ''))"
+        )
+
+    def create_index(self, connection: Connection):
+        expression = self.vector_sql.replace("products.", "")
+        connection.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS ix_products_search ON products USING gin (({expression}))"
+        )
+
+    def apply(self, query: Select, terms: List[str]) -> Tuple[Select, ColumnElement]:
+        vector = literal_column(self.vector_sql)
+        tsquery = func.to_tsquery(literal_column(f"'{self.language}'::regconfig"),
+                                  " & ".join(f"{term}:*" for term in terms))
+        return query.where(vector.op("@@")(tsquery)), -func.ts_rank(vector, tsquery)
+
+
+def backend_for(dialect_name: str) -> SearchBackend:
+    if dialect_name == "postgresql":
+        return PostgresSearch()
+    if dialect_name == "sqlite":
+        return SQLiteSearch()
+    raise ValueError(f"Полнотекстовый поиск не поддерживается для {dialect_name}")
+
+
+search_backend = backend_for(database.engine.dialect.name)
@@ -0,0 +1,62 @@
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, List, Sequence
+
+from . import models, schemas
+
+try:
+    import orjson
+except ImportError:  # Без orjson используется стандартный json (медленнее, но результат тот же)
+    orjson = None
+
+
+# Быстрая сериализация списков: столбцы выбираются кортежами и кодируются сразу в JSON,
+# минуя создание ORM-объектов и Pydantic-моделей. Порядок и набор полей берутся
+# из схем ответа, поэтому JSON совпадает с тем, что выдал бы response_model.
+PRODUCT_FIELDS = list(schemas.Product.model_fields)
+USER_FIELDS = list(schemas.User.model_fields)
+ORDER_FIELDS = [name for name in schemas.Order.model_fields if name != "products"]
+ORDER_ITEM_FIELDS = list(schemas.OrderItem.model_fields)
+
+PRODUCT_COLUMNS = [getattr(models.Product, name) for name in PRODUCT_FIELDS]
+USER_COLUMNS = [getattr(models.User, name) for name in USER_FIELDS]
+ORDER_COLUMNS = [getattr(models.Order, name) for name in ORDER_FIELDS]
+ORDER_ITEM_COLUMNS = [models.OrderItem.order_id] + [getattr(models.OrderItem, name) for name in ORDER_ITEM_FIELDS]
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat().replace("+00:00", "Z")
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def dumps(data: Any) -> bytes:
+    """JSON в байтах; даты в UTC выводятся с суффиксом Z, как в Pydantic"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_UTC_Z)
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def rows_to_dicts(rows: Iterable[Sequence], fields: List[str]) -> List[dict]:
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def rows_json(rows: Iterable[Sequence], fields: List[str]) -> bytes:
+    """Список строк-кортежей в JSON-массив объектов"""
+    return dumps(rows_to_dicts(rows, fields))
+
+
+def orders_to_dicts(order_rows: Iterable[Sequence], item_rows: Iterable[Sequence]) -> List[dict]:
+    """
+    Заказы и их позиции (выбранные одним запросом по IN) в структуру schemas.Order.
+    Первый столбец позиции — order_id, по нему позиции раскладываются по заказам.
+    """
+    orders = {}
+    for row in order_rows:
+        order = dict(zip(ORDER_FIELDS, row))
+        order["products"] = []
+        orders[order["id"]] = order
+    for order_id, *values in item_rows:
+        orders[order_id]["products"].append(dict(zip(ORDER_ITEM_FIELDS, values)))
+    # Поля в порядке схемы: products идет первым, как в OrderBase
+    return [{"products": order.pop("products"), **order} for order in orders.values()]
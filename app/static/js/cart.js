@@ -1,4 +1,11 @@
-// Функции для работы с корзиной
+// Функции для работы с корзиной (позиции хранятся на сервере, см. cartRequest в main.js)
+
+// Подписи к позициям, которые нельзя оформить как есть
+const CART_LINE_PROBLEMS = {
+    price_changed: 'Цена изменилась',
+    insufficient_stock: 'Недостаточно товара на складе',
+    not_found: 'Товар больше не продается'
+};
 
 // Загрузка корзины
 function loadCart() {
@@ -17,75 +24,77 @@ function loadCart() {
 
     // Отображение товаров в корзине
     if (itemsElement) {
-        itemsElement.innerHTML = cart.map(item => `
+        itemsElement.innerHTML = cart.map(item => {
+            const price = item.price ?? item.unit_price;
+            const problem = CART_LINE_PROBLEMS[item.status];
+            return `
             <div class="cart-item">
-                <img src="${item.image}" alt="${item.name}">
+                <img src="/static/images/placeholder.jpg" alt="${item.name || ''}">
                 <div class="cart-item-info">
-                    <h4>${item.name}</h4>
-                    <p class="price">${item.price} руб. × ${item.quantity}</p>
-                    <p class="total">${item.price * item.quantity} руб.</p>
+                    <h4>${item.name || 'Товар ' + item.product_id}</h4>
+                    <p class="price">${price} руб. × ${item.quantity}</p>
+                    <p class="total">${price * item.quantity} руб.</p>
+                    ${problem ? `<p class="error">${problem}${item.status === 'price_changed' ? ` (было ${item.unit_price} руб.)` : ''}</p>` : ''}
                 </div>
                 <div class="cart-item-actions">
                     <div class="quantity-control">
-                        <button class="quantity-btn" onclick="updateQuantity(${item.id}, -1)">-</button>
+                        <button class="quantity-btn" onclick="updateQuantity(${item.product_id}, -1)">-</button>
                         <span>${item.quantity}</span>
-                        <button class="quantity-btn" onclick="updateQuantity(${item.id}, 1)">+</button>
+                        <button class="quantity-btn" onclick="updateQuantity(${item.product_id}, 1)">+</button>
                     </div>
-                    <button class="btn btn-outline" onclick="removeFromCart(${item.id})">
+                    <button class="btn btn-outline" onclick="removeFromCart(${item.product_id})">
                         <i class="fas fa-trash"></i>
                     </button>
                 </div>
             </div>
-        `).join('');
+        `;
+        }).join('');
     }
 
     updateCartSummary();
 }
 
-// Обновление количества товара
+// Обновление количества товара; остаток проверяет сервер
 window.updateQuantity = function(productId, change) {
-    const item = cart.find(item => item.id === productId);
+    const item = cart.find(item => item.product_id === productId);
     if (!item) return;
 
-    // Проверка наличия на складе
-    fetch(`/api/products/${productId}`)
-        .then(response => response.json())
-        .then(product => {
-            const newQuantity = item.quantity + change;
-
-            if (newQuantity < 1) {
-                removeFromCart(productId);
-                return;
-            }
-
-            if (newQuantity > product.stock_quantity) {
-                showNotification('Недостаточно товара на складе', 'error');
-                return;
-            }
+    const newQuantity = item.quantity + change;
+    if (newQuantity < 1) {
+        removeFromCart(productId);
+        return;
+    }
 
-            item.quantity = newQuantity;
-            saveCart();
+    cartRequest(`/items/${productId}`, {method: 'PUT', body: JSON.stringify({quantity: newQuantity})})
+        .then(serverCart => {
+            setCart(serverCart);
             loadCart();
             showNotification('Корзина обновлена');
         })
         .catch(error => {
-            console.error('Ошибка проверки наличия:', error);
-            showNotification('Ошибка обновления корзины', 'error');
+            console.error('Ошибка обновления корзины:', error);
+            showNotification(error.message || 'Ошибка обновления корзины', 'error');
         });
 };
 
 // Удаление товара из корзины
 window.removeFromCart = function(productId) {
-    cart = cart.filter(item => item.id !== productId);
-    saveCart();
-    loadCart();
-    showNotification('Товар удален из корзины');
+    cartRequest(`/items/${productId}`, {method: 'DELETE'})
+        .then(serverCart => {
+            setCart(serverCart);
+            loadCart();
+            showNotification('Товар удален из корзины');
+        })
+        .catch(error => {
+            console.error('Ошибка удаления из корзины:', error);
+            showNotification('Ошибка удаления товара', 'error');
+        });
 };
 
 // Обновление итоговой суммы
 function updateCartSummary() {
     const totalItems = cart.reduce((total, item) => total + item.quantity, 0);
-    const totalAmount = cart.reduce((total, item) => total + (item.price * item.quantity), 0);
+    const totalAmount = cart.reduce((total, item) => total + ((item.price ?? item.unit_price) * item.quantity), 0);
 
     const totalItemsElement = document.getElementById('total-items');
     const totalAmountElement = document.getElementById('total-amount');
@@ -94,49 +103,40 @@ function updateCartSummary() {
     if (totalAmountElement) totalAmountElement.textContent = `${totalAmount} руб.`;
 }
 
-// Создание заказа
+// Создание заказа: проверка всей корзины одним запросом, затем оформление в одной транзакции
 window.createOrder = function() {
     if (cart.length === 0) {
         showNotification('Корзина пуста', 'error');
         return;
     }
 
-    const orderData = {
-        products: cart.map(item => ({
-            product_id: item.id,
-            quantity: item.quantity
-        }))
-    };
-
-    // В учебных целях используем фиксированный user_id
-    fetch('/api/orders/?user_id=1', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify(orderData)
-    })
-    .then(response => {
-        if (!response.ok) {
-            return response.json().then(err => { throw new Error(err.detail); });
-        }
-        return response.json();
-    })
-    .then(order => {
-        // Очистка корзины после успешного заказа
-        cart = [];
-        saveCart();
-        loadCart();
-
-        showNotification('Заказ успешно создан!');
-
-        // Перенаправление на страницу заказов
-        setTimeout(() => {
-            window.location.href = '/orders';
-        }, 2000);
-    })
-    .catch(error => {
-        console.error('Ошибка создания заказа:', error);
-        showNotification(error.message || 'Ошибка создания заказа', 'error');
-    });
-};
\ No newline at end of file
+    cartRequest('/validate', {method: 'POST'})
+        .then(serverCart => {
+            setCart(serverCart);
+            if (!serverCart.valid) {
+                // Изменившиеся цены уже зафиксированы: повторное нажатие оформит заказ по ним
+                loadCart();
+                throw new Error('Корзина изменилась, проверьте позиции');
+            }
+            return cartRequest('/checkout', {method: 'POST'});
+        })
+        .then(order => {
+            setCart({items: []});
+            loadCart();
+
+            showNotification('Заказ успешно создан!');
+
+            // Перенаправление на страницу заказов
+            setTimeout(() => {
+                window.location.href = '/orders';
+            }, 2000);
+        })
+        .catch(error => {
+            if (error.cart) {
+                setCart(error.cart);
+                loadCart();
+            }
+            console.error('Ошибка создания заказа:', error);
+            showNotification(error.message || 'Ошибка создания заказа', 'error');
+        });
+};
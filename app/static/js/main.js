@@ -1,12 +1,50 @@
 // Основные функции приложения
 
-// Глобальная корзина
-var cart = JSON.parse(localStorage.getItem('cart')) || [];
+// Глобальная корзина: позиции хранятся на сервере, здесь — последний ответ /api/cart
+// В учебных целях используем фиксированный user_id
+const CART_URL = '/api/cart';
+const CART_USER = 'user_id=1';
+var cart = [];
+// Промис первой загрузки корзины (страница корзины отрисовывается после него)
+var cartLoaded = Promise.resolve();
+
+// Запрос к API корзины; ответ — актуальная корзина
+function cartRequest(path, options = {}) {
+    return fetch(`${CART_URL}${path}?${CART_USER}`, {
+        headers: {'Content-Type': 'application/json'},
+        ...options
+    }).then(response => {
+        if (!response.ok) {
+            return response.json().then(err => {
+                // 409 при оформлении: в detail актуальная корзина
+                const error = new Error(typeof err.detail === 'string' ? err.detail : 'Корзина изменилась');
+                error.cart = typeof err.detail === 'object' ? err.detail : null;
+                throw error;
+            });
+        }
+        return response.status === 204 ? {items: []} : response.json();
+    });
+}
 
-// Сохранение корзины в localStorage
-function saveCart() {
-    localStorage.setItem('cart', JSON.stringify(cart));
+// Сохранение ответа сервера
+function setCart(serverCart) {
+    cart = serverCart.items;
     updateCartCount();
+    return serverCart;
+}
+
+// Загрузка корзины с сервера; корзина из localStorage (старая версия) переносится один раз
+function fetchCart() {
+    const legacy = JSON.parse(localStorage.getItem('cart')) || [];
+    localStorage.removeItem('cart');
+    const migrate = legacy.reduce(
+        (chain, item) => chain.then(() => cartRequest('/items', {
+            method: 'POST',
+            body: JSON.stringify({product_id: item.id, quantity: item.quantity})
+        }).catch(() => null)),
+        Promise.resolve()
+    );
+    return migrate.then(() => cartRequest('')).then(setCart);
 }
 
 // Обновление счетчика корзины
@@ -18,48 +56,18 @@ function updateCartCount() {
     }
 }
 
-// Добавление товара в корзину (глобальная функция)
+// Добавление товара в корзину (глобальная функция); остаток проверяет сервер
 function addToCart(productId) {
     console.log('Добавление в корзину товара ID:', productId);
 
-    fetch(`/api/products/${productId}`)
-        .then(response => {
-            if (!response.ok) {
-                throw new Error('Товар не найден');
-            }
-            return response.json();
-        })
-        .then(product => {
-            const existingItem = cart.find(item => item.id === product.id);
-
-            if (existingItem) {
-                if (existingItem.quantity >= product.stock_quantity) {
-                    showNotification('Недостаточно товара на складе', 'error');
-                    return;
-                }
-                existingItem.quantity++;
-                console.log('Увеличено количество товара:', existingItem);
-            } else {
-                if (product.stock_quantity < 1) {
-                    showNotification('Товара нет в наличии', 'error');
-                    return;
-                }
-                cart.push({
-                    id: product.id,
-                    name: product.name,
-                    price: product.price,
-                    quantity: 1,
-                    image: '/static/images/placeholder.jpg'
-                });
-                console.log('Добавлен новый товар:', product.name);
-            }
-
-            saveCart();
+    cartRequest('/items', {method: 'POST', body: JSON.stringify({product_id: productId, quantity: 1})})
+        .then(serverCart => {
+            setCart(serverCart);
             showNotification('Товар добавлен в корзину');
         })
         .catch(error => {
             console.error('Ошибка добавления в корзину:', error);
-            showNotification('Ошибка добавления товара', 'error');
+            showNotification(error.message || 'Ошибка добавления товара', 'error');
         });
 }
 
@@ -108,7 +116,6 @@ document.head.appendChild(style);
 // Функция для отладки - просмотр содержимого корзины
 function debugCart() {
     console.log('Содержимое корзины:', cart);
-    console.log('LocalStorage cart:', localStorage.getItem('cart'));
     alert('Содержимое корзины выведено в консоль (F12)');
 }
 
@@ -135,8 +142,8 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-    // Обновление счетчика корзины при загрузке
-    updateCartCount();
+    // Загрузка корзины и счетчика при загрузке страницы
+    cartLoaded = fetchCart().catch(error => console.error('Ошибка загрузки корзины:', error));
 });
 
 // Базовая обработка ошибок fetch
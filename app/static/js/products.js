@@ -1,41 +1,5 @@
 // Функции для работы с товарами
 
-// Добавление товара в корзину
-function addToCart(productId) {
-    fetch(`/api/products/${productId}`)
-        .then(response => response.json())
-        .then(product => {
-            const existingItem = cart.find(item => item.id === product.id);
-
-            if (existingItem) {
-                if (existingItem.quantity >= product.stock_quantity) {
-                    showNotification('Недостаточно товара на складе', 'error');
-                    return;
-                }
-                existingItem.quantity++;
-            } else {
-                if (product.stock_quantity < 1) {
-                    showNotification('Товара нет в наличии', 'error');
-                    return;
-                }
-                cart.push({
-                    id: product.id,
-                    name: product.name,
-                    price: product.price,
-                    quantity: 1,
-                    image: '/static/images/placeholder.jpg'
-                });
-            }
-
-            saveCart();
-            showNotification('Товар добавлен в корзину');
-        })
-        .catch(error => {
-            console.error('Ошибка добавления в корзину:', error);
-            showNotification('Ошибка добавления товара', 'error');
-        });
-}
-
 // Загрузка товаров по категории
 function loadProductsByCategory(category) {
     let url = '/api/products?limit=100';
@@ -54,17 +18,12 @@ function loadProductsByCategory(category) {
         });
 }
 
-// Поиск товаров
+// Поиск товаров (на сервере, по названию и описанию)
 function searchProducts(query) {
-    fetch('/api/products?limit=100')
+    fetch(`/api/products/search?q=${encodeURIComponent(query)}&limit=100`)
         .then(response => response.json())
-        .then(products => {
-            const filtered = products.filter(product =>
-                product.name.toLowerCase().includes(query.toLowerCase()) ||
-                product.description.toLowerCase().includes(query.toLowerCase()) ||
-                product.category.toLowerCase().includes(query.toLowerCase())
-            );
-            displayProducts(filtered);
+        .then(result => {
+            displayProducts(result.items);
         })
         .catch(error => {
             console.error('Ошибка поиска товаров:', error);
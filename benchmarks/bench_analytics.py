@@ -0,0 +1,96 @@
+"""
+Аналитика продаж: запросы по сводкам против разовых запросов по заказам.
+
+Синтетическая история генерируется benchmarks.data: --orders заказов за --days дней по --products
+товарам, затем сводки заполняются тем же SalesRollup, что работает в приложении.
+Для выручки по дням, продаж по категориям и самых продаваемых товаров за последние 30 дней
+выводится медиана времени: разовый запрос orders ⨝ order_product ⨝ products и ответ из сводок.
+
+Запуск:
+    python -m benchmarks.bench_analytics --orders 1000000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+_work_dir = tempfile.mkdtemp(prefix="bench_analytics_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_work_dir, 'bench.db')}"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from app import analytics, database, models
+from benchmarks import data
+
+
+def adhoc_queries(start: datetime):
+    """Запросы, которые пришлось бы выполнять без сводок"""
+    lines = (
+        select(models.Order.created_at, models.OrderItem.product_id, models.Product.category,
+               models.OrderItem.quantity, models.OrderItem.unit_price)
+        .join(models.OrderItem, models.OrderItem.order_id == models.Order.id)
+        .join(models.Product, models.Product.id == models.OrderItem.product_id)
+        .where(models.Order.created_at >= start)
+        .subquery()
+    )
+    revenue = lines.c.quantity * lines.c.unit_price
+    return {
+        "выручка по дням": select(func.date(lines.c.created_at), func.sum(revenue))
+        .group_by(func.date(lines.c.created_at)),
+        "по категориям": select(lines.c.category, func.sum(lines.c.quantity), func.sum(revenue))
+        .group_by(lines.c.category),
+        "топ-10 товаров": select(lines.c.product_id, func.sum(revenue))
+        .group_by(lines.c.product_id).order_by(func.sum(revenue).desc()).limit(10),
+    }
+
+
+def median_ms(run, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5, help="повторов каждого запроса")
+    args = parser.parse_args()
+
+    database.create_tables()
+    started = time.perf_counter()
+    data.generate(args.users, args.products, args.orders, args.days)
+    print(f"сгенерировано заказов: {args.orders} за {time.perf_counter() - started:.1f} с")
+
+    started = time.perf_counter()
+    processed = analytics.SalesRollup(batch_size=20_000).catch_up()
+    elapsed = time.perf_counter() - started
+    print(f"сводки заполнены: {processed} заказов за {elapsed:.1f} с ({processed / elapsed:.0f} заказов/с)")
+
+    start_date, end_date = analytics.period(None, None)
+    start = datetime.combine(start_date, datetime.min.time())
+    rollup_queries = {
+        "выручка по дням": lambda db: analytics.get_revenue(db, start_date, end_date),
+        "по категориям": lambda db: analytics.get_category_sales(db, start_date, end_date),
+        "топ-10 товаров": lambda db: analytics.get_top_products(db, start_date, end_date),
+    }
+    print(f"\nпериод: {start_date}..{end_date}")
+    print(f"{'запрос':<16} {'по заказам, мс':>15} {'по сводкам, мс':>15}")
+    with database.SessionLocal() as db:
+        for name, query in adhoc_queries(start).items():
+            adhoc = median_ms(lambda: db.execute(query).all(), args.repeat)
+            rollup = median_ms(lambda: rollup_queries[name](db), args.repeat)
+            print(f"{name:<16} {adhoc:>15.1f} {rollup:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Нагрузочный бенчмарк /api/products: смешанный трафик до и после перехода на асинхронный слой БД.
+
+"До" воспроизводит прежний обработчик: async def с синхронным db.query(...),
+который блокирует цикл событий на время SQL-запроса. "После" — текущий
+get_products_api на AsyncSession. Параллельно с запросами каталога идут
+проверки /api/health, по задержке которых видно блокировку воркера.
+Кэш каталога в процессе сервера отключен: иначе "после" измерял бы попадания в кэш,
+а не запросы через асинхронный слой БД.
+
+Сервер запускается отдельным процессом uvicorn: клиент в том же цикле событий
+не заметил бы блокировку, так как сам стоял бы вместе с обработчиком.
+
+Запуск:
+    python -m benchmarks.bench_async_products --products 50000 --requests 400 --rate 40
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Процесс сервера получает адрес базы от родительского процесса через окружение
+if "BENCH_DATABASE_URL" not in os.environ:
+    _db_dir = tempfile.mkdtemp(prefix="bench_async_products_")
+    os.environ["BENCH_DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+
+from typing import List
+
+import httpx
+from sqlalchemy import insert
+
+from app import database, models, schemas
+from app.cache import MemoryBackend, product_cache
+from app.main import app
+
+CATEGORIES = ["Футболки", "Джинсы", "Куртки", "Платья", "Рубашки", "Свитеры"]
+
+
+class UncachedBackend(MemoryBackend):
+    """Хранилище, в котором ничего не сохраняется: каждый запрос каталога идет в БД"""
+
+    def get(self, key: str):
+        return None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        pass
+
+
+product_cache.backend = UncachedBackend()
+
+
+@app.get("/bench/legacy/products", response_model=List[schemas.Product], include_in_schema=False)
+async def legacy_products_api(category: str = None, limit: int = 100):
+    """Прежняя реализация: синхронный запрос внутри async def"""
+    with database.SessionLocal() as db:
+        query = db.query(models.Product)
+        if category:
+            query = query.filter(models.Product.category == category)
+        return query.order_by(models.Product.price).limit(limit).all()
+
+
+def seed(count: int):
+    """Заполнение каталога товарами одним пакетным INSERT"""
+    database.create_tables()
+    rng = random.Random(42)
+    rows = [
+        {
+            "name": f"Товар {i}",
+            "description": "Описание товара для бенчмарка",
+            "price": round(rng.uniform(100, 10000), 2),
+            "category": rng.choice(CATEGORIES),
+            "size": rng.choice(["S", "M", "L", "XL"]),
+            "color": rng.choice(["Белый", "Черный", "Синий"]),
+            "stock_quantity": rng.randint(0, 100),
+        }
+        for i in range(count)
+    ]
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.Product), rows)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def start_server(port: int) -> subprocess.Popen:
+    """Запуск uvicorn с этим модулем в отдельном процессе"""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.bench_async_products:app",
+         "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/health").raise_for_status()
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Сервер бенчмарка не запустился")
+
+
+async def run_mixed(base_url: str, products_path: str, total: int, rate: float):
+    """
+    Смешанный трафик с фиксированной частотой поступления запросов:
+    половина запросов к каталогу, половина к /api/health.
+    """
+    latencies = {"catalog": [], "health": []}
+    rng = random.Random(7)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def send(kind: str):
+            url = products_path if kind == "catalog" else "/api/health"
+            params = {"category": rng.choice(CATEGORIES), "sort": "price"} if kind == "catalog" else None
+            started = time.perf_counter()
+            response = await client.get(url, params=params)
+            latencies[kind].append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+        started = time.perf_counter()
+        tasks = []
+        for i in range(total):
+            delay = started + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send("catalog" if i % 2 == 0 else "health")))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    return latencies, total / elapsed
+
+
+def report(title, latencies, rps):
+    print(f"\n{title}: {rps:.0f} req/s")
+    for kind, values in latencies.items():
+        print(
+            f"  {kind:<8} p50={statistics.median(values):7.1f} ms  "
+            f"p99={percentile(values, 99):7.1f} ms  max={max(values):7.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--rate", type=float, default=40)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    seed(args.products)
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(args.port)
+    try:
+        before = asyncio.run(run_mixed(base_url, "/bench/legacy/products", args.requests, args.rate))
+        after = asyncio.run(run_mixed(base_url, "/api/products", args.requests, args.rate))
+    finally:
+        server.terminate()
+        server.wait()
+
+    report("До (sync Session в async def)", *before)
+    report("После (AsyncSession)", *after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Массовый импорт и экспорт товаров (по умолчанию 200 000 строк).
+
+Сравнивается импорт через crud.import_products (проверка пачкой + executemany/COPY,
+транзакция на пачку) с созданием товаров по одному через crud.create_product: построчный
+вариант прогоняется на выборке (--sample) и пересчитывается на весь файл.
+Для экспорта выводится скорость и пик памяти Python (tracemalloc) при чтении всего потока.
+
+Запуск:
+    python -m benchmarks.bench_bulk_import --rows 200000 --sample 2000
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+_db_dir = tempfile.mkdtemp(prefix="bench_bulk_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from app import crud, database, models, schemas
+from app.bulk import PRODUCT_IMPORT_FIELDS, read_csv
+
+CATEGORIES = ["Футболки", "Джинсы", "Куртки", "Платья", "Рубашки", "Свитеры", "Брюки", "Юбки", "Шорты", "Пальто"]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+COLORS = ["Белый", "Черный", "Синий", "Красный", "Серый", "Зеленый"]
+
+
+def generate_csv(rows: int, invalid_share: float) -> bytes:
+    """CSV для импорта; доля строк с отрицательной ценой попадает в отчет об ошибках"""
+    rng = random.Random(42)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PRODUCT_IMPORT_FIELDS)
+    for i in range(rows):
+        price = -1 if rng.random() < invalid_share else round(rng.uniform(300, 30000), 2)
+        writer.writerow([
+            f"{rng.choice(CATEGORIES)} {i}", f"Описание товара {i}, артикул {rng.randint(1, 10 ** 6)}", price,
+            rng.choice(CATEGORIES), rng.choice(SIZES), rng.choice(COLORS), rng.randint(0, 100),
+        ])
+    return buffer.getvalue().encode()
+
+
+def clear_products():
+    with database.engine.begin() as conn:
+        conn.execute(models.Product.__table__.delete())
+
+
+def per_row_import(content: bytes, sample: int) -> float:
+    """Построчный импорт первых sample строк через crud.create_product, секунд на строку"""
+    records = read_csv(io.BytesIO(content))
+    with database.SessionLocal() as db:
+        started = time.perf_counter()
+        done = 0
+        for _, record, _ in records:
+            try:
+                product = schemas.ProductCreate(**record)
+            except ValueError:
+                continue
+            crud.create_product(db, product)
+            done += 1
+            if done == sample:
+                break
+        return (time.perf_counter() - started) / done
+
+
+def bulk_import(content: bytes) -> tuple:
+    with database.SessionLocal() as db:
+        started = time.perf_counter()
+        report = crud.import_products(db, read_csv(io.BytesIO(content)))
+        return time.perf_counter() - started, report
+
+
+def export(format: str) -> tuple:
+    with database.SessionLocal() as db:
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in crud.export_products(db, format))
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return elapsed, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--sample", type=int, default=2000, help="строк для построчного импорта")
+    parser.add_argument("--invalid", type=float, default=0.01, help="доля строк с ошибками")
+    args = parser.parse_args()
+
+    try:
+        run(args)
+    finally:
+        database.engine.dispose()
+        shutil.rmtree(_db_dir, ignore_errors=True)
+
+
+def run(args):
+    database.create_tables()
+    content = generate_csv(args.rows, args.invalid)
+    print(f"Файл: {args.rows} строк, {len(content) / 2 ** 20:.1f} МБ")
+
+    per_row = per_row_import(content, args.sample)
+    clear_products()
+    elapsed, report = bulk_import(content)
+
+    print(f"{'способ':<28} {'строк/с':>10} {'время, с':>10}")
+    print(f"{'create_product по одному*':<28} {1 / per_row:>10.0f} {per_row * args.rows:>10.1f}")
+    print(f"{'import_products':<28} {report['imported'] / elapsed:>10.0f} {elapsed:>10.1f}")
+    print(f"* пересчитано по первым {args.sample} строкам")
+    print(f"Записано {report['imported']}, отклонено {report['failed']}, "
+          f"ускорение x{per_row * args.rows / elapsed:.1f}")
+
+    print(f"\n{'экспорт':<8} {'строк/с':>10} {'МБ':>8} {'пик памяти, МБ':>15}")
+    for format in ("csv", "ndjson"):
+        elapsed, size, peak = export(format)
+        print(f"{format:<8} {report['imported'] / elapsed:>10.0f} {size / 2 ** 20:>8.1f} {peak / 2 ** 20:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
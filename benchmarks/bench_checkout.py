@@ -0,0 +1,92 @@
+"""
+Время оформления заказа с фоновой очередью и без нее.
+
+Обработчик order_created дополнен задержкой --job-ms (имитация письма покупателю или запроса
+к внешней системе). Без очереди событие outbox обрабатывается в том же запросе, и ответ ждет
+обработчик; с очередью запрос возвращается после commit заказа и события, а обработчик
+выполняется воркером. Выводятся p50/p95 времени ответа POST /orders/ и время, за которое
+очередь разбирает все события после последнего запроса.
+
+Запуск:
+    python -m benchmarks.bench_checkout --orders 200 --job-ms 20
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+_work_dir = tempfile.mkdtemp(prefix="bench_checkout_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_work_dir, 'bench.db')}"
+os.environ["STATIC_BUILD_DIR"] = os.path.join(_work_dir, "static")
+# Очередь запускается и останавливается явно для каждого варианта
+os.environ["JOBS_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, insert, select
+
+from app import database, jobs, models
+from app.main import app
+
+
+def percentile(values, q: float) -> float:
+    return statistics.quantiles(values, n=100)[int(q) - 1] if len(values) > 1 else values[0]
+
+
+def checkout(client, orders: int, product_id: int):
+    latencies = []
+    for _ in range(orders):
+        started = time.perf_counter()
+        response = client.post("/orders/", params={"user_id": 1},
+                               json={"products": [{"product_id": product_id, "quantity": 1}]})
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return latencies
+
+
+def pending_events() -> int:
+    with database.SessionLocal() as db:
+        return db.execute(select(func.count()).select_from(models.OutboxEvent)).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--job-ms", type=float, default=20.0, help="длительность обработчика order_created")
+    args = parser.parse_args()
+
+    confirm_order = jobs.handlers["order_created"]
+
+    def slow_confirmation(payload):
+        time.sleep(args.job_ms / 1000)
+        confirm_order(payload)
+
+    jobs.handlers["order_created"] = slow_confirmation
+
+    with TestClient(app) as client:
+        with database.engine.begin() as conn:
+            conn.execute(insert(models.User), [{"email": "buyer@example.com", "first_name": "Иван",
+                                                "last_name": "Иванов", "hashed_password": "x"}])
+            conn.execute(insert(models.Product), [{"name": "Товар", "price": 1000.0, "category": "Футболки",
+                                                   "size": "M", "color": "Белый", "stock_quantity": 10 ** 6}])
+        checkout(client, 10, 1)  # прогрев
+
+        print(f"обработчик: {args.job_ms:.0f} мс, заказов: {args.orders}, воркеров: {jobs.queue.workers}")
+        print(f"{'вариант':<16} {'p50, мс':>9} {'p95, мс':>9} {'макс, мс':>9} {'разбор очереди, с':>18}")
+        for name, background in (("без очереди", False), ("с очередью", True)):
+            if background:
+                client.portal.call(jobs.queue.start)
+            latencies = checkout(client, args.orders, 1)
+            started = time.perf_counter()
+            while pending_events():
+                time.sleep(0.01)
+            drained = time.perf_counter() - started
+            if background:
+                client.portal.call(jobs.queue.stop)
+            print(f"{name:<16} {percentile(latencies, 50):>9.1f} {percentile(latencies, 95):>9.1f} "
+                  f"{max(latencies):>9.1f} {drained:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Бенчмарк пагинации каталога: OFFSET против курсора (keyset) на большом каталоге.
+
+Для каждой сортировки (id, price, price_desc, name) измеряется время выборки
+страницы на разной глубине через OFFSET и через курсор, а затем полный
+проход по всему каталогу курсором.
+
+Запуск:
+    python -m benchmarks.bench_keyset_pagination --products 1000000 --limit 100
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_db_dir = tempfile.mkdtemp(prefix="bench_keyset_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+from sqlalchemy import insert
+
+from app import crud, database, models
+from app.pagination import encode_cursor, next_cursor
+
+CATEGORIES = ["Футболки", "Джинсы", "Куртки", "Платья", "Рубашки", "Свитеры"]
+SORTS = ["id", "price", "price_desc", "name"]
+DEPTHS = [0.0, 0.1, 0.5, 0.9, 0.99]
+
+
+def seed(count: int, chunk: int = 50000):
+    """Заполнение каталога пакетными INSERT по chunk строк"""
+    database.create_tables()
+    rng = random.Random(42)
+    with database.engine.begin() as conn:
+        for start in range(0, count, chunk):
+            conn.execute(insert(models.Product), [
+                {
+                    "name": f"Товар {rng.randrange(count):07d}",
+                    "description": None,
+                    "price": round(rng.uniform(100, 10000), 2),
+                    "category": rng.choice(CATEGORIES),
+                    "size": "M",
+                    "color": "Белый",
+                    "stock_quantity": 10,
+                }
+                for _ in range(start, min(start + chunk, count))
+            ])
+
+
+def fetch_page(db, limit, sort, cursor=None, skip=0):
+    """Одна страница напрямую через построитель запроса (без логирования crud)"""
+    rows = db.execute(crud.products_page_query(limit, sort=sort, cursor=cursor, skip=skip)).scalars().all()
+    return rows[:limit], next_cursor(rows, limit, crud.product_sort_name(sort), crud.PRODUCT_SORTS[sort][0])
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def cursor_at(db, limit, sort, skip):
+    """Курсор, указывающий на страницу с позицией skip (берется по последней строке предыдущей страницы)"""
+    if skip == 0:
+        return None
+    (last,), _ = fetch_page(db, 1, sort, skip=skip - 1)
+    key_attr = crud.PRODUCT_SORTS[sort][0]
+    return encode_cursor(sort, getattr(last, key_attr) if key_attr else None, last.id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    _, seed_ms = timed(lambda: seed(args.products))
+    print(f"Каталог: {args.products} товаров, заполнение {seed_ms / 1000:.1f} с")
+
+    with database.SessionLocal() as db:
+        for sort in SORTS:
+            print(f"\nСортировка {sort}: время страницы из {args.limit} строк, мс")
+            print(f"  {'глубина':>10} {'OFFSET':>10} {'курсор':>10}")
+            for depth in DEPTHS:
+                skip = int(args.products * depth)
+                _, offset_ms = timed(lambda: fetch_page(db, args.limit, sort, skip=skip))
+                cursor = cursor_at(db, args.limit, sort, skip)
+                _, cursor_ms = timed(lambda: fetch_page(db, args.limit, sort, cursor=cursor))
+                print(f"  {skip:>10} {offset_ms:>10.2f} {cursor_ms:>10.2f}")
+
+            page_times, cursor, pages = [], None, 0
+            started = time.perf_counter()
+            while True:
+                (rows, cursor), page_ms = timed(lambda: fetch_page(db, args.limit, sort, cursor=cursor))
+                page_times.append(page_ms)
+                pages += 1
+                if cursor is None:
+                    break
+            total = time.perf_counter() - started
+            page_times.sort()
+            print(
+                f"  полный проход курсором: {pages} страниц за {total:.1f} с, "
+                f"p50={statistics.median(page_times):.2f} мс, p99={page_times[int(len(page_times) * 0.99)]:.2f} мс"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Пропускная способность запросов при разных настройках логирования.
+
+Каждая конфигурация запускается в отдельном процессе (настройки логирования читаются
+при импорте приложения). В процессе выполняются запросы через TestClient к маршрутам,
+которые пишут по несколько сообщений на запрос (сессия БД, CRUD). stdout процесса
+направляется в файл, как у сервиса в контейнере, а с --slow-stdout — в канал, который
+читается с ограниченной скоростью (сборщик логов не успевает за приложением).
+
+Запуск:
+    python -m benchmarks.bench_logging --requests 2000
+    python -m benchmarks.bench_logging --requests 2000 --slow-stdout 100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CONFIGS = {
+    "sync": {"LOG_QUEUE": "false"},
+    "queue": {"LOG_QUEUE": "true"},
+    "queue+sample": {"LOG_QUEUE": "true", "LOG_SAMPLE_RATE": "100"},
+    "queue+json": {"LOG_QUEUE": "true", "LOG_FORMAT": "json"},
+    "level=WARNING": {"LOG_LEVEL": "WARNING"},
+}
+
+PATHS = ["/users/", "/api/products/page?limit=20", "/api/health"]
+
+
+def worker(requests: int, result_path: str):
+    from fastapi.testclient import TestClient
+
+    from app import crud, database, schemas
+    from app.main import app
+
+    database.create_tables()
+    with database.SessionLocal() as db:
+        for i in range(20):
+            crud.create_user(db, schemas.UserCreate(
+                email=f"user{i}@example.com", first_name="Иван", last_name="Иванов", password="password123"
+            ))
+            crud.create_product(db, schemas.ProductCreate(
+                name=f"Товар {i}", price=1000.0 + i, category="Футболки", size="M", color="Белый", stock_quantity=5
+            ))
+
+    with TestClient(app) as client:
+        for path in PATHS:
+            client.get(path)
+        started = time.perf_counter()
+        for i in range(requests):
+            assert client.get(PATHS[i % len(PATHS)]).status_code == 200
+        elapsed = time.perf_counter() - started
+
+    with open(result_path, "w") as f:
+        json.dump({"rps": requests / elapsed}, f)
+
+
+def read_slowly(stream, rate: int):
+    """Чтение канала со скоростью rate байт/с"""
+    chunk = 4096
+    while stream.read(chunk):
+        time.sleep(chunk / rate)
+
+
+def run(name: str, overrides: dict, requests: int, workdir: str, slow_stdout: int = 0) -> float:
+    config_dir = os.path.join(workdir, name.replace("+", "_").replace("=", "_"))
+    os.makedirs(config_dir)
+    result_path = os.path.join(config_dir, "result.json")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(config_dir, 'bench.db')}",
+        "LOG_FILE": os.path.join(config_dir, "app.log"),
+        "LOG_LEVEL": "INFO",
+        "LOG_QUEUE": "false",
+        "LOG_FORMAT": "text",
+        "LOG_SAMPLE_RATE": "1",
+        **overrides,
+    }
+    command = [sys.executable, "-m", "benchmarks.bench_logging", "--worker", result_path, "--requests", str(requests)]
+    if slow_stdout:
+        process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE)
+        reader = threading.Thread(target=read_slowly, args=(process.stdout, slow_stdout))
+        reader.start()
+        process.wait()
+        reader.join()
+    else:
+        with open(os.path.join(config_dir, "stdout.log"), "w") as stdout:
+            subprocess.run(command, env=env, stdout=stdout, check=True)
+    with open(result_path) as f:
+        return json.load(f)["rps"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--slow-stdout", type=int, default=0, help="скорость чтения stdout, байт/с")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.requests, args.worker)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="bench_logging_") as workdir:
+        results = {name: run(name, overrides, args.requests, workdir, args.slow_stdout)
+                   for name, overrides in CONFIGS.items()}
+
+    baseline = results["sync"]
+    print(f"{args.requests} запросов, маршруты: {', '.join(PATHS)}")
+    if args.slow_stdout:
+        print(f"stdout читается со скоростью {args.slow_stdout} байт/с")
+    print(f"{'режим':<16} {'запросов/с':>12} {'к sync':>8}")
+    for name, rps in results.items():
+        print(f"{name:<16} {rps:>12.0f} {rps / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
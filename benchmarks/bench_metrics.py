@@ -0,0 +1,112 @@
+"""
+Накладные расходы метрик (METRICS_ENABLED) на обработку запросов.
+
+Каждая конфигурация запускается в отдельном процессе (middleware и события SQLAlchemy
+подключаются при импорте приложения). Запросы идут через TestClient к синхронным
+и асинхронным маршрутам с обращением к БД и без него; порядок конфигураций чередуется
+между раундами, итог — медиана. Отдельно выводится стоимость одной операции с метрикой.
+
+Запуск:
+    python -m benchmarks.bench_metrics --requests 3000 --rounds 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+
+CONFIGS = {"без метрик": "false", "с метриками": "true"}
+
+PATHS = ["/api/health", "/products/page?limit=20", "/api/products/page?limit=20", "/users/"]
+
+
+def worker(requests: int, result_path: str):
+    import time
+
+    from fastapi.testclient import TestClient
+
+    from app import crud, database, schemas
+    from app.main import app
+
+    database.create_tables()
+    with database.SessionLocal() as db:
+        for i in range(20):
+            crud.create_user(db, schemas.UserCreate(
+                email=f"user{i}@example.com", first_name="Иван", last_name="Иванов", password="password123"
+            ))
+            crud.create_product(db, schemas.ProductCreate(
+                name=f"Товар {i}", price=1000.0 + i, category="Футболки", size="M", color="Белый", stock_quantity=5
+            ))
+
+    with TestClient(app) as client:
+        for path in PATHS:
+            client.get(path)
+        started = time.perf_counter()
+        for i in range(requests):
+            assert client.get(PATHS[i % len(PATHS)]).status_code == 200
+        elapsed = time.perf_counter() - started
+
+    with open(result_path, "w") as f:
+        json.dump({"rps": requests / elapsed}, f)
+
+
+def run(enabled: str, requests: int, workdir: str) -> float:
+    config_dir = tempfile.mkdtemp(dir=workdir)
+    result_path = os.path.join(config_dir, "result.json")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(config_dir, 'bench.db')}",
+        "LOG_LEVEL": "WARNING",
+        "METRICS_ENABLED": enabled,
+    }
+    code = f"from benchmarks.bench_metrics import worker; worker({requests}, {result_path!r})"
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+    with open(result_path) as f:
+        return json.load(f)["rps"]
+
+
+def micro():
+    """Стоимость отдельных операций в наносекундах"""
+    from app.metrics import Counter, Histogram
+
+    counter = Counter("c_total", "", ("method", "route", "status"))
+    histogram = Histogram("h_seconds", "", ("method", "route"))
+    number = 200000
+    return {
+        "Counter.inc": timeit.timeit(lambda: counter.inc("GET", "/api/products", "200"), number=number) / number,
+        "Histogram.observe": timeit.timeit(lambda: histogram.observe(0.012, "GET", "/api/products"),
+                                           number=number) / number,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {name: [] for name in CONFIGS}
+    with tempfile.TemporaryDirectory(prefix="bench_metrics_") as workdir:
+        for round_number in range(args.rounds):
+            order = list(CONFIGS.items())
+            if round_number % 2:
+                order.reverse()
+            for name, enabled in order:
+                results[name].append(run(enabled, args.requests, workdir))
+
+    baseline = statistics.median(results["без метрик"])
+    print(f"{'конфигурация':<14} {'запросов/с (медиана)':>21} {'разброс':>16} {'отн.':>6}")
+    for name, values in results.items():
+        median = statistics.median(values)
+        print(f"{name:<14} {median:>21.0f} {min(values):>7.0f}..{max(values):<7.0f} {median / baseline:>6.3f}")
+
+    print()
+    for operation, seconds in micro().items():
+        print(f"{operation:<18} {seconds * 1e9:>6.0f} нс")
+
+
+if __name__ == "__main__":
+    main()
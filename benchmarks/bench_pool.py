@@ -0,0 +1,123 @@
+"""
+Пул соединений и настройки SQLite под конкурентной нагрузкой.
+
+Каждая конфигурация запускается в отдельном процессе (пул и PRAGMA настраиваются при импорте
+приложения). Потоки-воркеры, как потоки синхронных обработчиков FastAPI, открывают сессию
+на каждую операцию: большинство операций читают страницу заказов, часть оформляет заказ.
+Выводятся операции в секунду, ошибки "database is locked" и ожидание соединения из пула
+(database.pool_stats) — по ним видно, хватает ли DB_POOL_SIZE на число потоков.
+
+Запуск:
+    python -m benchmarks.bench_pool --threads 16 --seconds 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+CONFIGS = {
+    "DELETE/FULL, пул 5+10": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"},
+    "WAL/NORMAL, пул 5+10": {},
+    "WAL/NORMAL, пул 2+0": {"DB_POOL_SIZE": "2", "DB_MAX_OVERFLOW": "0"},
+    "WAL/NORMAL, пул 16+0": {"DB_POOL_SIZE": "16", "DB_MAX_OVERFLOW": "0"},
+}
+
+
+def worker(threads: int, seconds: float, write_share: float, result_path: str):
+    import random
+    import threading
+    import time
+
+    from sqlalchemy import insert
+    from sqlalchemy.exc import OperationalError
+
+    from app import crud, database, models, schemas
+
+    database.create_tables()
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"email": f"user{i}@example.com", "first_name": "Иван", "last_name": "Иванов", "hashed_password": "x"}
+            for i in range(threads)
+        ])
+        conn.execute(insert(models.Product), [
+            {"name": f"Товар {i}", "price": 1000.0 + i, "category": "Футболки", "size": "M", "color": "Белый",
+             "stock_quantity": 10 ** 6}
+            for i in range(100)
+        ])
+
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def run(user_id: int):
+        rng = random.Random(user_id)
+        local = {"reads": 0, "writes": 0, "locked": 0}
+        while time.perf_counter() < deadline:
+            with database.SessionLocal() as db:
+                try:
+                    if rng.random() < write_share:
+                        order = schemas.OrderCreate(products=[
+                            schemas.OrderProduct(product_id=rng.randint(1, 100), quantity=1)
+                        ])
+                        crud.create_order(db, order, user_id=user_id)
+                        local["writes"] += 1
+                    else:
+                        crud.get_orders_json(db, user_id=user_id, limit=20)
+                        local["reads"] += 1
+                except OperationalError:
+                    local["locked"] += 1
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    workers = [threading.Thread(target=run, args=(i + 1,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with open(result_path, "w") as f:
+        json.dump({**counts, "elapsed": elapsed, "pool": database.pool_stats(database.engine)}, f)
+
+
+def run(name: str, overrides: dict, args, workdir: str) -> dict:
+    config_dir = tempfile.mkdtemp(dir=workdir)
+    result_path = os.path.join(config_dir, "result.json")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(config_dir, 'bench.db')}",
+        "LOG_LEVEL": "ERROR",
+        **overrides,
+    }
+    code = (f"from benchmarks.bench_pool import worker; "
+            f"worker({args.threads}, {args.seconds}, {args.write_share}, {result_path!r})")
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+    with open(result_path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--write-share", type=float, default=0.2, help="доля операций с записью")
+    args = parser.parse_args()
+
+    print(f"{'конфигурация':<24} {'чтений/с':>9} {'записей/с':>10} {'locked':>7} "
+          f"{'ожид. ср, мс':>13} {'макс, мс':>9} {'таймауты':>9}")
+    with tempfile.TemporaryDirectory(prefix="bench_pool_") as workdir:
+        for name, overrides in CONFIGS.items():
+            result = run(name, overrides, args, workdir)
+            pool = result["pool"]
+            wait_avg = pool["wait_seconds_total"] / max(pool["checkouts"], 1) * 1000
+            print(f"{name:<24} {result['reads'] / result['elapsed']:>9.0f} "
+                  f"{result['writes'] / result['elapsed']:>10.0f} {result['locked']:>7} "
+                  f"{wait_avg:>13.2f} {pool['wait_seconds_max'] * 1000:>9.1f} {pool['timeouts']:>9}")
+
+
+if __name__ == "__main__":
+    main()
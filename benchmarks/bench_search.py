@@ -0,0 +1,145 @@
+"""
+Поиск по сгенерированному каталогу (по умолчанию 500 000 товаров).
+
+Сравнивается /api/products/search (crud.search_products_json: FTS5 + фасеты по индексам)
+с тем, что пришлось бы делать без индекса поиска: LIKE '%слово%' по названию и описанию.
+Для каждого сценария выводится p50/p95 по нескольким повторам: без кэша (кэш каталога
+сбрасывается перед каждым вызовом) и повторного запроса из кэша.
+
+Запуск:
+    python -m benchmarks.bench_search --products 500000 --repeat 20
+"""
+import argparse
+import math
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+_db_dir = tempfile.mkdtemp(prefix="bench_search_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from sqlalchemy import func, insert, or_, select, text
+
+from app import crud, database, models
+from app.cache import product_cache
+from app.serialization import PRODUCT_COLUMNS
+
+CATEGORIES = ["Футболки", "Джинсы", "Куртки", "Платья", "Рубашки", "Свитеры", "Брюки", "Юбки", "Шорты", "Пальто"]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL", "28", "30", "32", "34", "36"]
+COLORS = ["Белый", "Черный", "Синий", "Красный", "Серый", "Зеленый", "Бежевый", "Голубой", "Желтый", "Розовый"]
+ADJECTIVES = ["хлопковая", "льняная", "шерстяная", "теплая", "летняя", "классическая", "спортивная", "вечерняя",
+              "офисная", "джинсовая", "трикотажная", "вельветовая", "кашемировая", "оверсайз", "приталенная"]
+WORDS = ["комфорт", "стиль", "прочный", "мягкий", "дышащий", "натуральный", "уход", "стирка", "повседневный",
+         "премиальный", "капюшон", "карман", "молния", "пуговицы", "воротник", "манжеты", "подкладка", "утеплитель",
+         "деним", "полиэстер", "вискоза", "эластан", "принт", "вышивка", "аппликация", "однотонный", "полоска"]
+
+
+def generate(count: int, chunk: int = 10000):
+    rng = random.Random(42)
+    database.create_tables()
+    started = time.perf_counter()
+    with database.engine.begin() as conn:
+        for offset in range(0, count, chunk):
+            conn.execute(insert(models.Product), [
+                {
+                    "name": f"{rng.choice(CATEGORIES)[:-1]} {rng.choice(ADJECTIVES)} {offset + i}",
+                    "description": " ".join(rng.choices(WORDS, k=12)),
+                    "price": round(rng.uniform(300, 30000), 2),
+                    "category": rng.choice(CATEGORIES),
+                    "size": rng.choice(SIZES),
+                    "color": rng.choice(COLORS),
+                    "stock_quantity": rng.randint(0, 100),
+                }
+                for i in range(min(chunk, count - offset))
+            ])
+        conn.execute(text("ANALYZE"))
+    print(f"Сгенерировано {count} товаров за {time.perf_counter() - started:.1f} с")
+
+
+def like_search(db, q, category=None, min_price=None, max_price=None, limit=20):
+    """Поиск без индекса: каждое слово должно встретиться в названии или описании"""
+    conditions = [
+        or_(models.Product.name.ilike(f"%{term}%"), models.Product.description.ilike(f"%{term}%"))
+        for term in q.split()
+    ]
+    if category:
+        conditions.append(models.Product.category == category)
+    if min_price is not None:
+        conditions.append(models.Product.price >= min_price)
+    if max_price is not None:
+        conditions.append(models.Product.price <= max_price)
+    rows = db.execute(select(*PRODUCT_COLUMNS).where(*conditions).order_by(models.Product.id).limit(limit)).all()
+    total = db.execute(select(func.count()).select_from(models.Product).where(*conditions)).scalar_one()
+    facets = {
+        name: db.execute(
+            select(getattr(models.Product, name), func.count()).where(*conditions)
+            .group_by(getattr(models.Product, name))
+        ).all()
+        for name in ("category", "size", "color")
+    }
+    return rows, total, facets
+
+
+def timed(fn, repeat, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[math.ceil(len(samples) * 0.95) - 1]
+
+
+SCENARIOS = [
+    ("редкое слово", {"q": "кашемировая вышивка"}),
+    ("частое слово", {"q": "стиль"}),
+    ("префикс", {"q": "утепл"}),
+    ("слово + фильтры", {"q": "капюшон", "category": "Куртки", "min_price": 5000, "max_price": 15000}),
+    ("только фасеты", {}),
+    ("фасеты + цена", {"min_price": 1000, "max_price": 2000}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    try:
+        run(args)
+    finally:
+        database.engine.dispose()
+        shutil.rmtree(_db_dir, ignore_errors=True)
+
+
+def run(args):
+    generate(args.products)
+    print(f"{'сценарий':<18} {'найдено':>8} {'search p50':>11} {'p95':>8} {'кэш p50':>8} "
+          f"{'LIKE p50':>10} {'p95':>8}")
+    with database.SessionLocal() as db:
+        for name, params in SCENARIOS:
+            total = db.execute(crud.search_total_query(
+                crud.search_terms(params.get("q")),
+                crud.search_filters(params.get("category"), None, None,
+                                    params.get("min_price"), params.get("max_price"))
+            )).scalar_one()
+            search_p50, search_p95 = timed(lambda: crud.search_products_json(db, **params), args.repeat,
+                                           before=product_cache.clear)
+            cached_p50, _ = timed(lambda: crud.search_products_json(db, **params), args.repeat)
+            if params.get("q"):
+                like_p50, like_p95 = timed(lambda: like_search(db, **params), max(args.repeat // 5, 1))
+                like = f"{like_p50:>10.1f} {like_p95:>8.1f}"
+            else:
+                like = f"{'—':>10} {'—':>8}"
+            print(f"{name:<18} {total:>8} {search_p50:>11.1f} {search_p95:>8.1f} {cached_p50:>8.2f} {like}")
+
+
+if __name__ == "__main__":
+    main()
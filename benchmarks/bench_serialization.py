@@ -0,0 +1,137 @@
+"""
+Микробенчмарк сериализации страницы списка: путь response_model против быстрого пути.
+
+Для schemas.Product, schemas.Order и schemas.User сравнивается:
+  - pydantic: ORM-объекты -> валидация с from_attributes -> jsonable_encoder -> json.dumps
+    (то, что делает FastAPI для response_model=List[...]);
+  - fast: кортежи столбцов -> app.serialization.dumps.
+Отдельно измеряется только сериализация и выборка + сериализация.
+
+Запуск:
+    python -m benchmarks.bench_serialization --page 100 --repeat 200
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+_db_dir = tempfile.mkdtemp(prefix="bench_serialization_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.orm import selectinload
+
+from app import database, models, schemas
+from app.serialization import (
+    ORDER_COLUMNS, ORDER_ITEM_COLUMNS, PRODUCT_COLUMNS, PRODUCT_FIELDS, USER_COLUMNS, USER_FIELDS, dumps,
+    orders_to_dicts, rows_json
+)
+
+
+def seed(page: int):
+    database.create_tables()
+    rng = random.Random(1)
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"email": f"user{i}@example.com", "first_name": "Иван", "last_name": "Иванов", "hashed_password": "x"}
+            for i in range(page)
+        ])
+        conn.execute(insert(models.Product), [
+            {"name": f"Товар {i}", "description": "Описание товара " * 4, "price": rng.uniform(100, 9000),
+             "category": "Футболки", "size": "M", "color": "Белый", "stock_quantity": 10}
+            for i in range(page)
+        ])
+        conn.execute(insert(models.Order), [
+            {"user_id": 1, "total_amount": 1000.0, "status": "pending"} for _ in range(page)
+        ])
+        conn.execute(insert(models.OrderItem), [
+            {"order_id": order_id, "product_id": rng.randint(1, page), "quantity": 1, "unit_price": 500.0}
+            for order_id in range(1, page + 1) for _ in range(3)
+        ])
+
+
+def pydantic_dump(schema, objects) -> bytes:
+    adapter = TypeAdapter(List[schema])
+    return json.dumps(jsonable_encoder(adapter.validate_python(objects, from_attributes=True))).encode()
+
+
+def fetch_orm(db, name, page):
+    if name == "Product":
+        return db.execute(select(models.Product).limit(page)).scalars().all()
+    if name == "User":
+        return db.execute(select(models.User).limit(page)).scalars().all()
+    return db.execute(
+        select(models.Order).options(selectinload(models.Order.items)).limit(page)
+    ).scalars().all()
+
+
+def fetch_rows(db, name, page):
+    if name == "Product":
+        return db.execute(select(*PRODUCT_COLUMNS).limit(page)).all()
+    if name == "User":
+        return db.execute(select(*USER_COLUMNS).limit(page)).all()
+    orders = db.execute(select(*ORDER_COLUMNS).limit(page)).all()
+    items = db.execute(
+        select(*ORDER_ITEM_COLUMNS).where(models.OrderItem.order_id.in_([row.id for row in orders]))
+    ).all()
+    return orders, items
+
+
+def fast_dump(name, rows) -> bytes:
+    if name == "Product":
+        return rows_json(rows, PRODUCT_FIELDS)
+    if name == "User":
+        return rows_json(rows, USER_FIELDS)
+    return dumps(orders_to_dicts(*rows))
+
+
+def measure(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    logger.remove()
+    seed(args.page)
+    schema_by_name = {"Product": schemas.Product, "Order": schemas.Order, "User": schemas.User}
+
+    print(f"Страница из {args.page} записей, среднее время в мс (без учета логирования)")
+    print(f"{'схема':<8} {'сериализация':>28} {'выборка + сериализация':>30}")
+    print(f"{'':<8} {'pydantic':>10} {'fast':>8} {'x':>8} {'pydantic':>12} {'fast':>8} {'x':>8}")
+    with database.SessionLocal() as db:
+        for name, schema in schema_by_name.items():
+            orm_objects = fetch_orm(db, name, args.page)
+            rows = fetch_rows(db, name, args.page)
+            assert json.loads(pydantic_dump(schema, orm_objects)) == json.loads(fast_dump(name, rows))
+
+            serialize_pydantic = measure(lambda: pydantic_dump(schema, orm_objects), args.repeat)
+            serialize_fast = measure(lambda: fast_dump(name, rows), args.repeat)
+
+            def full_pydantic():
+                db.expunge_all()
+                pydantic_dump(schema, fetch_orm(db, name, args.page))
+
+            full_fast = measure(lambda: fast_dump(name, fetch_rows(db, name, args.page)), args.repeat)
+            full_orm = measure(full_pydantic, args.repeat)
+            print(
+                f"{name:<8} {serialize_pydantic:>10.3f} {serialize_fast:>8.3f} "
+                f"{serialize_pydantic / serialize_fast:>7.1f}x {full_orm:>12.3f} {full_fast:>8.3f} "
+                f"{full_orm / full_fast:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
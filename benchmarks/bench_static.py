@@ -0,0 +1,95 @@
+"""
+Байты и запросы при загрузке страниц магазина: холодный кэш браузера и повторный визит.
+
+"До" — прежняя раздача: HTML и статика без сжатия по исходным адресам /static/...,
+при повторном визите страница загружается заново, а каждый файл перепроверяется (304).
+"После" — страницы из кэша с gzip/br и ETag, статика по адресам с хэшем в сжатом виде
+с Cache-Control: immutable: при повторном визите перепроверяется только страница.
+Учитываются тела ответов в том виде, в каком они передаются, и заголовки ответов.
+
+Запуск:
+    python -m benchmarks.bench_static
+"""
+import argparse
+import os
+import re
+import tempfile
+
+_work_dir = tempfile.mkdtemp(prefix="bench_static_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_work_dir, 'bench.db')}"
+os.environ["STATIC_BUILD_DIR"] = os.path.join(_work_dir, "static")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from fastapi.testclient import TestClient
+
+from app import http_cache
+from app.assets import manifest
+from app.main import app
+
+PAGES = ["/", "/products", "/cart", "/login"]
+ASSET_URL = re.compile(r'(?:src|href)="(/static/[^"]+)"')
+# Заголовки запроса браузера; brotli учитывается, только если модуль установлен
+ACCEPT_ENCODING = "gzip, deflate, br" if http_cache.brotli else "gzip, deflate"
+
+
+class Transfer:
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+
+    def add(self, response):
+        self.requests += 1
+        # num_bytes_downloaded — тело до распаковки, т.е. то, что ушло по сети
+        self.bytes += response.num_bytes_downloaded + sum(
+            len(name) + len(value) + 4 for name, value in response.headers.raw)
+
+
+def original_url(url: str) -> str:
+    asset = manifest.by_hashed_path.get(url.removeprefix("/static/"))
+    return f"/static/{asset.path}" if asset else url
+
+
+def load_before(client, page: str, browser_cache: dict, transfer: Transfer):
+    response = client.get(page, headers={"Accept-Encoding": "identity"})
+    transfer.add(response)
+    for url in dict.fromkeys(original_url(url) for url in ASSET_URL.findall(response.text)):
+        etag = browser_cache.get(url)
+        asset = client.get(url, headers={"Accept-Encoding": "identity", **({"If-None-Match": etag} if etag else {})})
+        transfer.add(asset)
+        browser_cache.setdefault(url, asset.headers.get("etag"))
+
+
+def load_after(client, page: str, browser_cache: dict, transfer: Transfer):
+    etag = browser_cache.get(page)
+    response = client.get(page, headers={"Accept-Encoding": ACCEPT_ENCODING,
+                                         **({"If-None-Match": etag} if etag else {})})
+    transfer.add(response)
+    if response.status_code == 200:
+        browser_cache[page] = response.headers["etag"]
+        browser_cache[page, "html"] = response.text
+    for url in dict.fromkeys(ASSET_URL.findall(browser_cache[page, "html"])):
+        # immutable: файл из кэша браузера используется без запроса
+        if url not in browser_cache:
+            transfer.add(client.get(url, headers={"Accept-Encoding": ACCEPT_ENCODING}))
+            browser_cache[url] = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    with TestClient(app) as client:
+        print(f"brotli: {'да' if http_cache.brotli else 'нет'}")
+        print(f"{'страница':<10} {'вариант':<7} {'холодная':>20} {'повторная':>20}")
+        for page in PAGES:
+            for name, load in (("до", load_before), ("после", load_after)):
+                browser_cache = {}
+                cold, warm = Transfer(), Transfer()
+                load(client, page, browser_cache, cold)
+                load(client, page, browser_cache, warm)
+                print(f"{page:<10} {name:<7} {cold.bytes:>9} Б, {cold.requests:>2} запр. "
+                      f"{warm.bytes:>9} Б, {warm.requests:>2} запр.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Синтетические данные магазина: пользователи, товары и история заказов в нужном масштабе.
+
+Генерация детерминирована (--seed): при тех же параметрах получаются те же строки. Строки
+вставляются пачками по CHUNK через executemany, по транзакции на пачку, поэтому миллионы заказов
+укладываются в минуты. Популярность товаров и активность покупателей неравномерны (закон Ципфа),
+заказы равномерно распределены по --days дням до текущего часа. Новые строки добавляются после
+уже существующих; сводка по категориям пересобирается в конце, сводки продаж приложение
+заполняет само.
+
+База берется из DATABASE_URL, как у приложения.
+
+Запуск:
+    DATABASE_URL=sqlite:///./load.db python -m benchmarks.data --users 100000 --products 20000 --orders 1000000
+"""
+import argparse
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import category_stats, database, models
+
+CHUNK = 20_000
+# Тот же "хеш", что у crud.create_user: вход под сгенерированным пользователем с паролем password123
+HASHED_PASSWORD = "password123notreallyhashed"
+
+FIRST_NAMES = ["Иван", "Анна", "Петр", "Мария", "Алексей", "Елена", "Дмитрий", "Ольга", "Сергей", "Наталья"]
+LAST_NAMES = ["Иванов", "Смирнова", "Кузнецов", "Попова", "Соколов", "Лебедева", "Козлов", "Новикова"]
+# Категория: (вид товара в названии, размеры, диапазон цены)
+CATALOG = {
+    "Футболки": ("Футболка", ["XS", "S", "M", "L", "XL", "XXL"], (500, 3000)),
+    "Джинсы": ("Джинсы", ["28", "30", "32", "34", "36"], (2000, 8000)),
+    "Куртки": ("Куртка", ["S", "M", "L", "XL"], (4000, 25000)),
+    "Платья": ("Платье", ["XS", "S", "M", "L"], (2000, 12000)),
+    "Рубашки": ("Рубашка", ["S", "M", "L", "XL"], (1500, 6000)),
+    "Свитеры": ("Свитер", ["S", "M", "L", "XL"], (2500, 9000)),
+    "Обувь": ("Кроссовки", ["38", "39", "40", "41", "42", "43", "44"], (3000, 15000)),
+    "Аксессуары": ("Шарф", ["ONE"], (500, 4000)),
+}
+CATEGORIES = list(CATALOG)
+BRANDS = ["Nord", "Lino", "Urban", "Basic", "Terra", "Volna", "Sever", "Atelier"]
+MATERIALS = ["хлопок", "лен", "шерсть", "деним", "вискоза", "кашемир", "полиэстер"]
+COLORS = ["Белый", "Черный", "Синий", "Серый", "Красный", "Зеленый", "Бежевый"]
+# Статусы заказов старше недели и более свежих
+OLD_STATUSES = (["delivered", "cancelled"], [97, 3])
+RECENT_STATUSES = (["pending", "confirmed", "shipped", "delivered"], [10, 40, 30, 20])
+
+
+def zipf_weights(count: int, exponent: float = 0.8) -> List[float]:
+    """Накопленные веса: первый элемент выбирается чаще всего, хвост — редко"""
+    return list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+
+def chunks(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def user_rows(rng: random.Random, first_id: int, count: int, start: datetime) -> Iterator[dict]:
+    for user_id in range(first_id, first_id + count):
+        yield {
+            "id": user_id,
+            "email": f"user{user_id}@example.com",
+            "first_name": rng.choice(FIRST_NAMES),
+            "last_name": rng.choice(LAST_NAMES),
+            "hashed_password": HASHED_PASSWORD,
+            "created_at": start,
+        }
+
+
+def product_rows(rng: random.Random, first_id: int, count: int, start: datetime) -> Iterator[dict]:
+    for product_id in range(first_id, first_id + count):
+        category = rng.choice(CATEGORIES)
+        kind, sizes, (low, high) = CATALOG[category]
+        material, color = rng.choice(MATERIALS), rng.choice(COLORS)
+        yield {
+            "id": product_id,
+            "name": f"{kind} {rng.choice(BRANDS)} {product_id}",
+            "description": f"Материал: {material}. Цвет: {color.lower()}.",
+            "price": float(rng.randrange(low, high, 10)),
+            "category": category,
+            "size": rng.choice(sizes),
+            "color": color,
+            # Часть каталога распродана
+            "stock_quantity": 0 if rng.random() < 0.05 else rng.randint(100, 1000),
+            "created_at": start,
+            "updated_at": start,
+        }
+
+
+def insert_rows(engine: Engine, table, rows: Iterator[dict], chunk_size: int) -> int:
+    inserted = 0
+    for batch in chunks(rows, chunk_size):
+        with engine.begin() as conn:
+            conn.execute(insert(table), batch)
+        inserted += len(batch)
+    return inserted
+
+
+def next_id(engine: Engine, table) -> int:
+    with engine.connect() as conn:
+        return (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def sync_sequences(engine: Engine, tables):
+    """PostgreSQL: после вставки с явными id последовательности продолжают с max(id)"""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for table in tables:
+            conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                              f"(SELECT COALESCE(MAX(id), 1) FROM {table.name}))"))
+
+
+def generate(users: int, products: int, orders: int, days: int = 365, seed: int = 42,
+             end: Optional[datetime] = None, engine: Optional[Engine] = None,
+             chunk_size: int = CHUNK) -> Dict[str, int]:
+    """
+    Добавление users пользователей, products товаров и orders заказов за days дней до end.
+    Заказы ссылаются только на пользователей и товары этого же запуска. Возвращает число строк.
+    """
+    if orders and not (users and products):
+        raise ValueError("Для заказов нужны пользователи и товары")
+    engine = engine or database.engine
+    rng = random.Random(seed)
+    end = end or datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+    tables = [models.User.__table__, models.Product.__table__, models.Order.__table__, models.OrderItem.__table__]
+    first_user, first_product, first_order, first_item = (next_id(engine, table) for table in tables)
+
+    insert_rows(engine, tables[0], user_rows(rng, first_user, users, start), chunk_size)
+    # Цены и остатки нужны для позиций заказов
+    catalog = list(product_rows(rng, first_product, products, start))
+    insert_rows(engine, tables[1], iter(catalog), chunk_size)
+    prices = [row["price"] for row in catalog]
+    del catalog
+
+    # Популярные товары и активные покупатели разбросаны по id, а не собраны в начале
+    product_ranks = list(range(products))
+    rng.shuffle(product_ranks)
+    product_weights = zipf_weights(products)
+    user_weights = zipf_weights(users, exponent=0.5)
+    span = days * 24 * 3600
+    recent = end - timedelta(days=7)
+    item_id = first_item
+    for chunk_start in range(0, orders, chunk_size):
+        order_rows, item_rows = [], []
+        chunk_end = min(chunk_start + chunk_size, orders)
+        buyers = rng.choices(range(users), cum_weights=user_weights, k=chunk_end - chunk_start)
+        for number, buyer in zip(range(chunk_start, chunk_end), buyers):
+            order_id = first_order + number
+            # Заказы идут по времени, как при обычной работе магазина
+            created_at = start + timedelta(seconds=span * (number + 1) / orders)
+            picked = set(rng.choices(product_ranks, cum_weights=product_weights, k=rng.randint(1, 4)))
+            total = 0.0
+            for index in picked:
+                quantity = rng.randint(1, 3)
+                total += prices[index] * quantity
+                item_rows.append({"id": item_id, "order_id": order_id, "product_id": first_product + index,
+                                  "quantity": quantity, "unit_price": prices[index]})
+                item_id += 1
+            statuses, weights = OLD_STATUSES if created_at < recent else RECENT_STATUSES
+            order_rows.append({"id": order_id, "user_id": first_user + buyer, "total_amount": total,
+                               "status": rng.choices(statuses, weights)[0], "created_at": created_at,
+                               "updated_at": created_at})
+        with engine.begin() as conn:
+            conn.execute(insert(tables[2]), order_rows)
+            conn.execute(insert(tables[3]), item_rows)
+
+    sync_sequences(engine, tables)
+    with Session(engine) as db:
+        category_stats.rebuild(db)
+    return {"users": users, "products": products, "orders": orders, "order_items": item_id - first_item}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--products", type=int, default=5_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365, help="за сколько дней до текущего часа идут заказы")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK, help="строк в одной транзакции")
+    args = parser.parse_args()
+
+    database.create_tables()
+    started = time.perf_counter()
+    counts = generate(args.users, args.products, args.orders, args.days, args.seed, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - started
+    rows = sum(counts.values())
+    print(f"пользователей: {counts['users']}, товаров: {counts['products']}, заказов: {counts['orders']} "
+          f"(позиций: {counts['order_items']})")
+    print(f"вставлено строк: {rows} за {elapsed:.1f} с ({rows / elapsed:.0f} строк/с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Нагрузочный тест HTTP API: взвешенная смесь запросов каталога, поиска, истории заказов,
+оформления заказов и аналитики от --concurrency параллельных клиентов в течение --seconds.
+
+Цели (--target):
+    asgi     приложение в этом же процессе через httpx.ASGITransport: без сети и сервера,
+             видна стоимость самого приложения
+    uvicorn  локальный uvicorn в отдельном процессе (--workers), запросы по HTTP
+
+Данные по умолчанию генерируются benchmarks.data во временной базе (--users, --products, --orders);
+--database-url подключает готовую базу, например заполненную python -m benchmarks.data.
+Сводки продаж заполняются до старта, чтобы фоновая задача не догоняла историю во время замера.
+
+По каждому эндпоинту выводятся запросы, ошибки, запросов/с и p50/p95/p99. --save-baseline
+сохраняет результат в JSON; --baseline сравнивает с сохраненным: рост p50/p95 или падение
+запросов/с больше --tolerance (и рост доли ошибок) считается регрессией, код выхода — 1.
+
+Запуск:
+    python -m benchmarks.load --target asgi --seconds 20 --save-baseline baseline.json
+    python -m benchmarks.load --target uvicorn --workers 2 --seconds 20 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+# Товаров с остатком берется не больше стольких (для запросов карточки и заказов)
+MAX_PRODUCT_SAMPLE = 100_000
+# Различия меньше этого (мс) не считаются регрессией: шум измерения быстрых эндпоинтов
+MIN_REGRESSION_MS = 1.0
+# Допустимый рост доли ошибок
+MAX_ERROR_RATE_INCREASE = 0.01
+
+
+class Dataset(NamedTuple):
+    """Что есть в базе: из этого собираются параметры запросов"""
+    user_ids: Tuple[int, int]
+    product_ids: List[int]
+    categories: List[str]
+    terms: List[str]
+
+
+class Endpoint(NamedTuple):
+    name: str
+    weight: int
+    # (rng, dataset) -> (метод, путь, параметры httpx)
+    build: Callable[[random.Random, Dataset], Tuple[str, str, Dict[str, Any]]]
+
+
+def _user_id(rng: random.Random, dataset: Dataset) -> int:
+    return rng.randint(*dataset.user_ids)
+
+
+ENDPOINTS = [
+    Endpoint("GET /api/products/page", 20, lambda rng, d: (
+        "GET", "/api/products/page",
+        {"params": {"limit": 20, "category": rng.choice(d.categories), "sort": rng.choice(["price", "name"])}})),
+    Endpoint("GET /api/products/{id}", 25, lambda rng, d: (
+        "GET", f"/api/products/{rng.choice(d.product_ids)}", {})),
+    Endpoint("GET /api/products/search", 10, lambda rng, d: (
+        "GET", "/api/products/search", {"params": {"q": rng.choice(d.terms)}})),
+    Endpoint("GET /api/categories", 10, lambda rng, d: ("GET", "/api/categories", {})),
+    Endpoint("GET /orders/page", 15, lambda rng, d: (
+        "GET", "/orders/page", {"params": {"user_id": _user_id(rng, d), "limit": 20}})),
+    Endpoint("POST /orders/", 10, lambda rng, d: (
+        "POST", "/orders/", {"params": {"user_id": _user_id(rng, d)}, "json": {"products": [
+            {"product_id": product_id, "quantity": 1} for product_id in rng.sample(d.product_ids, 2)]}})),
+    Endpoint("GET /api/analytics/top-products", 5, lambda rng, d: (
+        "GET", "/api/analytics/top-products", {"params": {"limit": 10}})),
+    Endpoint("GET /", 5, lambda rng, d: ("GET", "/", {})),
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу: значение, не меньше которого q% наблюдений"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def describe(db) -> Dataset:
+    """Диапазон пользователей, товары в наличии и категории базы"""
+    from sqlalchemy import func, select
+
+    from app import models
+    from benchmarks import data
+
+    low, high = db.execute(select(func.min(models.User.id), func.max(models.User.id))).one()
+    product_ids = db.execute(
+        select(models.Product.id).where(models.Product.stock_quantity > 0).limit(MAX_PRODUCT_SAMPLE)
+    ).scalars().all()
+    categories = db.execute(select(models.Product.category).distinct()).scalars().all()
+    if low is None or len(product_ids) < 2:
+        raise ValueError("В базе нет пользователей или товаров в наличии: сгенерируйте данные (benchmarks.data)")
+    return Dataset((low, high), product_ids, categories, [term.lower() for term in data.BRANDS + data.MATERIALS])
+
+
+async def run(client: httpx.AsyncClient, dataset: Dataset, concurrency: int, seconds: float, warmup: float = 0.0,
+              seed: int = 42, endpoints: Optional[List[Endpoint]] = None) -> Dict[str, Any]:
+    """
+    Нагрузка на client в течение warmup + seconds; учитываются только запросы, начатые после прогрева.
+    Возвращает отчет: итог и по каждому эндпоинту запросы, ошибки (ответ 4xx/5xx или сбой соединения),
+    запросов/с и перцентили в миллисекундах.
+    """
+    endpoints = endpoints or ENDPOINTS
+    weights = [endpoint.weight for endpoint in endpoints]
+    latencies: Dict[str, List[float]] = {endpoint.name: [] for endpoint in endpoints}
+    errors: Dict[str, int] = {endpoint.name: 0 for endpoint in endpoints}
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + seconds
+
+    async def worker(rng: random.Random):
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            method, url, options = endpoint.build(rng, dataset)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **options)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            if started >= measure_from:
+                latencies[endpoint.name].append((time.perf_counter() - started) * 1000)
+                errors[endpoint.name] += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(random.Random(seed + number)) for number in range(concurrency)))
+    elapsed = time.perf_counter() - max(started, measure_from)
+
+    report: Dict[str, Any] = {"seconds": round(elapsed, 3), "concurrency": concurrency, "endpoints": {}}
+    for name, values in latencies.items():
+        if not values:
+            continue
+        report["endpoints"][name] = {
+            "requests": len(values),
+            "errors": errors[name],
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+        }
+    all_values = [value for values in latencies.values() for value in values]
+    report["total"] = {
+        "requests": len(all_values),
+        "errors": sum(errors.values()),
+        "rps": round(len(all_values) / elapsed, 2),
+        "p50_ms": round(percentile(all_values, 50), 3) if all_values else 0.0,
+        "p95_ms": round(percentile(all_values, 95), 3) if all_values else 0.0,
+        "p99_ms": round(percentile(all_values, 99), 3) if all_values else 0.0,
+    }
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+    """Регрессии относительно baseline: по эндпоинтам, которые есть в обоих отчетах"""
+    regressions = []
+    for name, base in baseline["endpoints"].items():
+        current = report["endpoints"].get(name)
+        if current is None:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if current[key] > base[key] * (1 + tolerance) and current[key] - base[key] >= MIN_REGRESSION_MS:
+                regressions.append(f"{name}: {key} {base[key]:.1f} -> {current[key]:.1f}")
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: запросов/с {base['rps']:.1f} -> {current['rps']:.1f}")
+        base_rate = base["errors"] / base["requests"]
+        rate = current["errors"] / current["requests"]
+        if rate > base_rate + MAX_ERROR_RATE_INCREASE:
+            regressions.append(f"{name}: доля ошибок {base_rate:.1%} -> {rate:.1%}")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'эндпоинт':<32} {'запросов':>9} {'ошибок':>7} {'запр/с':>8} "
+          f"{'p50, мс':>8} {'p95, мс':>8} {'p99, мс':>8}")
+    rows = sorted(report["endpoints"].items()) + [("всего", report["total"])]
+    for name, row in rows:
+        print(f"{name:<32} {row['requests']:>9} {row['errors']:>7} {row['rps']:>8.1f} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+
+
+async def run_asgi(dataset: Dataset, args) -> Dict[str, Any]:
+    from app.main import app
+
+    # ASGITransport не отправляет lifespan: запуск и остановка приложения выполняются здесь
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            return await run(client, dataset, args.concurrency, args.seconds, args.warmup, args.seed)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn завершился с кодом {server.returncode}")
+        try:
+            if (await client.get("/api/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn не ответил на /api/health")
+
+
+async def run_uvicorn(dataset: Dataset, args) -> Dict[str, Any]:
+    port = free_port()
+    server = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+    ], env=os.environ.copy())
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+            await wait_ready(client, server)
+            return await run(client, dataset, args.concurrency, args.seconds, args.warmup, args.seed)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def prepare(args) -> Dataset:
+    """Настройка окружения приложения, генерация данных и заполнение сводок"""
+    work_dir = tempfile.mkdtemp(prefix="bench_load_")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(work_dir, 'load.db')}"
+    os.environ["STATIC_BUILD_DIR"] = os.path.join(work_dir, "static")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from app import analytics, database
+    from benchmarks import data
+
+    database.create_tables()
+    if not args.database_url:
+        started = time.perf_counter()
+        counts = data.generate(args.users, args.products, args.orders, seed=args.seed)
+        print(f"данные: {counts} за {time.perf_counter() - started:.1f} с")
+    analytics.SalesRollup(batch_size=20_000).catch_up()
+    with database.SessionLocal() as db:
+        dataset = describe(db)
+    # Соединения этого процесса не нужны серверу uvicorn
+    database.engine.dispose()
+    return dataset
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--workers", type=int, default=1, help="процессов uvicorn")
+    parser.add_argument("--concurrency", type=int, default=16, help="параллельных клиентов")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=3.0, help="секунд прогрева, не входящих в отчет")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="готовая база вместо сгенерированной")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--products", type=int, default=5_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--save-baseline", metavar="PATH", help="сохранить отчет как baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="сравнить с сохраненным baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение (доля)")
+    args = parser.parse_args()
+
+    dataset = prepare(args)
+    runner = run_asgi if args.target == "asgi" else run_uvicorn
+    print(f"цель: {args.target}, клиентов: {args.concurrency}, замер: {args.seconds:.0f} с")
+    report = asyncio.run(runner(dataset, args))
+    report["target"] = args.target
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nbaseline сохранен: {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("target") != report["target"] or baseline.get("concurrency") != report["concurrency"]:
+            print(f"\nвнимание: baseline снят с другой целью или числом клиентов "
+                  f"({baseline.get('target')}, {baseline.get('concurrency')})")
+        regressions = compare(report, baseline, args.tolerance)
+        print(f"\nрегрессии относительно {args.baseline} (допуск {args.tolerance:.0%}):")
+        for line in regressions or ["нет"]:
+            print(f"  {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import os
+import tempfile
+
+# Тесты работают с отдельной временной базой, сборкой статики и файлом логов, переменные задаются до импорта приложения
+_db_dir = tempfile.mkdtemp(prefix="clothing_store_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ["STATIC_BUILD_DIR"] = os.path.join(_db_dir, "static")
+os.environ["LOG_FILE"] = os.path.join(_db_dir, "logs", "app.log")
+# События outbox обрабатываются сразу в запросе, чтобы статус заказов не менялся в фоне посреди теста
+os.environ["JOBS_ENABLED"] = "false"
+# Сводки продаж пополняются в тестах явным вызовом analytics.rollup.catch_up
+os.environ["ANALYTICS_ENABLED"] = "false"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database, models
+from app.cache import product_cache
+from app.main import app
+from app.pages import page_cache
+
+
+@pytest.fixture(scope="session", autouse=True)
+def setup_database():
+    """Создание таблиц один раз на сессию тестов"""
+    database.create_tables()
+    yield
+    database.engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def clean_tables():
+    """Очистка всех таблиц, кэша каталога и страниц товаров после каждого теста"""
+    product_cache.clear()
+    yield
+    product_cache.clear()
+    page_cache.products.clear()
+    with database.engine.begin() as conn:
+        for table in reversed(database.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+
+@pytest.fixture
+def db():
+    """Синхронная сессия базы данных"""
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    """HTTP клиент приложения"""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def make_product(db):
+    """Фабрика товаров для тестов"""
+    def _make_product(**overrides):
+        data = {
+            "name": "Футболка",
+            "description": "Хлопковая футболка",
+            "price": 1500.0,
+            "category": "Футболки",
+            "size": "M",
+            "color": "Белый",
+            "stock_quantity": 10,
+        }
+        data.update(overrides)
+        product = models.Product(**data)
+        db.add(product)
+        db.commit()
+        db.refresh(product)
+        return product
+    return _make_product
@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import database
+
+
+@contextmanager
+def count_queries(*engines):
+    """Сбор SQL-запросов внутри блока (по умолчанию синхронного и асинхронного движков)"""
+    engines = engines or (database.engine, database.async_engine.sync_engine)
+    statements = []
+
+    def listener(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", listener)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", listener)
+
+
+@contextmanager
+def assert_max_queries(limit: int, *engines):
+    """Проверка, что блок выполнил не больше limit SQL-запросов (ловит N+1 при загрузке связей)"""
+    with count_queries(*engines) as statements:
+        yield statements
+    assert len(statements) <= limit, f"{len(statements)} SQL-запросов вместо не более {limit}:\n" + "\n".join(statements)
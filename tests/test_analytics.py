@@ -0,0 +1,131 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import delete, update
+
+from app import analytics, crud, models, schemas
+
+
+@pytest.fixture
+def user(db):
+    db_user = models.User(email="buyer@example.com", first_name="Иван", last_name="Иванов", hashed_password="x")
+    db.add(db_user)
+    db.commit()
+    return db_user
+
+
+@pytest.fixture
+def rollup():
+    return analytics.SalesRollup()
+
+
+def place_order(db, user, created_at: datetime, *lines):
+    order = schemas.OrderCreate(products=[
+        schemas.OrderProduct(product_id=product.id, quantity=quantity) for product, quantity in lines
+    ])
+    db_order = crud.create_order(db, order, user_id=user.id)
+    db.execute(update(models.Order).where(models.Order.id == db_order.id).values(created_at=created_at))
+    db.commit()
+    return db_order
+
+
+@pytest.fixture
+def sales(db, user, make_product):
+    shirt = make_product(name="Футболка", price=1000.0, category="Футболки", stock_quantity=100)
+    jeans = make_product(name="Джинсы", price=3000.0, category="Джинсы", stock_quantity=100)
+    place_order(db, user, datetime(2024, 5, 1, 10, 15), (shirt, 2), (jeans, 1))
+    place_order(db, user, datetime(2024, 5, 1, 10, 45), (shirt, 1))
+    place_order(db, user, datetime(2024, 5, 1, 23, 59), (jeans, 2))
+    place_order(db, user, datetime(2024, 5, 2, 0, 5), (shirt, 5))
+    return shirt, jeans
+
+
+def test_rollups_match_orders(db, sales, rollup):
+    shirt, jeans = sales
+    assert rollup.catch_up(db) == 4
+    start, end = date(2024, 5, 1), date(2024, 5, 2)
+
+    assert analytics.get_revenue(db, start, end) == [
+        {"period": "2024-05-01", "orders": 3, "units": 6, "revenue": 12000.0},
+        {"period": "2024-05-02", "orders": 1, "units": 5, "revenue": 5000.0},
+    ]
+    assert analytics.get_revenue(db, start, start, "hour") == [
+        {"period": "2024-05-01T10:00:00", "orders": 2, "units": 4, "revenue": 6000.0},
+        {"period": "2024-05-01T23:00:00", "orders": 1, "units": 2, "revenue": 6000.0},
+    ]
+    assert analytics.get_category_sales(db, start, end) == [
+        {"category": "Джинсы", "units": 3, "revenue": 9000.0},
+        {"category": "Футболки", "units": 8, "revenue": 8000.0},
+    ]
+    top = analytics.get_top_products(db, start, end, by="units")
+    assert [(row["product_id"], row["name"], row["orders"], row["units"]) for row in top] == [
+        (shirt.id, "Футболка", 3, 8), (jeans.id, "Джинсы", 2, 3)]
+    assert analytics.get_top_products(db, date(2024, 5, 2), end, limit=5)[0]["revenue"] == 5000.0
+
+
+def test_watermark_counts_each_order_once(db, user, sales, rollup):
+    shirt, _ = sales
+    small_batches = analytics.SalesRollup(batch_size=3)
+    assert small_batches.run_once(db) == 3
+    assert rollup.catch_up(db) == 1
+    assert rollup.catch_up(db) == 0
+
+    place_order(db, user, datetime(2024, 5, 2, 12, 0), (shirt, 1))
+    assert rollup.catch_up(db) == 1
+    assert analytics.get_revenue(db, date(2024, 5, 2), date(2024, 5, 2)) == [
+        {"period": "2024-05-02", "orders": 2, "units": 6, "revenue": 6000.0}]
+    assert analytics.status(db)["pending_orders"] == 0
+
+
+def test_order_committed_after_later_ids_is_still_counted(db, user, sales, rollup):
+    shirt, _ = sales
+    late = place_order(db, user, datetime(2024, 5, 2, 12, 0), (shirt, 1))
+    # Заказ с меньшим id еще не зафиксирован, когда проход учитывает следующие за ним
+    db.execute(update(models.Order).where(models.Order.id == late.id).values(rolled_up=True))
+    db.commit()
+    assert rollup.catch_up(db) == 4
+    db.execute(update(models.Order).where(models.Order.id == late.id).values(rolled_up=False))
+    db.commit()
+    assert analytics.status(db)["pending_orders"] == 1
+    updated_at = db.get(models.Order, late.id).updated_at
+
+    assert rollup.catch_up(db) == 1
+    assert analytics.get_revenue(db, date(2024, 5, 2), date(2024, 5, 2)) == [
+        {"period": "2024-05-02", "orders": 2, "units": 6, "revenue": 6000.0}]
+    assert analytics.status(db)["last_order_id"] == late.id
+    db.expire_all()
+    assert db.get(models.Order, late.id).updated_at == updated_at
+
+
+def test_analytics_endpoints(client, db, sales):
+    analytics.rollup.catch_up()
+    period = {"start": "2024-05-01", "end": "2024-05-02"}
+
+    revenue = client.get("/api/analytics/revenue", params=period)
+    categories = client.get("/api/analytics/categories", params=period)
+    top = client.get("/api/analytics/top-products", params={**period, "limit": 1})
+    status = client.get("/api/analytics/status")
+
+    assert [row["revenue"] for row in revenue.json()] == [12000.0, 5000.0]
+    assert [row["category"] for row in categories.json()] == ["Джинсы", "Футболки"]
+    assert [row["name"] for row in top.json()] == ["Джинсы"]
+    assert status.json()["pending_orders"] == 0
+    assert client.get("/api/analytics/revenue", params={**period, "granularity": "week"}).status_code == 400
+    assert client.get("/api/analytics/revenue", params={"start": "2024-05-02", "end": "2024-05-01"}).status_code == 400
+    assert client.get("/api/analytics/top-products", params={"by": "profit"}).status_code == 400
+    long_period = {"start": "2024-01-01", "end": "2024-05-02"}
+    assert client.get("/api/analytics/top-products", params=long_period).status_code == 400
+    assert client.get("/api/analytics/categories", params=long_period).status_code == 200
+
+
+def test_category_rollup_is_filled_from_product_rollup(db, sales, rollup):
+    rollup.catch_up(db)
+    start, end = date(2024, 5, 1), date(2024, 5, 2)
+    expected = analytics.get_category_sales(db, start, end)
+    # База, где дневная сводка по товарам появилась раньше сводки по категориям
+    db.execute(delete(analytics.category_daily))
+    db.commit()
+
+    assert analytics.ensure_category_rollup(db)
+    assert not analytics.ensure_category_rollup(db)
+    assert analytics.get_category_sales(db, start, end) == expected
@@ -0,0 +1,73 @@
+import gzip
+import os
+import re
+
+from app import assets
+from app.assets import AssetManifest, manifest
+
+
+def asset_urls(html: str):
+    return re.findall(r'(?:src|href)="(/static/[^"]+)"', html)
+
+
+def test_build_writes_hashed_files_and_compressed_siblings(tmp_path):
+    source = tmp_path / "src"
+    (source / "js").mkdir(parents=True)
+    (source / "js" / "app.js").write_text("console.log('привет');\n" * 100)
+    (source / "logo.png").write_bytes(b"\x89PNG" + bytes(2000))
+
+    built = AssetManifest(str(source), str(tmp_path / "build")).build()
+
+    script = built.assets["js/app.js"]
+    assert re.fullmatch(r"js/app\.[0-9a-f]{10}\.js", script.hashed_path)
+    assert "gzip" in script.encodings
+    with open(built.file(script, "gzip"), "rb") as f:
+        assert gzip.decompress(f.read()) == (source / "js" / "app.js").read_bytes()
+    # Картинки только получают хэш в имени
+    assert built.assets["logo.png"].encodings == ()
+    assert built.url("js/app.js") == f"/static/{script.hashed_path}"
+    assert built.url("missing.css") == "/static/missing.css"
+
+    # Повторная сборка ничего не пишет, измененный файл получает новый адрес
+    mtime = os.path.getmtime(built.file(script, "identity"))
+    (source / "logo.png").write_bytes(b"\x89PNG" + bytes(3000))
+    rebuilt = AssetManifest(str(source), str(tmp_path / "build")).build()
+    assert rebuilt.assets["js/app.js"].hashed_path == script.hashed_path
+    assert os.path.getmtime(rebuilt.file(script, "identity")) == mtime
+    assert rebuilt.assets["logo.png"].hashed_path != built.assets["logo.png"].hashed_path
+
+
+def test_pages_reference_fingerprinted_assets(client):
+    urls = asset_urls(client.get("/").text)
+
+    assert manifest.url("css/style.css") in urls
+    assert manifest.url("js/main.js") in urls
+    assert all(url in {manifest.url(path) for path in manifest.assets} for url in urls)
+    assert "/static/css/style.css" not in urls
+
+
+def test_fingerprinted_asset_is_served_precompressed_and_immutable(client):
+    url = manifest.url("css/style.css")
+    with open(os.path.join(assets.static_dir, "css", "style.css"), "rb") as f:
+        source = f.read()
+
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+
+    assert compressed.status_code == plain.status_code == 200
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert int(compressed.headers["content-length"]) < len(source) / 2
+    assert compressed.content == plain.content == source
+    assert compressed.headers["content-type"].startswith("text/css")
+    assert compressed.headers["cache-control"] == assets.IMMUTABLE_CACHE_CONTROL
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert "content-encoding" not in plain.headers
+
+
+def test_unhashed_static_paths_are_revalidated(client):
+    response = client.get("/static/images/placeholder.jpg")
+
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == assets.REVALIDATE_CACHE_CONTROL
+    again = client.get("/static/images/placeholder.jpg", headers={"If-None-Match": response.headers["etag"]})
+    assert again.status_code == 304
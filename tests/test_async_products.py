@@ -0,0 +1,50 @@
+import asyncio
+
+from app import async_crud, database, main
+
+
+def test_products_api_uses_async_session(client, make_product):
+    make_product(name="Джинсы", price=3500.0, category="Джинсы")
+    make_product(name="Куртка", price=8000.0, category="Куртки")
+    make_product(name="Футболка", price=1500.0, category="Футболки")
+
+    response = client.get("/api/products", params={"sort": "price_desc"})
+
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json()] == ["Куртка", "Джинсы", "Футболка"]
+
+
+def test_products_api_filters_by_category(client, make_product):
+    make_product(name="Джинсы", category="Джинсы")
+    make_product(name="Куртка", category="Куртки")
+
+    response = client.get("/api/products", params={"category": "Куртки"})
+
+    assert [p["name"] for p in response.json()] == ["Куртка"]
+
+
+def test_product_api_returns_404_for_missing_product(client):
+    response = client.get("/api/products/999")
+
+    assert response.status_code == 404
+
+
+def test_async_crud_get_product(make_product):
+    product = make_product()
+
+    async def load():
+        async with database.AsyncSessionLocal() as session:
+            return await async_crud.get_product(session, product.id)
+
+    loaded = asyncio.run(load())
+
+    assert loaded.id == product.id
+    assert loaded.name == product.name
+
+
+def test_seed_endpoint_runs_outside_event_loop(client):
+    # Синхронная сессия: обработчик должен выполняться в пуле потоков, а не в цикле событий
+    assert not asyncio.iscoroutinefunction(main.seed_database)
+
+    assert client.post("/api/seed").json()["message"] != "База данных уже заполнена"
+    assert client.post("/api/seed").json() == {"message": "База данных уже заполнена"}
@@ -0,0 +1,110 @@
+import io
+import json
+
+import pytest
+
+from app import crud, models
+from app.bulk import read_csv, read_ndjson
+
+CSV_HEADER = "name,description,price,category,size,color,stock_quantity\n"
+
+
+def upload(client, content: bytes, filename: str, **params):
+    return client.post("/products/import", params=params, files={"file": (filename, content)})
+
+
+def test_csv_import_reports_invalid_rows_with_line_numbers(client, db):
+    content = (
+        CSV_HEADER
+        + 'Футболка,"Хлопок, ""белая""\nс принтом",1500,Футболки,M,Белый,5\n'
+        + ",Без названия,-1,Футболки,M,Белый,1\n"
+        + "Джинсы,,3500,Джинсы,32,Синий,много\n"
+        + "Куртка,,8000,Куртки,L,Черный,2\n"
+    ).encode()
+
+    response = upload(client, content, "products.csv")
+
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["imported"], report["failed"]) == (2, 2)
+    assert report["errors"][0]["line"] == 4
+    assert {error["field"] for error in report["errors"][0]["errors"]} == {"name", "price"}
+    assert report["errors"][1]["line"] == 5
+    assert [error["field"] for error in report["errors"][1]["errors"]] == ["stock_quantity"]
+    products = db.query(models.Product).order_by(models.Product.id).all()
+    assert [p.name for p in products] == ["Футболка", "Куртка"]
+    assert products[0].description == 'Хлопок, "белая"\nс принтом'
+    assert products[1].description is None
+
+
+def test_ndjson_import_skips_malformed_lines(client, db):
+    good = {"name": "Платье", "price": 4200, "category": "Платья", "size": "S", "color": "Красный",
+            "stock_quantity": 3}
+    content = "\n".join([json.dumps(good, ensure_ascii=False), "[1, 2]", "{не json", "", json.dumps(good)])
+
+    report = upload(client, content.encode(), "products.ndjson").json()
+
+    assert (report["imported"], report["failed"]) == (2, 2)
+    assert [error["line"] for error in report["errors"]] == [2, 3]
+    assert db.query(models.Product).count() == 2
+
+
+def test_import_validates_and_commits_in_chunks(db):
+    lines = [CSV_HEADER] + [
+        f"Товар {i},,{0 if i % 3 == 0 else 100 + i},Футболки,M,Белый,1\n" for i in range(1, 11)
+    ]
+
+    report = crud.import_products(db, read_csv(io.BytesIO("".join(lines).encode())), chunk_size=4)
+
+    assert (report["imported"], report["failed"]) == (7, 3)
+    assert [error["line"] for error in report["errors"]] == [4, 7, 10]
+    assert db.query(models.Product).count() == 7
+
+
+@pytest.mark.parametrize("filename, params", [
+    ("products.xlsx", {}),
+    ("products.csv", {"format": "xml"}),
+])
+def test_import_rejects_unknown_format(client, filename, params):
+    assert upload(client, CSV_HEADER.encode(), filename, **params).status_code == 400
+
+
+def test_import_rejects_non_utf8_file(client):
+    content = (CSV_HEADER + "Футболка,,1500,Футболки,M,Белый,5\n").encode("cp1251")
+    assert upload(client, content, "products.csv").status_code == 400
+
+
+@pytest.mark.parametrize("format", ["csv", "ndjson"])
+def test_export_round_trips_through_import(client, db, make_product, format):
+    make_product(name="Футболка, белая", description='С "кавычками"\nи переносом')
+    make_product(name="Джинсы", description=None, category="Джинсы", price=3500.0)
+
+    response = client.get("/products/export", params={"format": format})
+
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == f'attachment; filename="products.{format}"'
+    exported = [(p.name, p.description, p.price, p.category) for p in db.query(models.Product).order_by("id")]
+
+    db.query(models.Product).delete()
+    db.commit()
+    reader = read_csv if format == "csv" else read_ndjson
+    report = crud.import_products(db, reader(io.BytesIO(response.content)))
+
+    assert (report["imported"], report["failed"]) == (2, 0)
+    imported = [(p.name, p.description, p.price, p.category) for p in db.query(models.Product).order_by("id")]
+    assert imported == exported
+
+
+def test_export_rejects_unknown_format(client):
+    assert client.get("/products/export", params={"format": "xml"}).status_code == 400
+
+
+def test_import_invalidates_cached_listings_and_search(client, make_product):
+    make_product(name="Футболка базовая", category="Футболки")
+    assert len(client.get("/api/products", params={"category": "Футболки"}).json()) == 1
+    assert client.get("/api/products/search", params={"q": "поло"}).json()["total"] == 0
+
+    upload(client, (CSV_HEADER + "Футболка поло,,2500,Футболки,L,Синий,4\n").encode(), "products.csv")
+
+    assert len(client.get("/api/products", params={"category": "Футболки"}).json()) == 2
+    assert client.get("/api/products/search", params={"q": "поло"}).json()["total"] == 1
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app import cache as cache_module, crud, database, models, schemas
+from app.cache import MemoryBackend, ProductCache, RedisBackend, TTLCache, product_cache
+
+from .queries import count_queries
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Минимальная замена клиента Redis внутри процесса (TTL не моделируется)"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return False
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, b"0")) + 1).encode()
+
+    def pipeline(self):
+        client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def incr(self, key):
+                self.calls.append(key)
+
+            def execute(self):
+                for key in self.calls:
+                    client.incr(key)
+
+        return Pipeline()
+
+    def flushdb(self):
+        self.data.clear()
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+
+    clock.now = 4.9
+    assert cache.get("a") == 1
+    clock.now = 5.0
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    return MemoryBackend() if request.param == "memory" else RedisBackend(FakeRedis())
+
+
+def test_invalidation_changes_only_affected_keys(backend):
+    cache = ProductCache(backend)
+    product_key = cache.product_key(1)
+    other_key = cache.product_key(2)
+    jeans_key = cache.listing_key("Джинсы", "id", 0, 100)
+    coats_key = cache.listing_key("Куртки", "id", 0, 100)
+    all_key = cache.listing_key(None, "id", 0, 100)
+
+    cache.invalidate(product_ids=[1], categories=["Джинсы"])
+
+    assert cache.product_key(1) != product_key
+    assert cache.listing_key("Джинсы", "id", 0, 100) != jeans_key
+    assert cache.listing_key(None, "id", 0, 100) != all_key
+    assert cache.product_key(2) == other_key
+    assert cache.listing_key("Куртки", "id", 0, 100) == coats_key
+
+
+def test_workers_sharing_redis_see_each_others_invalidations():
+    client = FakeRedis()
+    worker_a, worker_b = ProductCache(RedisBackend(client)), ProductCache(RedisBackend(client))
+    worker_a.set(worker_a.product_key(1), b'{"id": 1}')
+
+    assert worker_b.get(worker_b.product_key(1)) == b'{"id": 1}'
+
+    worker_b.invalidate(product_ids=[1])
+
+    assert worker_a.get(worker_a.product_key(1)) is None
+
+
+def test_repeat_product_reads_skip_database(client, make_product):
+    product = make_product()
+
+    with count_queries(database.async_engine.sync_engine) as statements:
+        first = client.get(f"/api/products/{product.id}")
+        queries_after_first = len(statements)
+        second = client.get(f"/api/products/{product.id}")
+
+    assert first.json() == second.json() == json.loads(crud.product_json(product))
+    assert queries_after_first > 0
+    assert len(statements) == queries_after_first
+    assert client.get("/api/cache/stats").json()["hits"] >= 1
+
+
+def test_create_product_invalidates_matching_listings(db, make_product):
+    make_product(category="Джинсы")
+    make_product(category="Куртки")
+    coats = crud.get_products_json(db, category="Куртки")
+    assert len(json.loads(crud.get_products_json(db, category="Джинсы"))) == 1
+    assert len(json.loads(crud.get_products_json(db))) == 2
+
+    crud.create_product(db, schemas.ProductCreate(
+        name="Джинсы новые", price=3000.0, category="Джинсы", size="32", color="Синий", stock_quantity=3
+    ))
+
+    assert product_cache.get(crud.products_cache_key(0, 100, "Куртки", None)) == coats
+    assert len(json.loads(crud.get_products_json(db, category="Джинсы"))) == 2
+    assert len(json.loads(crud.get_products_json(db))) == 3
+
+
+def test_order_invalidates_stock_of_ordered_products(db, make_product):
+    user = models.User(email="buyer@example.com", first_name="Иван", last_name="Иванов", hashed_password="x")
+    db.add(user)
+    db.commit()
+    ordered = make_product(stock_quantity=5)
+    other = make_product(name="Другой", stock_quantity=7)
+    crud.get_product_json(db, ordered.id)
+    other_json = crud.get_product_json(db, other.id)
+
+    crud.create_order(db, schemas.OrderCreate(products=[{"product_id": ordered.id, "quantity": 2}]), user.id)
+
+    assert product_cache.get(product_cache.product_key(other.id)) == other_json
+    assert json.loads(crud.get_product_json(db, ordered.id))["stock_quantity"] == 3
+
+
+def test_async_calls_to_network_backend_run_off_the_event_loop():
+    class RecordingRedis(FakeRedis):
+        def get(self, key):
+            threads.append(threading.current_thread())
+            return super().get(key)
+
+    threads = []
+    cache = ProductCache(RedisBackend(RecordingRedis()))
+    memory = ProductCache(MemoryBackend())
+
+    async def read(target):
+        key = await target.call(target.product_key, 1)
+        await target.call(target.set, key, b"{}")
+        return await target.call(target.get, key), threading.current_thread()
+
+    value, loop_thread = asyncio.run(read(cache))
+    assert value == b"{}"
+    assert threads and loop_thread not in threads
+    assert asyncio.run(read(memory))[0] == b"{}"
+
+
+class BrokenRedis:
+    """Клиент Redis, у которого каждая команда падает, как при недоступном сервере"""
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError("Redis недоступен")
+        return fail
+
+
+def test_unavailable_redis_falls_back_to_database(monkeypatch, client, db, make_product):
+    monkeypatch.setattr(cache_module, "BACKEND_ERRORS", (ConnectionError,))
+    monkeypatch.setattr(product_cache, "backend", RedisBackend(BrokenRedis()))
+    user = models.User(email="buyer@example.com", first_name="Иван", last_name="Иванов", hashed_password="x")
+    db.add(user)
+    db.commit()
+    product = make_product(stock_quantity=5)
+
+    first = client.get(f"/api/products/{product.id}")
+    assert first.status_code == 200
+    # Одноразовая версия: ETag из прошлого ответа не дает 304
+    assert client.get(f"/api/products/{product.id}", headers={"If-None-Match": first.headers["etag"]}).status_code == 200
+    assert client.get("/api/products", params={"category": "Футболки"}).status_code == 200
+    assert client.get("/api/products/search", params={"q": "футболка"}).status_code == 200
+
+    order = client.post("/orders/", params={"user_id": user.id},
+                        json={"products": [{"product_id": product.id, "quantity": 2}]})
+    assert order.status_code == 201
+    assert client.get(f"/api/products/{product.id}").json()["stock_quantity"] == 3
+
+
+def test_memory_versions_are_bounded_and_never_reused():
+    backend = MemoryBackend(maxsize=2)
+    cache = ProductCache(backend)
+    old_key = cache.product_key(1)
+    cache.set(old_key, b"old")
+    for product_id in range(2, 10):
+        cache.product_key(product_id)
+
+    assert backend.stats()["versions"] == 2
+    # Версия товара 1 вытеснена: новая не совпадает со старой, даже если старая запись жива
+    assert cache.product_key(1) != old_key
@@ -0,0 +1,149 @@
+import threading
+
+import pytest
+from sqlalchemy import select
+
+from app import crud, database, models
+from .queries import count_queries
+
+
+@pytest.fixture
+def buyer(db):
+    user = models.User(email="buyer@example.com", first_name="Иван", last_name="Иванов", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def add(client, product_id, quantity=1, user_id=1):
+    return client.post("/api/cart/items", params={"user_id": user_id},
+                       json={"product_id": product_id, "quantity": quantity})
+
+
+def test_cart_items_are_stored_on_server(client, buyer, make_product):
+    shirt = make_product(name="Футболка", price=1500.0, stock_quantity=5)
+    jeans = make_product(name="Джинсы", price=3000.0, stock_quantity=2)
+
+    add(client, shirt.id)
+    add(client, shirt.id, 2)
+    response = add(client, jeans.id)
+
+    assert response.status_code == 200
+    cart = client.get("/api/cart", params={"user_id": buyer}).json()
+    assert [(item["name"], item["quantity"], item["status"]) for item in cart["items"]] == [
+        ("Футболка", 3, "ok"), ("Джинсы", 1, "ok"),
+    ]
+    assert (cart["total_items"], cart["total_amount"], cart["valid"]) == (4, 7500.0, True)
+
+    cart = client.put(f"/api/cart/items/{shirt.id}", params={"user_id": buyer}, json={"quantity": 1}).json()
+    assert cart["items"][0]["quantity"] == 1
+    cart = client.delete(f"/api/cart/items/{jeans.id}", params={"user_id": buyer}).json()
+    assert [item["product_id"] for item in cart["items"]] == [shirt.id]
+
+    assert client.delete("/api/cart", params={"user_id": buyer}).status_code == 204
+    assert client.get("/api/cart", params={"user_id": buyer}).json()["items"] == []
+
+
+def test_adding_more_than_stock_is_rejected(client, buyer, make_product):
+    product = make_product(name="Куртка", stock_quantity=2)
+    add(client, product.id, 2)
+
+    response = add(client, product.id)
+
+    assert response.status_code == 400
+    assert "Недостаточно товара Куртка" in response.json()["detail"]
+    assert add(client, 999999).status_code == 400
+    assert client.get("/api/cart").json()["items"][0]["quantity"] == 2
+
+
+def test_validate_checks_all_lines_in_one_query(client, db, buyer, make_product):
+    products = [make_product(name=f"Товар {i}", price=1000.0, stock_quantity=3) for i in range(5)]
+    product_ids = [product.id for product in products]
+    for product_id in product_ids:
+        add(client, product_id, 2)
+    db.query(models.Product).filter(models.Product.id == product_ids[0]).update({"price": 1200.0})
+    db.query(models.Product).filter(models.Product.id == product_ids[1]).update({"stock_quantity": 1})
+    db.commit()
+
+    with count_queries() as statements:
+        cart = client.post("/api/cart/validate", params={"user_id": buyer}).json()
+
+    assert len([sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]) == 1
+    assert [item["status"] for item in cart["items"]] == ["price_changed", "insufficient_stock", "ok", "ok", "ok"]
+    assert cart["items"][0]["unit_price"] == 1000.0
+    assert cart["items"][0]["price"] == 1200.0
+    assert cart["valid"] is False
+    # Новая цена зафиксирована в корзине после проверки
+    assert client.get("/api/cart").json()["items"][0]["status"] == "ok"
+
+
+def test_checkout_creates_order_and_empties_cart(client, db, buyer, make_product):
+    shirt = make_product(name="Футболка", price=1500.0, stock_quantity=5)
+    add(client, shirt.id, 2)
+
+    response = client.post("/api/cart/checkout", params={"user_id": buyer})
+
+    assert response.status_code == 201
+    order = response.json()
+    assert order["total_amount"] == 3000.0
+    assert [(item["product_id"], item["quantity"]) for item in order["products"]] == [(shirt.id, 2)]
+    assert client.get("/api/cart").json()["items"] == []
+    db.expire_all()
+    assert db.get(models.Product, shirt.id).stock_quantity == 3
+    assert client.post("/api/cart/checkout", params={"user_id": buyer}).status_code == 400
+
+
+def test_checkout_of_changed_cart_returns_current_cart(client, db, buyer, make_product):
+    product = make_product(price=1500.0, stock_quantity=5)
+    add(client, product.id)
+    db.query(models.Product).filter(models.Product.id == product.id).update({"price": 1700.0})
+    db.commit()
+
+    response = client.post("/api/cart/checkout", params={"user_id": buyer})
+
+    assert response.status_code == 409
+    assert response.json()["detail"]["items"][0]["status"] == "price_changed"
+    assert db.execute(select(models.Order)).first() is None
+
+
+def test_failed_checkout_keeps_cart(client, db, buyer, make_product, monkeypatch):
+    product = make_product(name="Платье", stock_quantity=2)
+    add(client, product.id, 2)
+    get_cart = crud.get_cart
+
+    def stale_cart(db_session, user_id):
+        # Остаток уменьшился между проверкой корзины и списанием при оформлении
+        cart = get_cart(db_session, user_id)
+        db_session.query(models.Product).filter(models.Product.id == product.id).update({"stock_quantity": 1})
+        return cart
+
+    monkeypatch.setattr(crud, "get_cart", stale_cart)
+    response = client.post("/api/cart/checkout", params={"user_id": buyer})
+    monkeypatch.undo()
+
+    assert response.status_code == 400
+    assert "Недостаточно товара Платье" in response.json()["detail"]
+    assert client.get("/api/cart").json()["items"][0]["quantity"] == 2
+    assert db.execute(select(models.Order)).first() is None
+
+
+def test_concurrent_adds_of_the_same_product_are_all_counted(buyer, make_product):
+    product = make_product(stock_quantity=100)
+    errors = []
+
+    def add_one():
+        with database.SessionLocal() as session:
+            try:
+                crud.set_cart_item(session, buyer, product.id, 1, add=True)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=add_one) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with database.SessionLocal() as session:
+        assert crud.get_cart(session, buyer).items[0].quantity == 8
@@ -0,0 +1,89 @@
+import io
+
+import pytest
+from sqlalchemy import update
+
+from app import category_stats, crud, models, schemas
+from app.bulk import read_csv
+
+CSV_HEADER = "name,description,price,category,size,color,stock_quantity\n"
+
+
+@pytest.fixture
+def user(db):
+    db_user = models.User(email="buyer@example.com", first_name="Иван", last_name="Иванов", hashed_password="x")
+    db.add(db_user)
+    db.commit()
+    return db_user
+
+
+def new_product(category: str, price: float, stock: int) -> schemas.ProductCreate:
+    return schemas.ProductCreate(name=f"{category} {price}", price=price, category=category, size="M",
+                                 color="Белый", stock_quantity=stock)
+
+
+def buy(db, user, product_id: int, quantity: int):
+    order = schemas.OrderCreate(products=[schemas.OrderProduct(product_id=product_id, quantity=quantity)])
+    return crud.create_order(db, order, user_id=user.id)
+
+
+def assert_consistent(db):
+    """Сводка совпадает с полным агрегатом по products"""
+    expected = [dict(row) for row in db.execute(category_stats.aggregate_query()).mappings()]
+    for row in expected:
+        row["avg_price"] = row.pop("price_sum") / row["product_count"]
+    actual = crud.get_category_stats(db)
+    assert [row["category"] for row in actual] == [row["category"] for row in expected]
+    for got, want in zip(actual, expected):
+        assert got == pytest.approx(want)
+
+
+def test_summary_is_maintained_by_products_orders_and_import(db, user):
+    shirt = crud.create_product(db, new_product("Футболки", 1500.0, 2))
+    crud.create_product(db, new_product("Футболки", 900.0, 0))
+    jeans = crud.create_product(db, new_product("Джинсы", 4000.0, 1))
+    crud.create_product(db, new_product("Куртки", 7000.0, 3))
+    assert_consistent(db)
+
+    buy(db, user, shirt.id, 1)
+    assert_consistent(db)
+    buy(db, user, shirt.id, 1)  # последний экземпляр: товар больше не в наличии
+    buy(db, user, jeans.id, 1)
+    with pytest.raises(ValueError):
+        buy(db, user, jeans.id, 1)
+    assert_consistent(db)
+
+    lines = [CSV_HEADER, "Платье,,5000,Платья,S,Красный,0\n", "Футболка,,300,Футболки,L,Черный,5\n",
+             "Ошибка,,-1,Платья,S,Красный,1\n"]
+    crud.import_products(db, read_csv(io.BytesIO("".join(lines).encode())), chunk_size=2)
+    assert_consistent(db)
+
+    stats = {row["category"]: row for row in crud.get_category_stats(db)}
+    assert stats["Футболки"] == pytest.approx({"category": "Футболки", "product_count": 3, "in_stock_count": 1,
+                                              "min_price": 300.0, "max_price": 1500.0, "avg_price": 900.0})
+    assert stats["Джинсы"]["in_stock_count"] == 0
+
+
+def test_rebuild_fixes_drift_and_fills_empty_summary(db, make_product):
+    make_product(category="Футболки", price=1000.0, stock_quantity=0)  # в обход crud
+    assert crud.get_category_stats(db) == []
+
+    assert category_stats.ensure_built(db) is True
+    assert category_stats.ensure_built(db) is False
+    assert_consistent(db)
+
+    db.execute(update(models.CategoryStats).values(product_count=42))
+    db.commit()
+    assert category_stats.rebuild(db) == 1
+    assert_consistent(db)
+
+
+def test_categories_endpoint(client, db):
+    crud.create_product(db, new_product("Футболки", 1000.0, 1))
+    crud.create_product(db, new_product("Футболки", 2000.0, 0))
+
+    response = client.get("/api/categories")
+
+    assert response.status_code == 200
+    assert response.json() == [{"category": "Футболки", "product_count": 2, "in_stock_count": 1,
+                                "min_price": 1000.0, "max_price": 2000.0, "avg_price": 1500.0}]
@@ -0,0 +1,69 @@
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+from app import crud, database, models, schemas
+from app.cache import product_cache
+
+from .queries import count_queries
+
+
+def test_product_response_has_validators(client, make_product):
+    product = make_product()
+
+    response = client.get(f"/api/products/{product.id}")
+
+    assert response.headers["etag"]
+    assert response.headers["last-modified"].endswith("GMT")
+    assert "no-cache" in response.headers["cache-control"]
+    assert response.json()["updated_at"] is not None
+
+
+def test_repeat_requests_save_bytes_and_queries(client, make_product):
+    products = [make_product(name=f"Товар {i}") for i in range(20)]
+    paths = ["/api/products"] + [f"/api/products/{p.id}" for p in products[:5]]
+
+    first = {path: client.get(path) for path in paths}
+    # Холодный кэш каталога: 304 должен отдаваться по версии, без загрузки товаров
+    product_cache.backend.store.clear()
+
+    with count_queries(database.async_engine.sync_engine) as statements:
+        repeat = {path: client.get(path, headers={"If-None-Match": first[path].headers["etag"]}) for path in paths}
+
+    full_bytes = sum(len(r.content) for r in first.values())
+    repeat_bytes = sum(len(r.content) for r in repeat.values())
+
+    assert all(r.status_code == 304 for r in repeat.values())
+    assert full_bytes > 0
+    assert repeat_bytes == 0
+    assert statements == []
+
+
+def test_order_changes_etag_of_ordered_product_only(client, db, make_product):
+    db.add(models.User(email="buyer@example.com", first_name="Иван", last_name="Иванов", hashed_password="x"))
+    db.commit()
+    ordered, other = make_product(stock_quantity=5), make_product(name="Другой", category="Куртки")
+    ordered_etag = client.get(f"/api/products/{ordered.id}").headers["etag"]
+    other_etag = client.get(f"/api/products/{other.id}").headers["etag"]
+    coats_etag = client.get("/api/products", params={"category": "Куртки"}).headers["etag"]
+
+    crud.create_order(db, schemas.OrderCreate(products=[{"product_id": ordered.id, "quantity": 1}]), user_id=1)
+
+    changed = client.get(f"/api/products/{ordered.id}", headers={"If-None-Match": ordered_etag})
+    assert changed.status_code == 200
+    assert changed.json()["stock_quantity"] == 4
+    assert client.get(f"/api/products/{other.id}", headers={"If-None-Match": other_etag}).status_code == 304
+    coats = client.get("/api/products", params={"category": "Куртки"}, headers={"If-None-Match": coats_etag})
+    assert coats.status_code == 304
+
+
+def test_if_modified_since(client, make_product):
+    product = make_product()
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(days=1), usegmt=True)
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(days=1), usegmt=True)
+
+    assert client.get(f"/api/products/{product.id}", headers={"If-Modified-Since": future}).status_code == 304
+    assert client.get(f"/api/products/{product.id}", headers={"If-Modified-Since": past}).status_code == 200
+
+
+def test_conditional_get_for_missing_product_is_404(client):
+    assert client.get("/api/products/999", headers={"If-None-Match": '"nope"'}).status_code == 404
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import threading
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import QueuePool
+
+from app import database
+
+
+def test_sqlite_connections_use_wal_and_busy_timeout(db):
+    connection = db.connection()
+
+    assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+    assert connection.execute(text("PRAGMA busy_timeout")).scalar() == database.SQLITE_BUSY_TIMEOUT
+
+
+def test_async_connections_get_the_same_pragmas():
+    async def pragmas():
+        async with database.async_engine.connect() as connection:
+            return [(await connection.execute(text(f"PRAGMA {name}"))).scalar() for name in ("synchronous", "busy_timeout")]
+
+    assert asyncio.run(pragmas()) == [1, database.SQLITE_BUSY_TIMEOUT]
+
+
+def test_engines_use_configured_pool():
+    for engine in (database.engine, database.async_engine.sync_engine):
+        assert isinstance(engine.pool, database.TimedPoolMixin)
+        assert engine.pool.size() == database.DB_POOL_SIZE
+        assert engine.pool._max_overflow == database.DB_MAX_OVERFLOW
+
+
+def test_in_memory_sqlite_keeps_default_pool():
+    options = database._engine_options("sqlite://", QueuePool)
+    assert options == {"connect_args": {"check_same_thread": False}}
+
+    options = database._engine_options("postgresql://user@db/shop", QueuePool)
+    assert "connect_args" not in options
+    assert options["pool_pre_ping"] == database.DB_POOL_PRE_PING
+
+
+@pytest.fixture
+def tiny_engine(tmp_path):
+    """Движок с пулом на одно соединение, чтобы воспроизвести ожидание и таймаут"""
+    pool_class = database._timed_pool(QueuePool)
+    engine = create_engine(f"sqlite:///{os.path.join(tmp_path, 'pool.db')}", poolclass=pool_class,
+                           pool_size=1, max_overflow=0, pool_timeout=0.2)
+    yield engine
+    engine.dispose()
+
+
+def test_pool_metrics_count_waits_and_timeouts(tiny_engine):
+    held = tiny_engine.connect()
+    stats = database.pool_stats(tiny_engine)
+    assert (stats["checked_out"], stats["checked_in"], stats["overflow"]) == (1, 0, 0)
+
+    with pytest.raises(exc.TimeoutError):
+        tiny_engine.connect()
+
+    threading.Timer(0.1, held.close).start()
+    with tiny_engine.connect():
+        pass
+
+    stats = database.pool_stats(tiny_engine)
+    assert stats["checkouts"] == 3
+    assert stats["timeouts"] == 1
+    assert stats["wait_seconds_max"] >= 0.09
+    assert stats["wait_seconds_total"] >= 0.2 + 0.09
+
+
+def test_pool_metrics_survive_dispose(tiny_engine):
+    with tiny_engine.connect():
+        pass
+    tiny_engine.dispose()
+
+    assert database.pool_stats(tiny_engine)["checkouts"] == 1
+
+
+def test_pool_stats_endpoint(client, db):
+    db.connection()
+
+    stats = client.get("/api/db/pool").json()
+
+    assert stats["sync"]["checked_out"] >= 1
+    assert stats["sync"]["size"] == database.DB_POOL_SIZE
+    assert set(stats["async"]) >= {"checked_out", "overflow", "checkouts", "wait_seconds_max", "timeouts"}
@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+
+from app import crud, database, idempotency, models, schemas
+from tests.queries import count_queries
+
+
+@pytest.fixture
+def user(db):
+    db_user = models.User(email="buyer@example.com", first_name="Иван", last_name="Иванов", hashed_password="x")
+    db.add(db_user)
+    db.commit()
+    return db_user
+
+
+def order_body(product_id: int, quantity: int = 1) -> dict:
+    return {"products": [{"product_id": product_id, "quantity": quantity}]}
+
+
+def post_order(client, user, body, key):
+    return client.post("/orders/", params={"user_id": user.id}, json=body, headers={"Idempotency-Key": key})
+
+
+def test_retry_with_same_key_replays_stored_order(client, db, user, make_product):
+    product = make_product(stock_quantity=5)
+
+    first = post_order(client, user, order_body(product.id, 2), "checkout-1")
+    with count_queries() as statements:
+        retry = post_order(client, user, order_body(product.id, 2), "checkout-1")
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert not [sql for sql in statements if "products" in sql]  # повтор не трогает товары
+    db.expire_all()
+    assert db.get(models.Product, product.id).stock_quantity == 3
+    assert db.query(models.Order).count() == 1
+
+    # Другой ключ — новый заказ
+    assert post_order(client, user, order_body(product.id, 2), "checkout-2").json()["id"] != first.json()["id"]
+
+
+def test_key_reused_with_different_order_is_rejected(client, user, make_product):
+    product = make_product(stock_quantity=5)
+
+    assert post_order(client, user, order_body(product.id, 1), "checkout-1").status_code == 201
+    response = post_order(client, user, order_body(product.id, 3), "checkout-1")
+
+    assert response.status_code == 422
+    assert "другим заказом" in response.json()["detail"]
+
+
+def test_failed_order_releases_key(client, db, user, make_product):
+    product = make_product(stock_quantity=1)
+
+    assert post_order(client, user, order_body(product.id, 2), "checkout-1").status_code == 400
+    assert db.query(models.IdempotencyKey).count() == 0
+
+    product.stock_quantity = 2
+    db.commit()
+    response = post_order(client, user, order_body(product.id, 2), "checkout-1")
+    assert response.status_code == 201
+    assert "idempotent-replayed" not in response.headers
+
+
+def test_concurrent_duplicates_wait_for_first_request(db, user, make_product, monkeypatch):
+    product = make_product(stock_quantity=10)
+    order = schemas.OrderCreate(**order_body(product.id))
+    create_order = crud.create_order
+
+    def slow_create_order(*args, **kwargs):
+        time.sleep(0.2)  # повторы успевают прийти, пока первый запрос не завершен
+        return create_order(*args, **kwargs)
+
+    monkeypatch.setattr(crud, "create_order", slow_create_order)
+    clients = 8
+    barrier = threading.Barrier(clients)
+    results = []
+    lock = threading.Lock()
+
+    def checkout():
+        with database.SessionLocal() as session:
+            barrier.wait()
+            result = crud.create_order_idempotent(session, order, user.id, "checkout-1")
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=checkout) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == clients
+    assert len({content for content, _ in results}) == 1
+    assert sorted(replayed for _, replayed in results) == [False] + [True] * (clients - 1)
+    db.expire_all()
+    assert db.get(models.Product, product.id).stock_quantity == 9
+    assert db.query(models.Order).count() == 1
+
+
+def test_expired_and_abandoned_keys(db):
+    clock_now = [1000.0]
+    store = idempotency.IdempotencyStore(ttl=100, lock_timeout=10, wait_timeout=0, clock=lambda: clock_now[0])
+
+    token, record = store.begin(db, "1:a", "x")
+    assert token is not None and record is None
+    with pytest.raises(idempotency.RequestInProgress):
+        store.begin(db, "1:a", "x")
+    clock_now[0] += 11
+    token, _ = store.begin(db, "1:a", "x")  # брошенный ключ захватывается снова
+    assert token is not None
+
+    store.complete(db, "1:a", token, order_id=1)
+    store.save_response(db, "1:a", token, "{}")
+    assert store.begin(db, "1:a", "x")[1].response == "{}"
+
+    clock_now[0] += 101
+    assert store.purge_expired(db) == 1
+    assert db.query(models.IdempotencyKey).count() == 0
+
+
+def test_slow_request_whose_key_was_taken_over_rolls_back(db, user, make_product, monkeypatch):
+    product = make_product(stock_quantity=5)
+    clock_now = [1000.0]
+    store = idempotency.IdempotencyStore(lock_timeout=10, wait_timeout=0, clock=lambda: clock_now[0])
+    monkeypatch.setattr(idempotency, "store", store)
+    slow_token, _ = store.begin(db, "1:a", "x")
+    clock_now[0] += 11  # первый запрос еще ждет блокировок, а ключ уже считается брошенным
+    fast_token, _ = store.begin(db, "1:a", "x")
+    order = schemas.OrderCreate(**order_body(product.id, 2))
+
+    crud.create_order(db, order, user.id, idempotency_key="1:a", idempotency_token=fast_token)
+    with pytest.raises(idempotency.ClaimLost):
+        crud.create_order(db, order, user.id, idempotency_key="1:a", idempotency_token=slow_token)
+    store.release(db, "1:a", slow_token)
+
+    db.expire_all()
+    assert db.query(models.Order).count() == 1
+    assert db.get(models.Product, product.id).stock_quantity == 3
+    assert db.get(models.IdempotencyKey, "1:a").status == "done"
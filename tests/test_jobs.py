@@ -0,0 +1,163 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import select
+
+from app import crud, database, jobs, models, schemas
+
+
+class FakeClock:
+    def __init__(self):
+        # Чуть впереди реального времени: события, созданные в тесте, уже готовы к обработке
+        self.now = time.time() + 1
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def user(db):
+    db_user = models.User(email="buyer@example.com", first_name="Иван", last_name="Иванов", hashed_password="x")
+    db.add(db_user)
+    db.commit()
+    return db_user
+
+
+@pytest.fixture
+def flaky(monkeypatch):
+    """Обработчик событий test, который падает заданное число раз"""
+    calls = []
+
+    def _flaky(failures: int):
+        def job(payload):
+            calls.append(payload)
+            if len(calls) <= failures:
+                raise RuntimeError("сервис недоступен")
+        monkeypatch.setitem(jobs.handlers, "test", job)
+        return calls
+
+    return _flaky
+
+
+def outbox(db):
+    db.expire_all()
+    return db.execute(select(models.OutboxEvent)).scalars().all()
+
+
+def add_event(db, **payload) -> int:
+    event = jobs.outbox_event("test", **payload)
+    db.add(event)
+    db.commit()
+    return event.id
+
+
+def test_order_and_outbox_event_are_committed_together(db, user, make_product):
+    product = make_product(stock_quantity=1)
+    order = schemas.OrderCreate(products=[schemas.OrderProduct(product_id=product.id, quantity=1)])
+
+    db_order = crud.create_order(db, order, user_id=user.id)
+    with pytest.raises(ValueError):
+        crud.create_order(db, order, user_id=user.id)
+
+    # Очередь не запущена: событие обработано сразу, заказ подтвержден, строка outbox удалена
+    db.expire_all()
+    assert db.get(models.Order, db_order.id).status == "confirmed"
+    assert outbox(db) == []
+
+
+def test_failed_job_is_retried_with_backoff(db, flaky):
+    calls = flaky(failures=1)
+    clock = FakeClock()
+    queue = jobs.JobQueue(retry_base=2.0, clock=clock)
+    event_id = add_event(db, order_id=1)
+
+    assert queue.run_pending() == 0
+    [event] = outbox(db)
+    assert event.id == event_id
+    assert (event.status, event.attempts, event.last_error) == ("pending", 1, "сервис недоступен")
+    assert event.available_at == pytest.approx(clock.now + 2.0)
+
+    assert queue.run_pending() == 0  # повтор еще не наступил
+    clock.now += 2.0
+    assert queue.run_pending() == 1
+    assert calls == [{"order_id": 1}, {"order_id": 1}]
+    assert outbox(db) == []
+    assert (queue.processed, queue.retried, queue.failed) == (1, 1, 0)
+
+
+def test_job_fails_after_max_attempts(db, flaky):
+    flaky(failures=10)
+    clock = FakeClock()
+    queue = jobs.JobQueue(max_attempts=3, retry_base=1.0, clock=clock)
+    add_event(db)
+
+    for _ in range(5):
+        queue.run_pending()
+        clock.now += 10
+
+    [event] = outbox(db)
+    assert (event.status, event.attempts) == ("failed", 3)
+    assert queue.failed == 1
+
+
+def test_abandoned_event_is_claimed_again(db, flaky):
+    calls = flaky(failures=0)
+    clock = FakeClock()
+    queue = jobs.JobQueue(lock_timeout=60, clock=clock)
+    add_event(db)
+    with database.SessionLocal() as session:
+        assert len(queue.claim(session)) == 1  # процесс взял событие и упал
+
+    assert queue.run_pending() == 0
+    clock.now += 61
+    assert queue.run_pending() == 1
+    assert len(calls) == 1
+
+
+def test_checkout_returns_before_background_confirmation(client, db, user, make_product, monkeypatch):
+    product = make_product(stock_quantity=5)
+    confirmed = []
+    confirm_order = jobs.handlers["order_created"]
+
+    def slow_confirmation(payload):
+        time.sleep(0.2)
+        confirm_order(payload)
+        confirmed.append(payload["order_id"])
+
+    monkeypatch.setitem(jobs.handlers, "order_created", slow_confirmation)
+    # В тестах очередь выключена (JOBS_ENABLED=false); здесь запускается в цикле событий приложения
+    client.portal.call(jobs.queue.start)
+    try:
+        started = time.perf_counter()
+        response = client.post("/orders/", params={"user_id": user.id},
+                               json={"products": [{"product_id": product.id, "quantity": 1}]})
+        elapsed = time.perf_counter() - started
+        deadline = time.monotonic() + 5
+        while not confirmed and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        client.portal.call(jobs.queue.stop)
+
+    assert response.status_code == 201
+    assert response.json()["status"] == "pending"
+    assert elapsed < 0.2
+    assert confirmed == [response.json()["id"]]
+    db.expire_all()
+    assert db.get(models.Order, response.json()["id"]).status == "confirmed"
+    assert client.get("/api/jobs/stats").json()["outbox"] == {}
+
+
+def test_counters_from_concurrent_workers_are_not_lost(db, flaky):
+    flaky(failures=0)
+    queue = jobs.JobQueue(batch_size=100, clock=FakeClock())
+    for i in range(40):
+        add_event(db, n=i)
+    with database.SessionLocal() as session:
+        events = queue.claim(session)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert all(pool.map(queue.process, events))
+
+    assert queue.processed == 40
+    assert outbox(db) == []
@@ -0,0 +1,98 @@
+import random
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from app import category_stats, crud, database, models
+from app.main import app
+from benchmarks import data, load
+
+END = datetime(2024, 6, 1)
+
+
+def generated(path, seed: int):
+    engine = create_engine(f"sqlite:///{path}")
+    database.Base.metadata.create_all(engine)
+    counts = data.generate(50, 20, 200, days=30, seed=seed, end=END, engine=engine, chunk_size=64)
+    return engine, counts
+
+
+def snapshot(engine):
+    with engine.connect() as conn:
+        return [conn.execute(select(table).order_by(table.c.id)).all()
+                for table in (models.User.__table__, models.Product.__table__, models.Order.__table__,
+                              models.OrderItem.__table__)]
+
+
+def test_generator_is_deterministic_and_consistent(tmp_path):
+    engine, counts = generated(tmp_path / "first.db", seed=7)
+    again, _ = generated(tmp_path / "second.db", seed=7)
+    other, _ = generated(tmp_path / "other.db", seed=8)
+
+    assert snapshot(engine) == snapshot(again)
+    assert snapshot(engine) != snapshot(other)
+    users, products, orders, items = snapshot(engine)
+    assert (len(users), len(products), len(orders), len(items)) == (50, 20, 200, counts["order_items"])
+
+    with Session(engine) as db:
+        totals = dict(db.execute(
+            select(models.OrderItem.order_id, func.sum(models.OrderItem.quantity * models.OrderItem.unit_price))
+            .group_by(models.OrderItem.order_id)
+        ).all())
+        assert {order.id: order.total_amount for order in orders} == pytest.approx(totals)
+        assert all(END - timedelta(days=30) < order.created_at <= END for order in orders)
+        expected = {row["category"]: row["product_count"] for row in db.execute(category_stats.aggregate_query())
+                    .mappings()}
+        assert {row["category"]: row["product_count"] for row in crud.get_category_stats(db)} == expected
+    for engine in (engine, again, other):
+        engine.dispose()
+
+
+def test_every_endpoint_in_the_mix_serves_generated_data(client, db):
+    data.generate(20, 10, 50, days=10, seed=1)
+    dataset = load.describe(db)
+    rng = random.Random(1)
+
+    for endpoint in load.ENDPOINTS:
+        method, url, options = endpoint.build(rng, dataset)
+        response = client.request(method, url, **options)
+        assert response.status_code < 400, endpoint.name
+
+    async def short_run():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as async_client:
+            return await load.run(async_client, dataset, concurrency=4, seconds=0.5)
+
+    report = client.portal.call(short_run)
+    assert report["total"]["requests"] > 0
+    assert report["total"]["errors"] == 0
+    assert sum(row["requests"] for row in report["endpoints"].values()) == report["total"]["requests"]
+
+
+def test_percentiles_and_baseline_comparison():
+    values = [float(value) for value in range(1, 101)]
+    assert [load.percentile(values, q) for q in (50, 95, 99, 100)] == [50.0, 95.0, 99.0, 100.0]
+    assert load.percentile([3.0], 99) == 3.0
+
+    baseline = {"endpoints": {
+        "GET /a": {"requests": 100, "errors": 0, "rps": 50.0, "p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": 30.0},
+        "GET /b": {"requests": 100, "errors": 0, "rps": 50.0, "p50_ms": 0.2, "p95_ms": 0.4, "p99_ms": 0.5},
+        "GET /c": {"requests": 100, "errors": 0, "rps": 50.0, "p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": 30.0},
+    }}
+    report = {"endpoints": {
+        # p99 не сравнивается: слишком шумный
+        "GET /a": {"requests": 90, "errors": 0, "rps": 45.0, "p50_ms": 11.0, "p95_ms": 21.0, "p99_ms": 90.0},
+        # Втрое медленнее, но меньше чем на MIN_REGRESSION_MS
+        "GET /b": {"requests": 100, "errors": 0, "rps": 50.0, "p50_ms": 0.6, "p95_ms": 1.2, "p99_ms": 1.5},
+        "GET /c": {"requests": 50, "errors": 5, "rps": 25.0, "p50_ms": 10.0, "p95_ms": 40.0, "p99_ms": 60.0},
+        "GET /new": {"requests": 10, "errors": 10, "rps": 1.0, "p50_ms": 1.0, "p95_ms": 1.0, "p99_ms": 1.0},
+    }}
+
+    regressions = load.compare(report, baseline, tolerance=0.2)
+
+    assert [line.split(":")[0] for line in regressions] == ["GET /c"] * 3
+    assert any("p95_ms" in line for line in regressions)
+    assert load.compare(report, baseline, tolerance=10) == ["GET /c: доля ошибок 0.0% -> 10.0%"]
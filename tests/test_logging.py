@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app import logging_config
+from app.logging_config import BackgroundWriter, RotatingFileStream, log, sample_filter
+
+
+@pytest.fixture
+def captured():
+    """Дополнительный обработчик, собирающий сообщения в список"""
+    messages = []
+    handler_id = log.add(messages.append, format="{message}", level="DEBUG", filter=sample_filter)
+    yield messages
+    log.remove(handler_id)
+
+
+def test_sampled_messages_keep_every_nth(monkeypatch, captured):
+    monkeypatch.setattr(logging_config, "LOG_SAMPLE_RATE", 5)
+    monkeypatch.setattr(logging_config, "_sample_counters", {})
+    sampled = log.bind(sample="test")
+
+    for i in range(20):
+        sampled.info(f"сессия {i}")
+    log.info("обычное сообщение")
+
+    assert [m.strip() for m in captured] == ["сессия 0", "сессия 5", "сессия 10", "сессия 15", "обычное сообщение"]
+
+
+def test_warnings_are_never_sampled(monkeypatch, captured):
+    monkeypatch.setattr(logging_config, "LOG_SAMPLE_RATE", 100)
+    monkeypatch.setattr(logging_config, "_sample_counters", {})
+    sampled = log.bind(sample="test")
+
+    for _ in range(3):
+        sampled.warning("предупреждение")
+
+    assert len(captured) == 3
+
+
+def test_sampling_decision_is_shared_between_sinks(monkeypatch, captured):
+    monkeypatch.setattr(logging_config, "LOG_SAMPLE_RATE", 2)
+    monkeypatch.setattr(logging_config, "_sample_counters", {})
+    second = []
+    handler_id = log.add(second.append, format="{message}", filter=sample_filter)
+    try:
+        for i in range(4):
+            log.bind(sample="test").info(str(i))
+    finally:
+        log.remove(handler_id)
+
+    assert [m.strip() for m in captured] == [m.strip() for m in second] == ["0", "2"]
+
+
+def test_json_records_are_one_object_per_line():
+    lines = []
+    handler_id = log.add(lines.append, serialize=True)
+    try:
+        log.bind(request_id="abc").info("Запрос товаров")
+    finally:
+        log.remove(handler_id)
+
+    record = json.loads(lines[0])["record"]
+    assert record["message"] == "Запрос товаров"
+    assert record["level"]["name"] == "INFO"
+    assert record["extra"]["request_id"] == "abc"
+
+
+class RecordingStream:
+    """Поток, запоминающий каждый вызов write; write может быть медленным"""
+
+    def __init__(self, delay: float = 0.0):
+        self.writes = []
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        self.writes.append(text)
+
+    def flush(self):
+        pass
+
+
+def test_background_writer_batches_lines_queued_while_it_sleeps():
+    stream = RecordingStream()
+    writer = BackgroundWriter(stream, interval=0.3)
+    try:
+        writer.write("a\n")
+        time.sleep(0.1)  # первая строка записана, поток ждет interval
+        for line in ("b\n", "c\n", "d\n"):
+            writer.write(line)
+        writer.drain()
+    finally:
+        writer.stop()
+
+    assert stream.writes == ["a\n", "b\nc\nd\n"]
+
+
+def test_drain_waits_for_queued_lines():
+    stream = RecordingStream(delay=0.2)
+    writer = BackgroundWriter(stream, interval=0.01)
+    try:
+        writer.write("медленная запись\n")
+        writer.drain()
+        assert stream.writes == ["медленная запись\n"]
+    finally:
+        writer.stop()
+
+
+def test_writer_is_stopped_when_handler_is_removed():
+    stream = RecordingStream()
+    writer = BackgroundWriter(stream, interval=0.01)
+    handler_id = log.add(writer, format="{message}")
+    log.info("последнее сообщение")
+    log.remove(handler_id)
+
+    assert not writer._thread.is_alive()
+    assert "".join(stream.writes) == "последнее сообщение\n"
+
+
+def test_queue_mode_writes_file_in_background_and_respects_level(monkeypatch, tmp_path):
+    log_file = tmp_path / "logs" / "app.log"
+    monkeypatch.setattr(logging_config, "LOG_QUEUE", True)
+    monkeypatch.setattr(logging_config, "LOG_LEVEL", "WARNING")
+    monkeypatch.setattr(logging_config, "LOG_FILE", str(log_file))
+    try:
+        logging_config.setup_logging()
+        log.info("информационное сообщение")
+        log.warning("предупреждение в файл")
+        asyncio.run(logging_config.flush_logging())
+        content = log_file.read_text(encoding="utf-8")
+    finally:
+        monkeypatch.undo()
+        logging_config.setup_logging()
+
+    assert "предупреждение в файл" in content
+    assert "информационное сообщение" not in content
+
+
+def test_rotating_file_stream_rotates_by_size(tmp_path):
+    path = tmp_path / "app.log"
+    stream = RotatingFileStream(str(path), max_bytes=10)
+    try:
+        for line in ("12345678\n", "abcdefgh\n", "last\n"):
+            stream.write(line)
+        stream.flush()
+    finally:
+        stream.close()
+
+    rotated = sorted(tmp_path.glob("app.*.log"))
+    assert path.read_text() == "last\n"
+    assert [file.read_text() for file in rotated] == ["12345678\n", "abcdefgh\n"]
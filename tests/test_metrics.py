@@ -0,0 +1,106 @@
+import re
+
+from app import crud, metrics, models, schemas
+from app.metrics import Counter, Histogram, Registry
+
+
+def sample(text: str, name: str, **labels) -> float:
+    """Значение серии из вывода /metrics (0, если серии нет)"""
+    expected = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    for line in text.splitlines():
+        match = re.fullmatch(r"(\w+)(?:\{(.*)\})? (\S+)", line)
+        if match and match.group(1) == name and (match.group(2) or "") == expected:
+            return float(match.group(3))
+    return 0.0
+
+
+def test_registry_renders_prometheus_text_format():
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Запросы", ("path",)))
+    latency = registry.register(Histogram("latency_seconds", "Время", buckets=(0.1, 1.0)))
+    requests.inc('/a"b')
+    requests.inc('/a"b', amount=2)
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value)
+
+    text = registry.render().decode()
+
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{path="/a\\"b"} 3' in text
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 3' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "latency_seconds_sum 4.25" in text
+    assert "latency_seconds_count 4" in text
+
+
+def test_requests_are_recorded_by_route_template(client, make_product):
+    product = make_product()
+    before = client.get("/metrics").text
+
+    assert client.get(f"/products/{product.id}").status_code == 200
+    assert client.get("/products/999999").status_code == 404
+    client.get("/api/products", params={"limit": 5})
+
+    text = client.get("/metrics").text
+    route = "/products/{product_id}"
+    for status in ("200", "404"):
+        assert sample(text, "http_requests_total", method="GET", route=route, status=status) == \
+            sample(before, "http_requests_total", method="GET", route=route, status=status) + 1
+    assert sample(text, "http_request_duration_seconds_count", method="GET", route=route) == \
+        sample(before, "http_request_duration_seconds_count", method="GET", route=route) + 2
+    assert sample(text, "http_requests_total", method="GET", route="/api/products", status="200") >= 1
+    assert sample(text, "http_requests_in_flight") == 1  # сам запрос /metrics
+
+
+def test_sql_queries_are_counted_per_request(client, make_product):
+    make_product()
+    route = "/products/page"
+    before = client.get("/metrics").text
+
+    client.get(route)
+    text = client.get("/metrics").text
+
+    assert sample(text, "http_request_db_queries_count", route=route) == \
+        sample(before, "http_request_db_queries_count", route=route) + 1
+    assert sample(text, "http_request_db_queries_sum", route=route) == \
+        sample(before, "http_request_db_queries_sum", route=route) + 1
+    assert sample(text, "db_queries_total") > sample(before, "db_queries_total")
+
+
+def test_orders_update_stock_counters(db, make_product):
+    db.add(models.User(email="buyer@example.com", first_name="Иван", last_name="Иванов", hashed_password="x"))
+    db.commit()
+    product = make_product(stock_quantity=3)
+    reserved = metrics.stock_reservations.value("reserved")
+    insufficient = metrics.stock_reservations.value("insufficient")
+    orders = metrics.orders_created.value()
+    units = metrics.stock_units_reserved.value()
+
+    order = schemas.OrderCreate(products=[schemas.OrderProduct(product_id=product.id, quantity=2)])
+    crud.create_order(db, order, user_id=1)
+    try:
+        crud.create_order(db, order, user_id=1)
+    except ValueError:
+        pass
+
+    assert metrics.stock_reservations.value("reserved") == reserved + 1
+    assert metrics.stock_reservations.value("insufficient") == insufficient + 1
+    assert metrics.orders_created.value() == orders + 1
+    assert metrics.stock_units_reserved.value() == units + 2
+
+
+def test_metrics_endpoint_exposes_pool_and_cache_state(client, make_product):
+    product = make_product()
+    client.get(f"/api/products/{product.id}")
+    client.get(f"/api/products/{product.id}")
+
+    response = client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert sample(text, "catalog_cache_requests_total", result="hit") >= 1
+    assert sample(text, "db_pool_size", engine="primary") > 0
+    assert sample(text, "db_pool_checkouts_total", engine="primary_async") >= 1
+    assert "db_pool_checkout_wait_seconds_total" in text
@@ -0,0 +1,200 @@
+import csv
+import io
+import json
+import threading
+import tracemalloc
+
+import pytest
+from sqlalchemy import insert, select
+
+from app import crud, database, models, schemas
+
+
+@pytest.fixture
+def user(db):
+    db_user = models.User(email="buyer@example.com", first_name="Иван", last_name="Иванов",
+                          hashed_password="secret")
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+
+def order_for(*items):
+    return schemas.OrderCreate(products=[
+        schemas.OrderProduct(product_id=product_id, quantity=quantity) for product_id, quantity in items
+    ])
+
+
+def test_create_order_reserves_stock_and_sums_total(db, user, make_product):
+    shirt = make_product(price=1500.0, stock_quantity=5)
+    jeans = make_product(name="Джинсы", price=3500.0, stock_quantity=2)
+
+    order = crud.create_order(db, order_for((shirt.id, 2), (jeans.id, 1)), user_id=user.id)
+
+    db.expire_all()
+    assert order.total_amount == 2 * 1500.0 + 3500.0
+    assert db.get(models.Product, shirt.id).stock_quantity == 3
+    assert db.get(models.Product, jeans.id).stock_quantity == 1
+
+
+def test_create_order_merges_duplicate_lines(db, user, make_product):
+    shirt = make_product(stock_quantity=3)
+
+    with pytest.raises(ValueError):
+        crud.create_order(db, order_for((shirt.id, 2), (shirt.id, 2)), user_id=user.id)
+
+    db.expire_all()
+    assert db.get(models.Product, shirt.id).stock_quantity == 3
+
+
+def test_create_order_rolls_back_all_lines_when_one_is_short(db, user, make_product):
+    shirt = make_product(stock_quantity=5)
+    jeans = make_product(name="Джинсы", stock_quantity=0)
+
+    with pytest.raises(ValueError):
+        crud.create_order(db, order_for((shirt.id, 1), (jeans.id, 1)), user_id=user.id)
+
+    db.expire_all()
+    assert db.get(models.Product, shirt.id).stock_quantity == 5
+    assert db.query(models.Order).count() == 0
+
+
+def test_create_order_rejects_unknown_product(db, user):
+    with pytest.raises(ValueError, match="не существует"):
+        crud.create_order(db, order_for((999, 1)), user_id=user.id)
+
+
+def test_parallel_buyers_cannot_oversell_last_unit(db, user, make_product):
+    product = make_product(stock_quantity=1)
+    buyers = 50
+    barrier = threading.Barrier(buyers)
+    outcomes = []
+    lock = threading.Lock()
+
+    def buy():
+        session = database.SessionLocal()
+        try:
+            barrier.wait()
+            crud.create_order(session, order_for((product.id, 1)), user_id=user.id)
+            outcome = "ok"
+        except ValueError:
+            outcome = "rejected"
+        except Exception as e:
+            outcome = f"error: {e}"
+        finally:
+            session.close()
+        with lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=buy) for _ in range(buyers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db.expire_all()
+    assert outcomes.count("ok") == 1
+    assert outcomes.count("rejected") == buyers - 1
+    assert db.get(models.Product, product.id).stock_quantity == 0
+    assert db.query(models.Order).count() == 1
+
+
+def test_order_items_keep_quantity_and_price_paid(db, user, make_product):
+    shirt = make_product(price=1500.0, stock_quantity=5)
+
+    order = crud.create_order(db, order_for((shirt.id, 1), (shirt.id, 2)), user_id=user.id)
+
+    shirt.price = 9999.0
+    db.commit()
+
+    items = db.query(models.OrderItem).filter(models.OrderItem.order_id == order.id).all()
+    assert [(item.product_id, item.quantity, item.unit_price) for item in items] == [(shirt.id, 3, 1500.0)]
+
+
+def test_order_api_serves_items_from_order_table(client, user, make_product):
+    shirt = make_product(price=1500.0, stock_quantity=5)
+    jeans = make_product(name="Джинсы", price=3500.0, stock_quantity=5)
+
+    created = client.post("/orders/", params={"user_id": user.id}, json={
+        "products": [{"product_id": shirt.id, "quantity": 2}, {"product_id": jeans.id, "quantity": 1}]
+    })
+    assert created.status_code == 201
+
+    response = client.get(f"/orders/{created.json()['id']}")
+
+    assert response.status_code == 200
+    assert response.json()["products"] == [
+        {"product_id": shirt.id, "quantity": 2, "unit_price": 1500.0},
+        {"product_id": jeans.id, "quantity": 1, "unit_price": 3500.0},
+    ]
+
+
+def test_order_api_returns_404_for_missing_order(client):
+    assert client.get("/orders/999").status_code == 404
+
+
+def test_order_export_ndjson_matches_order_listing(client, user, make_product):
+    shirt = make_product(price=1500.0, stock_quantity=10)
+    jeans = make_product(name="Джинсы", price=3500.0, stock_quantity=10)
+    for items in ([(shirt.id, 1)], [(shirt.id, 2), (jeans.id, 1)], [(jeans.id, 3)]):
+        client.post("/orders/", params={"user_id": user.id}, json={
+            "products": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in items]
+        })
+
+    response = client.get("/orders/export", params={"user_id": user.id})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert exported == client.get("/orders/", params={"user_id": user.id}).json()
+
+
+def test_order_export_csv_has_row_per_item(client, db, user, make_product):
+    shirt = make_product(price=1500.0, stock_quantity=10)
+    jeans = make_product(name="Джинсы", price=3500.0, stock_quantity=10)
+    order = crud.create_order(db, order_for((shirt.id, 2), (jeans.id, 1)), user_id=user.id)
+    db.add(models.Order(user_id=user.id, total_amount=0.0))
+    db.commit()
+
+    response = client.get("/orders/export", params={"user_id": user.id, "format": "csv"})
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(row["id"], row["product_id"], row["quantity"]) for row in rows] == [
+        (str(order.id), str(shirt.id), "2"),
+        (str(order.id), str(jeans.id), "1"),
+        (str(order.id + 1), "", ""),
+    ]
+
+
+def test_order_export_rejects_unknown_format(client):
+    assert client.get("/orders/export", params={"format": "xml"}).status_code == 400
+
+
+def test_order_export_memory_stays_flat_for_100k_orders(db, user, make_product):
+    product = make_product()
+    orders = 100000
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.Order), [
+            {"user_id": user.id, "total_amount": 1500.0, "status": "delivered"} for _ in range(orders)
+        ])
+        order_ids = conn.execute(select(models.Order.id)).scalars().all()
+        conn.execute(insert(models.OrderItem), [
+            {"order_id": order_id, "product_id": product.id, "quantity": 1, "unit_price": 1500.0}
+            for order_id in order_ids
+        ])
+    del order_ids
+
+    tracemalloc.start()
+    try:
+        lines = size = 0
+        for chunk in crud.export_orders(db, user.id, "ndjson", batch_size=1000):
+            lines += chunk.count(b"\n")
+            size += len(chunk)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert lines == orders
+    # Пик памяти определяется размером пачки, а не числом заказов (при 10 000 заказов он почти такой же)
+    assert peak < min(size / 4, 8 * 2 ** 20), (peak, size)
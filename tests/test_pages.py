@@ -0,0 +1,100 @@
+import gzip
+
+import pytest
+
+from app import models
+from app.http_cache import choose_encoding
+from app.pages import RenderedPage, page_cache
+from .queries import count_queries
+
+HTML = {"Accept": "text/html,application/xhtml+xml,*/*;q=0.8"}
+
+
+class FakeRequest:
+    def __init__(self, accept_encoding: str):
+        self.headers = {"accept-encoding": accept_encoding}
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip;q=0.5", "gzip"),
+    ("*", "br"),
+    ("identity", "identity"),
+    ("", "identity"),
+])
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(FakeRequest(accept_encoding), ("identity", "gzip", "br")) == expected
+
+
+def test_static_pages_are_warmed_up_and_served_compressed(client):
+    assert "index.html" in page_cache.pages
+
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/", headers={"Accept-Encoding": "gzip"})
+
+    assert plain.status_code == compressed.status_code == 200
+    assert "content-encoding" not in plain.headers
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.text == plain.text
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert compressed.headers["etag"] != plain.headers["etag"]
+    stored = page_cache.page("index.html").variants["gzip"]
+    assert len(stored) < len(plain.content) / 2
+    assert gzip.decompress(stored) == plain.content
+
+
+def test_static_page_revalidation_returns_304(client):
+    first = client.get("/cart", headers={"Accept-Encoding": "gzip"})
+
+    second = client.get("/cart", headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]})
+
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == first.headers["etag"]
+
+
+def test_product_page_is_rendered_on_server(client, make_product):
+    product = make_product(name="Футболка <Лето>", stock_quantity=7)
+
+    response = client.get(f"/products/{product.id}", headers=HTML)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert "<h1>Футболка &lt;Лето&gt;</h1>" in response.text
+    assert "7 шт." in response.text
+    assert "/api/products/" not in response.text
+    # API-клиенты по тому же адресу по-прежнему получают JSON
+    assert client.get(f"/products/{product.id}").json()["name"] == "Футболка <Лето>"
+
+
+def test_product_page_is_cached_until_product_changes(client, db, make_product):
+    product = make_product(stock_quantity=5)
+    product_id = product.id
+    client.get(f"/products/{product_id}", headers=HTML)
+
+    with count_queries() as statements:
+        cached = client.get(f"/products/{product_id}", headers=HTML)
+    assert cached.status_code == 200
+    assert statements == []
+
+    db.add(models.User(email="buyer@example.com", first_name="Иван", last_name="Иванов", hashed_password="x"))
+    db.commit()
+    order = client.post("/orders/", params={"user_id": 1},
+                        json={"products": [{"product_id": product_id, "quantity": 2}]})
+    assert order.status_code == 201
+
+    assert "3 шт." in client.get(f"/products/{product_id}", headers=HTML).text
+
+
+def test_missing_product_page_returns_404(client):
+    response = client.get("/products/999999", headers=HTML)
+
+    assert response.status_code == 404
+    assert "Товар не найден" in response.text
+
+
+def test_small_pages_are_not_compressed():
+    page = RenderedPage("<p>ok</p>")
+
+    assert set(page.variants) == {"identity"}
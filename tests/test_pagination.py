@@ -0,0 +1,93 @@
+import pytest
+
+from app import crud, models
+from app.pagination import InvalidCursor
+
+
+@pytest.fixture
+def catalog(make_product):
+    # Повторяющиеся цены и названия проверяют разрешение ничьих по id
+    names = ["Б", "А", "В", "А", "Г", "Б", "Д"]
+    prices = [500.0, 1500.0, 1500.0, 700.0, 1500.0, 300.0, 700.0]
+    return [
+        make_product(name=name, price=price, category="Футболки" if i % 2 else "Джинсы")
+        for i, (name, price) in enumerate(zip(names, prices))
+    ]
+
+
+def walk(fetch_page):
+    """Проход по всем страницам; возвращает id записей и число страниц"""
+    ids, cursor, pages = [], None, 0
+    while True:
+        items, cursor = fetch_page(cursor)
+        ids.extend(item["id"] if isinstance(item, dict) else item.id for item in items)
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+
+def api_pages(client, path, **params):
+    """Загрузчик страниц через HTTP API"""
+    def fetch(cursor):
+        query = dict(params, cursor=cursor) if cursor else params
+        body = client.get(path, params=query).json()
+        return body["items"], body["next_cursor"]
+    return fetch
+
+
+@pytest.mark.parametrize("sort", ["id", "price", "price_desc", "name"])
+@pytest.mark.parametrize("category", [None, "Футболки"])
+def test_cursor_walk_matches_full_listing(db, catalog, sort, category):
+    expected = [p.id for p in crud.get_products(db, limit=1000, category=category, sort=sort)]
+
+    ids, pages = walk(lambda cursor: crud.get_products_page(db, limit=2, category=category, sort=sort, cursor=cursor))
+
+    assert ids == expected
+    assert pages == (len(expected) + 1) // 2
+
+
+def test_price_desc_listing_breaks_ties_by_id(db, catalog):
+    products = crud.get_products(db, sort="price_desc")
+
+    keys = [(p.price, p.id) for p in products]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_skip_still_works_without_cursor(db, catalog):
+    page, _ = crud.get_products_page(db, limit=2, sort="price", skip=2)
+
+    assert [p.id for p in page] == [p.id for p in crud.get_products(db, skip=2, limit=2, sort="price")]
+
+
+def test_cursor_from_other_sort_is_rejected(db, catalog):
+    _, cursor = crud.get_products_page(db, limit=2, sort="price")
+
+    with pytest.raises(InvalidCursor):
+        crud.get_products_page(db, limit=2, sort="name", cursor=cursor)
+
+
+@pytest.mark.parametrize("path", ["/api/products/page", "/products/page"])
+def test_page_endpoints_walk_catalog(client, catalog, path):
+    ids, _ = walk(api_pages(client, path, limit=3, sort="price_desc"))
+
+    assert sorted(ids) == sorted(p.id for p in catalog)
+
+
+@pytest.mark.parametrize("path", ["/api/products/page", "/products/page", "/users/page", "/orders/page"])
+def test_page_endpoints_reject_garbage_cursor(client, path):
+    assert client.get(path, params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_users_and_orders_pages(client, db):
+    for i in range(5):
+        db.add(models.User(email=f"user{i}@example.com", first_name="Иван", last_name="Иванов",
+                           hashed_password="secret"))
+    for _ in range(3):
+        db.add(models.Order(user_id=1, total_amount=100.0, status="pending"))
+    db.commit()
+
+    users, _ = walk(api_pages(client, "/users/page", limit=2))
+    orders, _ = walk(api_pages(client, "/orders/page", user_id=1, limit=2))
+
+    assert len(users) == 5
+    assert len(orders) == 3
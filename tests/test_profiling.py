@@ -0,0 +1,125 @@
+import pytest
+from sqlalchemy import event, select, text
+
+from app import database, models
+from app.logging_config import log
+from app.profiling import RequestProfile, _current_profile, explain, normalize_sql, profiler
+
+
+@pytest.fixture
+def profiling():
+    """Режим профилирования на время теста"""
+    profiler.clear()
+    profiler.enable()
+    yield profiler
+    profiler.disable()
+    profiler.clear()
+
+
+@pytest.fixture
+def warnings():
+    """Предупреждения loguru, записанные за время теста"""
+    messages = []
+    handler_id = log.add(messages.append, level="WARNING", format="{message}")
+    yield messages
+    log.remove(handler_id)
+
+
+def test_normalize_sql_groups_statements_by_shape():
+    first = normalize_sql("SELECT * FROM products WHERE id IN (?, ?, ?) AND name = 'a''b' LIMIT 10")
+    second = normalize_sql("SELECT *  FROM products\n WHERE id IN (?) AND name = 'c' LIMIT 20")
+
+    assert first == second == "SELECT * FROM products WHERE id IN (...) AND name = ? LIMIT ?"
+    assert normalize_sql("SELECT :id_1, %(name)s, $1, table2.col") == "SELECT ?, ?, ?, table2.col"
+
+
+def test_repeated_statements_are_deduplicated(profiling, db, make_product):
+    product_ids = [make_product(name=f"Товар {i}").id for i in range(3)]
+    profile = RequestProfile("GET", "/test")
+    token = _current_profile.set(profile)
+    try:
+        # Каждый товар отдельным запросом — типичный N+1
+        for product_id in product_ids:
+            db.execute(select(models.Product).where(models.Product.id == product_id)).scalar_one()
+    finally:
+        _current_profile.reset(token)
+
+    result = profile.as_dict()
+    assert result["queries"] == 3
+    assert result["repeated"] == 1
+    [statement] = result["statements"]
+    assert statement["count"] == 3
+    assert "WHERE products.id = ?" in statement["sql"]
+
+
+def test_requests_get_server_timing_and_history(client, profiling, make_product):
+    product = make_product()
+
+    response = client.get(f"/products/{product.id}")
+
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("db;dur=")
+    assert response.headers["server-timing"].endswith('desc="1 SQL"')
+
+    history = client.get("/api/debug/sql").json()
+    [entry] = history["requests"]
+    assert (entry["method"], entry["path"], entry["status"]) == ("GET", f"/products/{product.id}", 200)
+    assert entry["queries"] == 1
+    assert entry["statements"][0]["count"] == 1
+    assert client.get("/debug").status_code == 200
+
+
+def test_slow_queries_are_logged_with_plan_once(profiling, warnings, db, make_product, monkeypatch):
+    make_product()
+    monkeypatch.setattr(profiler, "slow_query_ms", 0)
+
+    for name in ("Футболка", "Куртка"):
+        db.execute(text("SELECT id FROM products WHERE name = :name"), {"name": name}).all()
+
+    slow = [message for message in warnings if "FROM products WHERE name" in message]
+    assert len(slow) == 2
+    assert "План выполнения" in slow[0]
+    assert "USING COVERING INDEX ix_products_name" in slow[0]
+    assert "План выполнения" not in slow[1]
+
+
+def test_disabled_profiler_adds_nothing(client, make_product):
+    assert not profiler.enabled
+    product = make_product()
+
+    response = client.get(f"/products/{product.id}")
+
+    assert "server-timing" not in response.headers
+    assert client.get("/api/debug/sql").status_code == 404
+    assert client.get("/debug").status_code == 404
+    assert profiler.recent() == []
+    assert not event.contains(database.engine, "after_cursor_execute", profiler._after_cursor_execute)
+
+
+def test_failed_explain_rolls_back_to_savepoint_outside_sqlite():
+    class Cursor:
+        def __init__(self, executed):
+            self.executed = executed
+
+        def execute(self, sql, parameters=None):
+            self.executed.append(sql)
+            if sql.startswith("EXPLAIN"):
+                raise RuntimeError("syntax error")
+
+        def close(self):
+            pass
+
+    class Connection:
+        def __init__(self):
+            self.executed = []
+
+        def cursor(self):
+            return Cursor(self.executed)
+
+    connection = Connection()
+    with pytest.raises(RuntimeError):
+        explain(connection, "postgresql", "SELECT * FROM products WHERE id = %(id)s", {"id": 1})
+
+    assert connection.executed == ["SAVEPOINT sql_profiler_explain",
+                                   "EXPLAIN SELECT * FROM products WHERE id = %(id)s",
+                                   "ROLLBACK TO SAVEPOINT sql_profiler_explain"]
@@ -0,0 +1,79 @@
+"""
+Число SQL-запросов у списков не должно зависеть от размера страницы: связи загружаются
+пачкой (selectinload или запрос по IN), а не отдельным запросом на каждую строку.
+"""
+import pytest
+from sqlalchemy import insert
+
+from app import crud, database, models
+from app.cache import product_cache
+
+from .queries import assert_max_queries, count_queries
+
+ROWS = 30
+
+# Эндпоинт списка и предельное число запросов на одну страницу (без кэша)
+LISTINGS = [
+    ("/products/", {}, 1),
+    ("/products/page", {}, 1),
+    ("/products/search", {"q": "футболка"}, 6),
+    ("/api/products", {}, 1),
+    ("/api/products/page", {}, 1),
+    ("/api/products/search", {"q": "футболка", "color": "Белый"}, 6),
+    ("/users/", {}, 1),
+    ("/users/page", {}, 1),
+    ("/orders/", {"user_id": 1}, 2),
+    ("/orders/page", {"user_id": 1}, 2),
+    ("/orders/export", {"user_id": 1}, 2),
+]
+
+
+@pytest.fixture
+def populated(db):
+    """Товары, пользователи и заказы с несколькими позициями у первого пользователя"""
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.Product), [
+            {"name": f"Футболка {i}", "description": "Хлопковая футболка", "price": 1000.0 + i,
+             "category": "Футболки", "size": "M", "color": "Белый", "stock_quantity": 100}
+            for i in range(ROWS)
+        ])
+        conn.execute(insert(models.User), [
+            {"id": i + 1, "email": f"user{i}@example.com", "first_name": "Иван", "last_name": "Иванов",
+             "hashed_password": "x"}
+            for i in range(ROWS)
+        ])
+        conn.execute(insert(models.Order), [
+            {"id": i + 1, "user_id": 1, "total_amount": 3000.0, "status": "pending"} for i in range(ROWS)
+        ])
+        conn.execute(insert(models.OrderItem), [
+            {"order_id": i + 1, "product_id": product_id, "quantity": 1, "unit_price": 1500.0}
+            for i in range(ROWS) for product_id in (1, 2)
+        ])
+
+
+def listing_queries(client, path, params, limit):
+    product_cache.clear()
+    with count_queries() as statements:
+        response = client.get(path, params={**params, "limit": limit})
+    assert response.status_code == 200
+    return statements
+
+
+@pytest.mark.parametrize("path, params, max_queries", LISTINGS)
+def test_listing_query_count_does_not_grow_with_page_size(client, populated, path, params, max_queries):
+    small = listing_queries(client, path, params, limit=2)
+    large = listing_queries(client, path, params, limit=ROWS)
+
+    assert len(large) == len(small)
+    assert len(large) <= max_queries, large
+
+
+def test_orm_order_reads_load_items_in_one_query(db, populated):
+    with assert_max_queries(2):
+        orders = crud.get_orders(db, user_id=1, limit=ROWS)
+        assert sum(len(order.items) for order in orders) == 2 * ROWS
+
+    db.expunge_all()
+    with assert_max_queries(2):
+        orders, _ = crud.get_orders_page(db, user_id=1, limit=ROWS)
+        assert sum(len(order.items) for order in orders) == 2 * ROWS
@@ -0,0 +1,183 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import insert
+
+from app import database, models, replicas
+from app.cache import MemoryBackend, RedisBackend, TTLCache, product_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_replica(url: str, name: str = None) -> replicas.Replica:
+    """Реплика на отдельном файле SQLite; товар с id=1 называется по реплике, чтобы видеть источник чтения"""
+    replica = replicas.Replica(url)
+    if name:
+        database.Base.metadata.create_all(replica.engine)
+        with replica.engine.begin() as conn:
+            conn.execute(insert(models.Product), [{
+                "id": 1, "name": name, "price": 1000.0, "category": "Футболки", "size": "M", "color": "Белый",
+                "stock_quantity": 5,
+            }])
+    return replica
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def use_replicas(monkeypatch, tmp_path, clock):
+    """Подмена роутера чтений: реплики задаются именами (None — недоступная реплика)"""
+    routers = []
+
+    def _use_replicas(*names, pin_seconds=5.0):
+        pins = MemoryBackend()
+        pins.store = TTLCache(clock=clock)
+        replica_list = [
+            make_replica(f"sqlite:///{os.path.join(tmp_path, f'replica{i}.db')}", name) if name
+            else make_replica(f"sqlite:///{os.path.join(tmp_path, 'missing', 'replica.db')}")
+            for i, name in enumerate(names)
+        ]
+        router = replicas.ReplicaRouter(replica_list, pins, pin_seconds=pin_seconds, retry_seconds=30.0,
+                                        clock=clock)
+        monkeypatch.setattr(replicas, "replica_router", router)
+        routers.append(router)
+        return router
+
+    yield _use_replicas
+    for router in routers:
+        asyncio.run(router.dispose())
+
+
+def product_name(client, path="/products/1"):
+    product_cache.clear()
+    response = client.get(path)
+    assert response.status_code == 200
+    return response.json()["name"]
+
+
+def test_without_replicas_reads_go_to_primary(make_product):
+    make_product(name="Основная")
+    router = replicas.ReplicaRouter([], MemoryBackend())
+
+    with router.read_session() as db:
+        assert db.get_bind() is database.engine
+    assert router.stats()["primary_reads"] == 1
+
+
+@pytest.mark.parametrize("path", ["/products/1", "/api/products/1"])
+def test_catalog_reads_round_robin_over_replicas(client, use_replicas, path):
+    router = use_replicas("Реплика A", "Реплика B")
+
+    names = [product_name(client, path) for _ in range(4)]
+
+    assert names == ["Реплика A", "Реплика B", "Реплика A", "Реплика B"]
+    assert router.stats()["replica_reads"] == 4
+
+
+def test_unreachable_replica_is_skipped_until_retry(client, use_replicas, clock):
+    router = use_replicas(None, "Реплика B")
+
+    assert [product_name(client) for _ in range(3)] == ["Реплика B"] * 3
+    assert [(r["healthy"], r["failures"]) for r in router.stats()["replicas"]] == [(False, 1), (True, 0)]
+
+    clock.now += 31
+    assert [product_name(client) for _ in range(2)] == ["Реплика B"] * 2
+    assert router.replicas[0].failures == 2
+
+
+def test_reads_fall_back_to_primary_when_all_replicas_are_down(client, make_product, use_replicas):
+    make_product(name="Основная")
+    router = use_replicas(None)
+
+    assert product_name(client) == "Основная"
+    assert product_name(client, "/api/products/1") == "Основная"
+    assert router.stats()["primary_reads"] == 2
+
+
+def test_order_pins_user_reads_to_primary(client, db, make_product, use_replicas, clock):
+    product = make_product(stock_quantity=5)
+    db.add_all([
+        models.User(id=user_id, email=f"user{user_id}@example.com", first_name="Иван", last_name="Иванов",
+                    hashed_password="x")
+        for user_id in (1, 2)
+    ])
+    db.commit()
+    router = use_replicas("Реплика A", pin_seconds=5.0)
+
+    created = client.post("/orders/", params={"user_id": 1},
+                          json={"products": [{"product_id": product.id, "quantity": 1}]})
+    assert created.status_code == 201
+
+    # Реплика еще не получила заказ, но пользователь 1 читает из основной базы
+    assert [order["id"] for order in client.get("/orders/", params={"user_id": 1}).json()] == [created.json()["id"]]
+    assert client.get("/orders/", params={"user_id": 2}).json() == []
+    assert router.stats()["primary_reads"] == 1
+    assert router.stats()["replica_reads"] == 1
+
+    clock.now += 6
+    assert client.get("/orders/", params={"user_id": 1}).json() == []
+    assert router.stats()["replica_reads"] == 2
+
+
+def test_pins_use_shared_redis_or_own_memory_store(monkeypatch):
+    pins = replicas.create_pin_backend()
+    assert isinstance(pins, MemoryBackend) and pins is not product_cache.backend
+    assert pins.store.maxsize == replicas.REPLICA_PIN_CACHE_SIZE
+
+    shared = RedisBackend(client=None)
+    monkeypatch.setattr(product_cache, "backend", shared)
+    assert replicas.create_pin_backend() is shared
+
+
+def test_unavailable_pin_store_keeps_user_reads_on_primary(monkeypatch, use_replicas):
+    class BrokenPins(MemoryBackend):
+        def get(self, key):
+            raise ConnectionError("Redis недоступен")
+
+        def set(self, key, value, ttl):
+            raise ConnectionError("Redis недоступен")
+
+    monkeypatch.setattr(replicas, "BACKEND_ERRORS", (ConnectionError,))
+    router = use_replicas("Реплика A")
+    router.pins = BrokenPins()
+
+    router.pin(1)
+    assert router.is_pinned(1)
+    assert router.candidates(None) == router.replicas
+
+
+def test_catalog_cache_is_not_filled_from_lagging_replica_after_write(client, db, make_product, use_replicas,
+                                                                      clock):
+    product = make_product(name="Основная", stock_quantity=5)
+    db.add(models.User(id=1, email="user1@example.com", first_name="Иван", last_name="Иванов", hashed_password="x"))
+    db.commit()
+    # Реплика отстает: на ней товар 1 с прежним остатком 5 и не получит заказ
+    router = use_replicas("Реплика A", pin_seconds=5.0)
+    product_cache.clear()
+    assert client.get("/api/products/1").json()["name"] == "Реплика A"
+
+    created = client.post("/orders/", params={"user_id": 1},
+                          json={"products": [{"product_id": product.id, "quantity": 2}]})
+    assert created.status_code == 201
+
+    # Промах по новой версии ключа заполняется из основной базы
+    fresh = client.get("/api/products/1")
+    assert (fresh.json()["name"], fresh.json()["stock_quantity"]) == ("Основная", 3)
+    assert client.get("/products/1").json()["name"] == "Основная"
+
+    # Закрепление истекло, но кэш отдает данные основной базы, а не реплики
+    clock.now += 6
+    cached = client.get("/api/products/1", headers={"If-None-Match": fresh.headers["etag"]})
+    assert cached.status_code == 304
+    assert client.get("/api/products/1").json()["stock_quantity"] == 3
+    assert product_name(client) == "Реплика A"
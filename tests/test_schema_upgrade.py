@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app import analytics, database, idempotency, models, schema_upgrade
+
+# Схема базы первой версии приложения и таблица ключей идемпотентности без token
+OLD_SCHEMA = [
+    "CREATE TABLE users (id INTEGER NOT NULL PRIMARY KEY, email VARCHAR NOT NULL, first_name VARCHAR NOT NULL, "
+    "last_name VARCHAR NOT NULL, hashed_password VARCHAR NOT NULL, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP))",
+    "CREATE TABLE products (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR NOT NULL, description TEXT, "
+    "price FLOAT NOT NULL, category VARCHAR NOT NULL, size VARCHAR NOT NULL, color VARCHAR NOT NULL, "
+    "stock_quantity INTEGER, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP))",
+    "CREATE TABLE orders (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id), "
+    "total_amount FLOAT NOT NULL, status VARCHAR, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), updated_at DATETIME)",
+    "CREATE TABLE order_product (order_id INTEGER REFERENCES orders (id), product_id INTEGER REFERENCES products (id), "
+    "quantity INTEGER NOT NULL)",
+    "CREATE TABLE idempotency_keys (key VARCHAR NOT NULL PRIMARY KEY, fingerprint VARCHAR(64) NOT NULL, "
+    "status VARCHAR NOT NULL, locked_at FLOAT, order_id INTEGER, response TEXT, expires_at FLOAT NOT NULL)",
+    "INSERT INTO users (id, email, first_name, last_name, hashed_password) VALUES (1, 'a@example.com', 'А', 'Б', 'x')",
+    "INSERT INTO products (id, name, price, category, size, color, stock_quantity, created_at) "
+    "VALUES (1, 'Футболка', 1000.0, 'Футболки', 'M', 'Белый', 5, '2024-05-01 10:00:00')",
+    "INSERT INTO orders (id, user_id, total_amount, status, created_at) "
+    "VALUES (1, 1, 2000.0, 'pending', '2024-05-01 12:00:00')",
+    "INSERT INTO order_product (order_id, product_id, quantity) VALUES (1, 1, 2)",
+]
+
+
+def test_old_database_is_upgraded_in_place(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        for statement in OLD_SCHEMA:
+            connection.exec_driver_sql(statement)
+
+    database.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        steps = schema_upgrade.upgrade(connection)
+    with engine.begin() as connection:
+        assert schema_upgrade.upgrade(connection) == []
+
+    assert steps[0] == "order_product"
+    assert {"products.updated_at", "orders.rolled_up", "idempotency_keys.token"} <= set(steps)
+    assert {"ix_orders_user_id_id", "ix_orders_rolled_up_id", "ix_products_category_price_id"} <= set(steps)
+    with Session(engine) as db:
+        order = db.get(models.Order, 1)
+        assert [(item.id, item.quantity, item.unit_price) for item in order.items] == [(1, 2, 1000.0)]
+        assert order.rolled_up is False
+        product = db.get(models.Product, 1)
+        assert product.updated_at == product.created_at
+        assert analytics.SalesRollup().run_once(db) == 1
+        assert db.execute(select(analytics.daily.c.revenue)).scalar() == 2000.0
+    engine.dispose()
+
+
+def test_orders_below_old_rollup_watermark_stay_counted(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        for statement in OLD_SCHEMA:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql("INSERT INTO orders (id, user_id, total_amount, status, created_at) "
+                                   "VALUES (2, 1, 1000.0, 'pending', '2024-05-02 12:00:00')")
+        connection.exec_driver_sql("INSERT INTO order_product (order_id, product_id, quantity) VALUES (2, 1, 1)")
+        # Сводки прежней версии уже учли заказ 1
+        connection.exec_driver_sql("CREATE TABLE rollup_watermarks (name VARCHAR NOT NULL PRIMARY KEY, "
+                                   "last_order_id INTEGER NOT NULL, updated_at DATETIME)")
+        connection.exec_driver_sql("INSERT INTO rollup_watermarks (name, last_order_id) VALUES ('sales', 1)")
+
+    database.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        schema_upgrade.upgrade(connection)
+
+    with Session(engine) as db:
+        assert [order.rolled_up for order in db.query(models.Order).order_by(models.Order.id)] == [True, False]
+        assert analytics.SalesRollup().run_once(db) == 1
+    engine.dispose()
+
+
+def test_idempotency_keys_without_token_are_replayed_or_taken_over(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        for statement in OLD_SCHEMA:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql(
+            "INSERT INTO idempotency_keys (key, fingerprint, status, locked_at, order_id, response, expires_at) "
+            "VALUES ('1:done', 'x', 'done', 1000.0, 1, '{}', 5000.0), "
+            "('1:busy', 'x', 'processing', 1000.0, NULL, NULL, 5000.0)")
+
+    database.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        assert "idempotency_keys.token" in schema_upgrade.upgrade(connection)
+
+    clock_now = [1005.0]
+    store = idempotency.IdempotencyStore(lock_timeout=10, wait_timeout=0, clock=lambda: clock_now[0])
+    with Session(engine) as db:
+        assert store.begin(db, "1:done", "x")[1].response == "{}"
+        with pytest.raises(idempotency.RequestInProgress):
+            store.begin(db, "1:busy", "x")
+        clock_now[0] += 10
+        token, _ = store.begin(db, "1:busy", "x")
+        assert token is not None
+        store.save_response(db, "1:busy", token, "{}")
+    engine.dispose()
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+from sqlalchemy import update
+
+from app import crud, database, models, schemas
+from app.cache import product_cache
+
+from .queries import count_queries
+
+
+@pytest.fixture
+def catalog(make_product):
+    make_product(name="Футболка хлопковая", description="Белая базовая футболка", category="Футболки",
+                 size="M", color="Белый", price=1500.0)
+    make_product(name="Футболка поло", description="Хлопковая рубашка поло", category="Футболки",
+                 size="L", color="Синий", price=2500.0)
+    make_product(name="Джинсы классические", description="Прямые джинсы из хлопка", category="Джинсы",
+                 size="32", color="Синий", price=3500.0)
+    make_product(name="Куртка зимняя", description="Теплая куртка с капюшоном", category="Куртки",
+                 size="L", color="Черный", price=8000.0)
+
+
+def search(client, **params):
+    response = client.get("/api/products/search", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+def names(result):
+    return sorted(item["name"] for item in result["items"])
+
+
+def test_search_matches_word_prefixes_in_name_and_description(client, catalog):
+    assert names(search(client, q="хлоп")) == ["Джинсы классические", "Футболка поло", "Футболка хлопковая"]
+    assert names(search(client, q="ФУТБ хлоп")) == ["Футболка поло", "Футболка хлопковая"]
+    assert search(client, q="капюшон")["total"] == 1
+    assert search(client, q="пальто")["total"] == 0
+
+
+def test_search_facets_ignore_their_own_filter(client, catalog):
+    result = search(client, q="хлоп", color="Синий")
+
+    assert result["total"] == 2
+    assert {f["value"]: f["count"] for f in result["facets"]["color"]} == {"Синий": 2, "Белый": 1}
+    assert {f["value"]: f["count"] for f in result["facets"]["category"]} == {"Футболки": 1, "Джинсы": 1}
+    assert result["facets"]["price"] == {"min": 2500.0, "max": 3500.0}
+
+
+def test_search_filters_by_price_range_and_sorts(client, catalog):
+    result = search(client, min_price=2000, max_price=8000, sort="price_desc")
+
+    assert [item["price"] for item in result["items"]] == [8000.0, 3500.0, 2500.0]
+    assert result["facets"]["price"] == {"min": 1500.0, "max": 8000.0}
+
+
+def test_search_items_match_catalog_json(client, db, catalog):
+    result = search(client, q="куртка")
+    product = db.query(models.Product).filter(models.Product.name == "Куртка зимняя").one()
+
+    assert result["items"] == [json.loads(crud.product_json(product))]
+
+
+def test_sync_and_async_search_agree(client, catalog):
+    params = {"q": "хлоп", "size": "L"}
+    assert client.get("/products/search", params=params).json() == search(client, **params)
+
+
+@pytest.mark.parametrize("query", ['"', "*", "хлоп OR", "NEAR(", "a:b", "-джинсы", "'; DROP TABLE products; --"])
+def test_search_tolerates_query_syntax(client, catalog, query):
+    search(client, q=query)
+
+
+def test_index_follows_product_changes(client, db, catalog):
+    """Индекс поиска обновляется триггерами; изменения здесь идут мимо crud, поэтому кэш сбрасывается вручную"""
+    product = db.query(models.Product).filter(models.Product.name == "Куртка зимняя").one()
+
+    db.execute(update(models.Product).where(models.Product.id == product.id).values(stock_quantity=1))
+    db.commit()
+    product_cache.clear()
+    assert search(client, q="зимняя")["total"] == 1
+
+    product.name = "Пуховик зимний"
+    db.commit()
+    product_cache.clear()
+    assert search(client, q="зимняя")["total"] == 0
+    assert search(client, q="пуховик")["total"] == 1
+
+    db.delete(product)
+    db.commit()
+    product_cache.clear()
+    assert search(client, q="пуховик")["total"] == 0
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"min_price": 1000, "max_price": 2000},
+    {"size": "M", "color": "Белый", "min_price": 1000},
+])
+def test_facet_counts_without_query_do_not_scan_table(db, filters):
+    queries = crud.search_facet_queries([], crud.search_filters(**filters))
+
+    for query in queries.values():
+        sql = str(query.compile(database.engine, compile_kwargs={"literal_binds": True}))
+        plan = [row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+        table_scans = [step for step in plan if step.startswith("SCAN products") and "COVERING INDEX" not in step]
+        assert not table_scans, plan
+
+
+def test_repeated_search_is_cached_until_catalog_changes(client, db, catalog):
+    first = search(client, q="хлоп")
+    with count_queries(database.async_engine.sync_engine) as statements:
+        assert search(client, q="  Хлоп ") == first
+    assert statements == []
+
+    crud.create_product(db, schemas.ProductCreate(
+        name="Шорты хлопковые", price=1200.0, category="Шорты", size="M", color="Белый", stock_quantity=3
+    ))
+    assert search(client, q="хлоп")["total"] == first["total"] + 1
+
+
+def test_total_is_counted_when_category_facet_is_truncated(db, monkeypatch, catalog):
+    monkeypatch.setattr(crud, "FACET_LIMIT", 1)
+
+    result = json.loads(crud.search_products_json(db, q="хлоп"))
+
+    assert result["total"] == 3
+    assert result["facets"]["category"] == [{"value": "Футболки", "count": 2}]
@@ -0,0 +1,72 @@
+import json
+from datetime import datetime, timezone
+from typing import List
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app import crud, models, schemas
+from app.main import app
+from app.serialization import dumps
+
+
+def pydantic_json(schema, objects):
+    """То, что вернул бы FastAPI через response_model"""
+    return jsonable_encoder(TypeAdapter(List[schema]).validate_python(objects, from_attributes=True))
+
+
+@pytest.fixture
+def shop(db, make_product):
+    user = models.User(email="buyer@example.com", first_name="Иван", last_name="Иванов", hashed_password="x")
+    db.add(user)
+    db.commit()
+    products = [make_product(name=f"Товар {i}", price=100.0 + i, description=None if i % 2 else "Описание")
+                for i in range(5)]
+    for product in products[:3]:
+        crud.create_order(db, schemas.OrderCreate(products=[
+            {"product_id": product.id, "quantity": 1}, {"product_id": products[4].id, "quantity": 2}
+        ]), user_id=user.id)
+    db.expire_all()
+    return user
+
+
+def test_products_listing_matches_pydantic(client, db, shop):
+    expected = pydantic_json(schemas.Product, crud.get_products(db, sort="price"))
+
+    assert client.get("/api/products", params={"sort": "price"}).json() == expected
+    assert client.get("/products/", params={"sort": "price"}).json() == expected
+
+
+def test_users_listing_matches_pydantic(client, db, shop):
+    assert client.get("/users/").json() == pydantic_json(schemas.User, crud.get_users(db))
+
+
+def test_orders_listing_matches_pydantic(client, db, shop):
+    expected = pydantic_json(schemas.Order, crud.get_orders(db, user_id=shop.id))
+
+    response = client.get("/orders/", params={"user_id": shop.id})
+
+    assert response.json() == expected
+    assert [len(order["products"]) for order in response.json()] == [2, 2, 2]
+
+
+def test_orders_listing_for_user_without_orders(client):
+    assert client.get("/orders/", params={"user_id": 42}).json() == []
+
+
+def test_openapi_still_describes_listing_models():
+    paths = app.openapi()["paths"]
+
+    for path, schema in [("/api/products", "Product"), ("/products/", "Product"), ("/users/", "User"),
+                         ("/orders/", "Order")]:
+        response_schema = paths[path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert response_schema["items"]["$ref"] == f"#/components/schemas/{schema}"
+
+
+def test_dumps_formats_values_like_pydantic():
+    data = {"name": "Футболка", "price": 1500.0, "created_at": datetime(2024, 1, 1, 12, 30, tzinfo=timezone.utc)}
+
+    assert json.loads(dumps(data)) == schemas.Product.model_validate(
+        {**data, "id": 1, "category": "Футболки", "size": "M", "color": "Белый", "stock_quantity": 1}
+    ).model_dump(mode="json", include=set(data))